@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# Conversion benchmark over a synthetic corpus.
+#
+# Generates .ui files for every Python-supported version (see corpus.py), then
+# times convertUIToXML, convertXMLToUI and full ui->xml->ui round trips. Each
+# stage runs in its own interpreter so peak RSS is per stage. Reports files/s,
+# MB/s, peak RSS, and per file the tracemalloc peak and the most memory blocks
+# held at once; results can be saved as JSON and compared with an earlier run.
+#
+#   python benchmarks/bench_convert.py --files 8 --depth 4 --out run.json
+#   python benchmarks/bench_convert.py --files 8 --depth 4 --baseline run.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import add_spec_arguments, generate_corpus, spec_from_args
+from uiunpack_gui import etw_ui_convert as conv
+
+STAGES = ('ui2xml', 'xml2ui', 'roundtrip')
+# metric -> True when bigger is better
+METRICS = {
+    'files_per_s': True,
+    'mb_per_s': True,
+    'peak_rss_kb': False,
+    'alloc_peak_kb_per_file': False,
+    'alloc_blocks_per_file': False,
+}
+
+
+def _peak_rss_kb() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_kb_windows()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _peak_rss_kb_windows() -> int | None:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        c = Counters()
+        c.cb = ctypes.sizeof(c)
+        proc = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(proc, ctypes.byref(c), c.cb):
+            return c.PeakWorkingSetSize // 1024
+    except Exception:
+        pass
+    return None
+
+
+def _stage_fn(stage: str, work: str):
+    xml_out = os.path.join(work, 'out.xml')
+    ui_out = os.path.join(work, 'out.ui')
+    if stage == 'ui2xml':
+        return lambda src: conv.convertUIToXML(src, xml_out)
+    if stage == 'xml2ui':
+        return lambda src: conv.convertXMLToUI(src, ui_out)
+
+    def roundtrip(src):
+        conv.convertUIToXML(src, xml_out)
+        conv.convertXMLToUI(xml_out, ui_out)
+        with open(src, 'rb') as a, open(ui_out, 'rb') as b:
+            return a.read() != b.read()
+    return roundtrip
+
+
+def _counting_stages(counts: list[int]):
+    # Stands in for conv._stage during the tracing pass: counts the traced
+    # blocks as each stage ends, while what it built (the decoded tree, the
+    # XML text) is still referenced
+    import tracemalloc
+
+    @contextmanager
+    def stage(name):
+        yield
+        counts.append(len(tracemalloc.take_snapshot().traces))
+    return stage
+
+
+def run_child(stage: str, inputs: list[str], work: str, repeat: int) -> dict:
+    import tracemalloc
+    conv._load_upstream_impl()
+    fn = _stage_fn(stage, work)
+    best = float('inf')
+    mismatches = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        mismatches = sum(bool(fn(src)) for src in inputs)
+        best = min(best, time.perf_counter() - t0)
+    peak_rss = _peak_rss_kb()
+    # Separate pass so tracing overhead doesn't skew the timings above
+    tracemalloc.start()
+    peaks = []
+    blocks = []
+    counts: list[int] = []
+    conv._stage = _counting_stages(counts)
+    for src in inputs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        base_blocks = len(tracemalloc.take_snapshot().traces)
+        del counts[:]
+        fn(src)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        blocks.append(max(counts, default=base_blocks) - base_blocks)
+    tracemalloc.stop()
+    size = sum(os.path.getsize(p) for p in inputs)
+    return {
+        'files': len(inputs),
+        'bytes_in': size,
+        'seconds': best,
+        'files_per_s': len(inputs) / best,
+        'mb_per_s': size / 1e6 / best,
+        'peak_rss_kb': peak_rss,
+        'alloc_peak_kb_per_file': sum(peaks) / len(peaks) / 1024,
+        'alloc_blocks_per_file': sum(blocks) / len(blocks),
+        'roundtrip_mismatches': mismatches if stage == 'roundtrip' else None,
+    }
+
+
+def _run_stage(stage: str, inputs: list[str], work: str, repeat: int, xml_parser: str) -> dict:
+    list_path = os.path.join(work, f'{stage}.inputs')
+    with open(list_path, 'w', encoding='utf-8') as fh:
+        fh.write('\n'.join(inputs))
+    env = dict(os.environ, UIUNPACK_XML_PARSER=xml_parser)
+    out = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, list_path, work, str(repeat)],
+        cwd=ROOT, env=env, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\nvs baseline ({baseline['meta'].get('git_rev')}, {baseline['meta'].get('when')}):")
+    for stage in STAGES:
+        cur, base = current['stages'].get(stage), baseline['stages'].get(stage)
+        if not cur or not base:
+            continue
+        parts = []
+        for metric, higher_better in METRICS.items():
+            a, b = cur.get(metric), base.get(metric)
+            if not a or not b:
+                continue
+            change = (a - b) / b * 100
+            better = change > 0 if higher_better else change < 0
+            parts.append(f"{metric} {change:+.1f}%{'' if abs(change) < 2 else (' better' if better else ' worse')}")
+        print(f"  {stage:10} " + ', '.join(parts))
+    if current['spec'] != baseline['spec']:
+        print("  note: corpus parameters differ from the baseline run")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        stage, list_path, work, repeat = sys.argv[2:6]
+        with open(list_path, encoding='utf-8') as fh:
+            inputs = fh.read().splitlines()
+        print(json.dumps(run_child(stage, inputs, work, int(repeat))))
+        return
+
+    ap = argparse.ArgumentParser(description='Benchmark UI conversions on a synthetic corpus.')
+    ap.add_argument('--files', type=int, default=4, help='files per version')
+    ap.add_argument('--repeat', type=int, default=3, help='timed passes per stage (best is kept)')
+    ap.add_argument('--xml-parser', default=conv.XML_PARSER, choices=('minidom', 'light'))
+    ap.add_argument('--out', help='write results as JSON here')
+    ap.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+    spec = spec_from_args(args)
+
+    with tempfile.TemporaryDirectory(prefix='uiunpack-bench-') as work:
+        corpus = generate_corpus(os.path.join(work, 'corpus'), spec, args.versions, args.files)
+        xml_dir = os.path.join(work, 'xml')
+        os.makedirs(xml_dir)
+        xmls = []
+        for src in corpus:
+            dst = os.path.join(xml_dir, os.path.basename(src) + '.xml')
+            conv.convertUIToXML(src, dst)
+            xmls.append(dst)
+        inputs = {'ui2xml': corpus, 'xml2ui': xmls, 'roundtrip': corpus}
+        stages = {s: _run_stage(s, inputs[s], work, args.repeat, args.xml_parser) for s in STAGES}
+
+    result = {
+        'meta': {
+            'when': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_rev': _git_rev(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'xml_parser': args.xml_parser,
+        },
+        'spec': dict(spec.as_dict(), files_per_version=args.files, versions=sorted(args.versions or conv.PY_SUPPORTED_VERSIONS)),
+        'stages': stages,
+    }
+    for stage, m in stages.items():
+        rss = f"{m['peak_rss_kb'] / 1024:.1f} MB" if m['peak_rss_kb'] else 'n/a'
+        print(f"{stage:10} {m['files']:5d} files  {m['files_per_s']:8.1f} files/s  {m['mb_per_s']:7.2f} MB/s  "
+              f"peak RSS {rss}  alloc peak {m['alloc_peak_kb_per_file']:.1f} KB/file  "
+              f"{m['alloc_blocks_per_file']:.0f} blocks/file")
+        if m['roundtrip_mismatches']:
+            print(f"  WARNING: {m['roundtrip_mismatches']} round trip(s) did not reproduce the input bytes")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as fh:
+            json.dump(result, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            compare(result, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
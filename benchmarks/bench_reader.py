@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Micro-benchmark: TypeCastReader (buffered IO + struct.unpack per field)
+# versus MemoryReader (memoryview + precompiled Struct.unpack_from).
+#
+#   python benchmarks/bench_reader.py                 # synthetic field stream
+#   python benchmarks/bench_reader.py some.ui ...     # real layouts (needs etwng)
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uiunpack_gui import etw_ui_convert as conv
+
+
+def _synthetic(records: int) -> bytes:
+    # Roughly the mix UiEntry.readFrom sees: ints, short strings, flags, floats
+    out = bytearray()
+    for i in range(records):
+        title = f"component_{i % 97}".encode('utf-16-le')
+        out += struct.pack('<iH', i, len(title) // 2) + title
+        out += struct.pack('<iiBB', i * 3, -i, 1, 0)
+        path = f"ui/skins/default/tex_{i % 13}.tga".encode('ascii')
+        out += struct.pack('<H', len(path)) + path
+        out += struct.pack('<ffiI', 0.5, 1.5, 7, 9)
+    return bytes(out)
+
+
+def _decode_fields(reader, records: int) -> None:
+    for _ in range(records):
+        reader.readInt(); reader.readUTF16()
+        reader.readInt(); reader.readInt(); reader.readByte(); reader.readBool()
+        reader.readASCII()
+        reader.readFloat(); reader.readFloat(); reader.readInt(); reader.readUInt()
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_synthetic(records: int, repeat: int) -> None:
+    data = _synthetic(records)
+    with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as fh:
+        fh.write(data)
+        path = fh.name
+    try:
+        def old():
+            r = conv.TypeCastReader(open(path, 'rb'))
+            _decode_fields(r, records)
+            r.close()
+
+        def new():
+            with conv.MemoryReader.open(path) as r:
+                _decode_fields(r, records)
+
+        _report(f"synthetic ({records} records, {len(data) / 1e6:.1f} MB)", _best_of(old, repeat), _best_of(new, repeat))
+    finally:
+        os.unlink(path)
+
+
+def bench_file(path: str, repeat: int) -> None:
+    conv._load_upstream_impl()
+    version = conv.detect_version(path)
+
+    def decode(reader):
+        reader.read(10)
+        conv.UiEntry(version, 1).readFrom(reader)
+
+    def old():
+        r = conv.TypeCastReader(open(path, 'rb'))
+        decode(r)
+        r.close()
+
+    def new():
+        with conv.MemoryReader.open(path) as r:
+            decode(r)
+
+    _report(os.path.basename(path), _best_of(old, repeat), _best_of(new, repeat))
+
+
+def _report(label: str, old: float, new: float) -> None:
+    print(f"{label}: TypeCastReader {old * 1e3:.1f} ms, MemoryReader {new * 1e3:.1f} ms, {old / new:.2f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('files', nargs='*', help='.ui files to decode with UiEntry.readFrom')
+    ap.add_argument('--records', type=int, default=100_000)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+    if args.files:
+        for path in args.files:
+            bench_file(path, args.repeat)
+    else:
+        bench_synthetic(args.records, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
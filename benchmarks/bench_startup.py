@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# Cold vs warm start-up cost of the converter, measured in fresh interpreters:
+# importing etw_ui_convert, loading the vendored upstream converter, and the
+# Ruby/Nokogiri probes. "cold" runs against an empty cache directory, "warm"
+# against the one the cold run filled. Also checks tkinter stays unloaded.
+#
+#   python benchmarks/bench_startup.py [--repeat N]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from uiunpack_gui import etw_ui_convert as conv
+t1 = time.perf_counter()
+try:
+    conv._load_upstream_impl()
+    loaded = True
+except RuntimeError:
+    loaded = False
+t2 = time.perf_counter()
+conv.has_ruby() and conv.has_ruby_nokogiri()
+t3 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1e3,
+    'upstream_ms': (t2 - t1) * 1e3 if loaded else None,
+    'probe_ms': (t3 - t2) * 1e3,
+    'tkinter_loaded': 'tkinter' in sys.modules,
+}))
+'''
+
+
+def _run(cache_dir: str) -> dict:
+    env = dict(os.environ, UIUNPACK_CACHE_DIR=cache_dir, PYTHONDONTWRITEBYTECODE='1')
+    out = subprocess.check_output([sys.executable, '-c', _CHILD], cwd=ROOT, env=env, text=True)
+    return json.loads(out)
+
+
+def _summary(runs: list[dict], key: str) -> str:
+    vals = [r[key] for r in runs if r[key] is not None]
+    return f"{statistics.median(vals):7.1f} ms" if vals else "    n/a   "
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as cache:
+            cold.append(_run(cache))
+            warm.append(_run(cache))
+    print(f"{'':10} {'cold':>10} {'warm':>10}")
+    for key in ('import_ms', 'upstream_ms', 'probe_ms'):
+        print(f"{key:10} {_summary(cold, key):>10} {_summary(warm, key):>10}")
+    if any(r['tkinter_loaded'] for r in cold + warm):
+        print("WARNING: tkinter was imported by the converter module")
+
+
+if __name__ == '__main__':
+    main()
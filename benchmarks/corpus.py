@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# Synthetic .ui corpus generator.
+#
+# Builds UiEntry trees in memory with the upstream record classes and writes
+# them with the upstream writeTo, so every file is laid out exactly as the
+# real converter expects for its version. Shape is controlled by tree depth,
+# child fan-out, per-entry state/effect/event/TGA counts and string length.
+# Each generated file is decoded once as a validity check.
+#
+#   python benchmarks/corpus.py OUT_DIR [--files 4] [--depth 3] [--fanout 4] ...
+
+import argparse
+import os
+import random
+import string
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uiunpack_gui import etw_ui_convert as conv
+
+# UiEntry list attribute -> upstream record class used to fill it
+_COLLECTIONS = {
+    'TGAs': 'Tga',
+    'states': 'State',
+    'events': 'Event',
+    'effects': 'Effect',
+}
+# Characters the converter escapes on the way to XML; mixed in sparingly
+_SPECIAL = '&<>'
+
+
+class CorpusSpec:
+    def __init__(self, depth=3, fanout=3, states=2, effects=1, events=1, tgas=2, strlen=16, seed=0):
+        self.depth = depth
+        self.fanout = fanout
+        self.counts = {'TGAs': tgas, 'states': states, 'events': events, 'effects': effects}
+        self.strlen = strlen
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return {'depth': self.depth, 'fanout': self.fanout, 'strlen': self.strlen, 'seed': self.seed,
+                **{k.lower(): v for k, v in self.counts.items()}}
+
+
+def _text(rnd: random.Random, n: int) -> str:
+    chars = rnd.choices(string.ascii_letters + string.digits + '_/. ', k=n)
+    if n > 4 and rnd.random() < 0.1:
+        chars[rnd.randrange(n)] = rnd.choice(_SPECIAL)
+    return ''.join(chars)
+
+
+def _fill_strings(obj, rnd: random.Random, strlen: int) -> None:
+    # Only strings are randomised. Upstream ints and flags may select
+    # optional fields, so they keep their constructor defaults.
+    for name, value in list(vars(obj).items()):
+        if isinstance(value, str):
+            setattr(obj, name, _text(rnd, strlen))
+
+
+def _sync_count(obj, attr: str, n: int) -> None:
+    # Keep numX counters in step with their lists for writers that use them
+    for name in ('num' + attr, 'num' + attr[0].upper() + attr[1:]):
+        if hasattr(obj, name):
+            setattr(obj, name, n)
+
+
+def _make_entry(ns: dict, version: int, spec: CorpusSpec, rnd: random.Random, depth: int, indent: int):
+    entry = ns['UiEntry'](version, indent)
+    _fill_strings(entry, rnd, spec.strlen)
+    entry.id = rnd.randrange(1 << 30)
+    for attr, cls_name in _COLLECTIONS.items():
+        cls = ns.get(cls_name)
+        if cls is None or not hasattr(entry, attr):
+            continue
+        items = []
+        for _ in range(spec.counts[attr]):
+            item = cls(version, indent + 4)
+            _fill_strings(item, rnd, spec.strlen)
+            items.append(item)
+        setattr(entry, attr, items)
+        _sync_count(entry, attr, len(items))
+    if depth > 0:
+        entry.children = [_make_entry(ns, version, spec, rnd, depth - 1, indent + 2) for _ in range(spec.fanout)]
+        _sync_count(entry, 'children', len(entry.children))
+    return entry
+
+
+_upstream_ns = None
+
+
+def make_ui_bytes(version: int, spec: CorpusSpec, seed: int = 0) -> bytes:
+    global _upstream_ns
+    if _upstream_ns is None:
+        _upstream_ns = conv._exec_upstream()
+    root = _make_entry(_upstream_ns, version, spec, random.Random(seed), spec.depth, 1)
+    out = conv.BufferWriter()
+    out.write(b'Version%03d' % version)
+    root.writeTo(out)
+    return out.getvalue()
+
+
+def _validate(path: str) -> None:
+    # Must decode cleanly and consume the whole file
+    conv._load_upstream_impl()
+    with conv.MemoryReader.open(path) as reader:
+        version = int(reader.read(10)[7:10])
+        conv.UiEntry(version, 1).readFrom(reader)
+        left = len(reader.read())
+    if left:
+        raise ValueError(f'{path}: {left} trailing bytes after decode')
+
+
+def generate_corpus(out_dir: str, spec: CorpusSpec, versions=None, files_per_version: int = 1) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for version in sorted(versions or conv.PY_SUPPORTED_VERSIONS):
+        for k in range(files_per_version):
+            path = os.path.join(out_dir, f'synthetic_v{version:03d}_{k:04d}.ui')
+            with open(path, 'wb') as fh:
+                fh.write(make_ui_bytes(version, spec, spec.seed * 100003 + version * 1009 + k))
+            _validate(path)
+            paths.append(path)
+    return paths
+
+
+def add_spec_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument('--depth', type=int, default=3, help='tree depth below the root entry')
+    ap.add_argument('--fanout', type=int, default=3, help='children per entry')
+    ap.add_argument('--states', type=int, default=2)
+    ap.add_argument('--effects', type=int, default=1)
+    ap.add_argument('--events', type=int, default=1)
+    ap.add_argument('--tgas', type=int, default=2)
+    ap.add_argument('--strlen', type=int, default=16, help='length of every generated string')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--versions', type=lambda s: [int(v) for v in s.split(',')], default=None,
+                    help='comma-separated versions (default: all Python-supported)')
+
+
+def spec_from_args(args) -> CorpusSpec:
+    return CorpusSpec(args.depth, args.fanout, args.states, args.effects, args.events, args.tgas, args.strlen, args.seed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('out_dir')
+    ap.add_argument('--files', type=int, default=1, help='files per version')
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+    paths = generate_corpus(args.out_dir, spec_from_args(args), args.versions, args.files)
+    total = sum(os.path.getsize(p) for p in paths)
+    print(f"Wrote {len(paths)} file(s), {total / 1e6:.2f} MB to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Shared fixtures: a small synthetic corpus (benchmarks/corpus.py) for every
+# Python-supported UI version, and a private cache folder per test session.
+# Needs the etwng upstream converter next to the checkout, like the app.
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from uiunpack_gui import etw_ui_convert as conv  # noqa: E402
+
+try:
+    conv._upstream_source()
+except RuntimeError:
+    collect_ignore_glob = ['test_*.py']
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _cache_dir(tmp_path_factory):
+    old = os.environ.get('UIUNPACK_CACHE_DIR')
+    os.environ['UIUNPACK_CACHE_DIR'] = str(tmp_path_factory.mktemp('cache'))
+    yield
+    if old is None:
+        os.environ.pop('UIUNPACK_CACHE_DIR', None)
+    else:
+        os.environ['UIUNPACK_CACHE_DIR'] = old
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory) -> list[str]:
+    """One small .ui file per supported version."""
+    from corpus import CorpusSpec, generate_corpus
+    out = tmp_path_factory.mktemp('corpus')
+    return generate_corpus(str(out), CorpusSpec(depth=2, fanout=2))
+
+
+@pytest.fixture
+def ui_file(corpus) -> str:
+    """A version 054 layout."""
+    return next(p for p in corpus if '_v054_' in p)
+
+
+@pytest.fixture(params=['054', '039', '032'])
+def ui_data(request, corpus) -> bytes:
+    """Layout bytes for a few versions with different field sets."""
+    with open(next(p for p in corpus if f'_v{request.param}_' in p), 'rb') as fh:
+        return fh.read()
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from uiunpack_gui import archive
+from uiunpack_gui import etw_ui_convert as conv
+
+FORMATS = ['.zip', '.tar', '.tar.gz', '.tar.zst']
+
+
+def _needs(ext):
+    if ext == '.tar.zst':
+        pytest.importorskip('zstandard')
+
+
+@pytest.mark.parametrize('ext', FORMATS)
+def test_unpack_into_archive_and_pack_back_out(corpus, tmp_path, ext):
+    _needs(ext)
+    out = tmp_path / 'xml'
+    jobs = [conv.plan_job('unpack', p, str(out)) for p in corpus]
+    path = str(tmp_path / f'xml{ext}')
+    with archive.ArchiveSink(path, root=str(out)) as sink:
+        results = conv.convert_many(jobs, workers=1, sink=sink)
+    assert all(r.ok for r in results), [r.error for r in results if not r.ok]
+    assert sink.count == len(jobs) and not out.exists()
+
+    found = archive.scan_archive(path, 'pack')
+    assert len(found) == len(corpus)
+    for job in jobs:
+        member = archive.member_path(path, os.path.basename(job.dst))
+        with open(job.src, 'rb') as fh:
+            assert bytes(archive.read_member(member)) == conv.convertUIDataToXML(fh.read()).encode('utf-8')
+
+    # ...and the archive is an input for the way back
+    ui_out = tmp_path / 'ui'
+    ui_out.mkdir()
+    back = [conv.plan_job('pack', member, str(ui_out), version=ver) for member, ver in found]
+    results = conv.convert_many(back, workers=1)
+    assert all(r.ok for r in results), [r.error for r in results if not r.ok]
+    originals = {}
+    for p in corpus:
+        with open(p, 'rb') as fh:
+            originals[os.path.basename(p)] = fh.read()
+    for job in back:
+        with open(job.dst, 'rb') as fh:
+            assert fh.read() == originals[os.path.basename(job.dst)]
+
+
+@pytest.mark.parametrize('ext', ['.zip', '.tar'])
+def test_scan_ui_members(corpus, tmp_path, ext):
+    path = str(tmp_path / f'ui{ext}')
+    with archive.ArchiveSink(path) as sink:
+        for p in corpus:
+            with open(p, 'rb') as fh:
+                sink.add('ui/' + os.path.basename(p), fh.read())
+        sink.add('ui/readme.txt', b'not a layout')
+    found = dict(archive.scan_archive(path, 'unpack'))
+    assert sorted(found) == sorted(archive.member_path(os.path.abspath(path), 'ui/' + os.path.basename(p))
+                                   for p in corpus)
+    for member, ver in found.items():
+        assert ver == int(bytes(archive.read_member(member))[7:10])
+
+
+def test_aborted_sink_leaves_nothing(tmp_path):
+    path = tmp_path / 'x.zip'
+    with pytest.raises(RuntimeError):
+        with archive.ArchiveSink(str(path)) as sink:
+            sink.add('a', b'1')
+            raise RuntimeError
+    assert os.listdir(tmp_path) == []
+
+
+def _zip(path, data=b'1'):
+    with archive.ArchiveSink(str(path)) as sink:
+        sink.add('a', data)
+    return str(path)
+
+
+def test_open_archives_are_bounded_and_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'OPEN_ARCHIVES', 2)
+    archive.close_all()
+    paths = [_zip(tmp_path / f'{i}.zip') for i in range(3)]
+    opened = [archive.open_archive(p) for p in paths]
+    assert list(archive._open) == [os.path.abspath(p) for p in paths[1:]]
+    with pytest.raises(archive.ArchiveError):
+        opened[0].read('a')
+    assert archive.open_archive(paths[2]) is opened[2]
+
+    # A rewritten archive replaces (and closes) the cached one
+    st = os.stat(paths[2])
+    _zip(paths[2], b'22')
+    os.utime(paths[2], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert bytes(archive.read_member(archive.member_path(paths[2], 'a'))) == b'22'
+    with pytest.raises(archive.ArchiveError):
+        opened[2].read('a')
+
+    archive.close_all()
+    assert not archive._open
+    with pytest.raises(archive.ArchiveError):
+        opened[1].read('a')
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+from corpus import CorpusSpec, generate_corpus
+
+from uiunpack_gui import etw_ui_convert as conv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_corpus_covers_every_version_and_round_trips(corpus):
+    versions = {int(os.path.basename(p).split('_v')[1][:3]) for p in corpus}
+    assert versions == conv.PY_SUPPORTED_VERSIONS
+    for path in corpus:
+        with open(path, 'rb') as fh:
+            assert conv.roundtrip_ui(fh.read())
+
+
+def test_corpus_is_deterministic(tmp_path):
+    spec = CorpusSpec(depth=1, fanout=2, seed=7)
+    a = generate_corpus(str(tmp_path / 'a'), spec, versions=[54, 32])
+    b = generate_corpus(str(tmp_path / 'b'), spec, versions=[54, 32])
+    for pa, pb in zip(a, b):
+        with open(pa, 'rb') as fa, open(pb, 'rb') as fb:
+            assert fa.read() == fb.read()
+
+
+def test_bench_convert_writes_a_report(tmp_path):
+    out = tmp_path / 'run.json'
+    subprocess.run([sys.executable, os.path.join('benchmarks', 'bench_convert.py'), '--files', '1',
+                    '--depth', '1', '--fanout', '1', '--repeat', '1', '--versions', '54',
+                    '--out', str(out)], cwd=ROOT, check=True, capture_output=True)
+    report = json.loads(out.read_text())
+    assert report['spec']['versions'] == [54]
+    assert {'ui2xml', 'xml2ui'} <= report['stages'].keys()
+    ui2xml = report['stages']['ui2xml']
+    assert ui2xml['files'] == 1
+    assert ui2xml['alloc_blocks_per_file'] > 0 and ui2xml['alloc_peak_kb_per_file'] > 0
+    # Comparing with itself works too
+    subprocess.run([sys.executable, os.path.join('benchmarks', 'bench_convert.py'), '--files', '1',
+                    '--depth', '1', '--fanout', '1', '--repeat', '1', '--versions', '54',
+                    '--baseline', str(out)], cwd=ROOT, check=True, capture_output=True)
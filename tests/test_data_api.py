@@ -0,0 +1,39 @@
+import io
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+
+
+def test_ui_to_xml_matches_file_conversion(corpus, tmp_path):
+    for path in corpus:
+        conv.convertUIToXML(path, str(tmp_path / 'out.xml'))
+        with open(tmp_path / 'out.xml', encoding='utf-8') as fh:
+            expected = fh.read()
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        assert conv.convertUIDataToXML(data) == expected
+        assert conv.convertUIDataToXML(memoryview(data)) == expected
+        assert conv.convertUIDataToXML(io.BytesIO(data)) == expected
+        out = io.StringIO()
+        assert conv.convertUIDataToXML(data, out) is None
+        assert out.getvalue() == expected
+
+
+@pytest.mark.parametrize('parser', ['minidom', 'light'])
+def test_xml_to_ui_matches_file_conversion(corpus, tmp_path, parser):
+    for path in corpus:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        xml = conv.convertUIDataToXML(data)
+        assert conv.convertXMLDataToUI(xml, parser=parser) == data
+        assert conv.convertXMLDataToUI(xml.encode('utf-8'), parser=parser) == data
+        out = io.BytesIO()
+        assert conv.convertXMLDataToUI(xml, out, parser=parser) is None
+        assert out.getvalue() == data
+        assert conv.roundtrip_ui(data, parser)
+
+
+def test_bad_header():
+    with pytest.raises(ValueError):
+        conv.convertUIDataToXML(b'NotAUi054')
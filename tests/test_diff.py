@@ -0,0 +1,77 @@
+import shutil
+
+import pytest
+
+from uiunpack_gui import diff
+from uiunpack_gui import etw_ui_convert as conv
+
+
+@pytest.fixture
+def edited(ui_file, tmp_path):
+    """ui_file with the root's xOff changed, its first TGA removed and the
+    first child's script replaced."""
+    with open(ui_file, 'rb') as fh:
+        xml = conv.convertUIDataToXML(fh.read())
+    xml = xml.replace('<xOff>0</xOff>', '<xOff>5</xOff>', 1)
+    start = xml.index('<script>', xml.index('<script>') + 1)
+    xml = xml[:start] + '<script>a &amp; b' + xml[xml.index('</script>', start):]
+    xml = xml[:xml.index('<tga>')] + xml[xml.index('</tga>') + len('</tga>'):]
+    (tmp_path / 'new.xml').write_text(xml, encoding='utf-8')
+    conv.convertXMLToUI(str(tmp_path / 'new.xml'), str(tmp_path / 'new.ui'))
+    return str(tmp_path / 'new.ui')
+
+
+def _summary(changes):
+    return [(c.kind, c.field, c.new) for c in changes]
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_reports_fields_and_records(ui_file, edited, cache):
+    changes = diff.diff_ui(ui_file, edited, cache)
+    assert _summary(changes) == [('field', 'xOff', 5), ('removed', None, None), ('field', 'script', 'a & b')]
+    root = changes[0].path
+    assert changes[1].path == root + '/Tga[0]'
+    assert changes[2].path.startswith(root + '/')
+    # Cached hash trees give the same answer
+    assert diff.diff_ui(ui_file, edited, cache) == changes
+
+
+def test_identical_layouts(ui_file, tmp_path):
+    copy = str(tmp_path / 'copy.ui')
+    shutil.copyfile(ui_file, copy)
+    assert diff.diff_ui(ui_file, copy) == []
+    assert diff.HashTree.load(ui_file).digest() == diff.HashTree.load(copy).digest()
+
+
+def test_diff_many(ui_file, edited):
+    results = diff.diff_many(edited, [ui_file, edited])
+    assert results[edited] == []
+    assert results[ui_file] == diff.diff_ui(ui_file, edited)
+
+
+def test_exit_status(ui_file, edited, monkeypatch, capsys):
+    monkeypatch.setattr('sys.argv', ['diff', ui_file, edited])
+    with pytest.raises(SystemExit) as exc:
+        diff.main()
+    assert exc.value.code == 1
+    assert '~ ' in capsys.readouterr().out
+    monkeypatch.setattr('sys.argv', ['diff', ui_file, ui_file])
+    with pytest.raises(SystemExit) as exc:
+        diff.main()
+    assert exc.value.code == 0
+
+
+@pytest.mark.parametrize('tag', ['event', 'effect', 'state'])
+def test_removing_every_record_of_a_kind(ui_file, tmp_path, tag):
+    with open(ui_file, 'rb') as fh:
+        xml = conv.convertUIDataToXML(fh.read())
+    # Drop all of the root entry's records of this kind (they come before its children)
+    head, rest = xml.split('<children>', 1)
+    removed = head.count(f'<{tag}>')
+    while f'<{tag}>' in head:
+        head = head[:head.index(f'<{tag}>')] + head[head.index(f'</{tag}>') + len(f'</{tag}>'):]
+    (tmp_path / 'new.xml').write_text(head + '<children>' + rest, encoding='utf-8')
+    conv.convertXMLToUI(str(tmp_path / 'new.xml'), str(tmp_path / 'new.ui'))
+    changes = diff.diff_ui(ui_file, str(tmp_path / 'new.ui'))
+    assert [c.kind for c in changes] == ['removed'] * removed
+    assert all(c.path.endswith(']') for c in changes)
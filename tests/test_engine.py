@@ -0,0 +1,116 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+
+
+def _jobs(paths, outdir):
+    outdir.mkdir(exist_ok=True)
+    return [conv.plan_job('unpack', p, str(outdir)) for p in paths]
+
+
+def test_convert_many_matches_single_file_conversion(corpus, tmp_path):
+    jobs = _jobs(corpus, tmp_path / 'out')
+    results = conv.convert_many(jobs, workers=2, depth=0)
+    assert [r.job for r in results] == jobs
+    assert all(r.ok for r in results), [r.error for r in results if not r.ok]
+    for job in jobs:
+        with open(job.src, 'rb') as fh:
+            expected = conv.convertUIDataToXML(fh.read())
+        with open(job.dst, encoding='utf-8') as fh:
+            assert fh.read() == expected
+
+
+def test_convert_many_collects_failures(corpus, tmp_path):
+    bad = tmp_path / 'bad.ui'
+    bad.write_bytes(b'Version054' + b'\xff' * 3)
+    jobs = _jobs([corpus[0]], tmp_path / 'out') + [conv.ConvertJob('unpack', str(bad), str(tmp_path / 'bad.xml'))]
+    results = conv.convert_many(jobs, workers=1, depth=0)
+    assert results[0].ok
+    assert not results[1].ok and results[1].error
+
+
+def test_convert_many_cancel_reports_remaining_jobs(corpus, tmp_path):
+    jobs = _jobs(corpus, tmp_path / 'out')
+    cancel = threading.Event()
+    seen = []
+
+    def on_result(i, res):
+        seen.append(i)
+        cancel.set()
+
+    results = conv.convert_many(jobs, workers=1, depth=0, cancel=cancel, on_result=on_result)
+    assert len(seen) == 1
+    assert all(r.cancelled for i, r in enumerate(results) if i not in seen)
+
+
+def _identical_inputs(ui_file, tmp_path, names):
+    data = open(ui_file, 'rb').read()
+    paths = []
+    for name in names:
+        path = tmp_path / 'in' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('dedupe', ['copy', 'link'])
+@pytest.mark.parametrize('depth', [0, None])
+def test_dedupe_onto_the_same_output(ui_file, tmp_path, dedupe, depth):
+    # a/panel.ui and b/panel.ui both plan onto out/panel.xml
+    jobs = _jobs(_identical_inputs(ui_file, tmp_path, ['a/panel.ui', 'b/panel.ui']), tmp_path / 'out')
+    assert jobs[0].dst == jobs[1].dst
+    results = conv.convert_many(jobs, workers=1, dedupe=dedupe, depth=depth)
+    assert all(r.ok for r in results), [r.error for r in results]
+    assert results[1].duplicate_of == jobs[0].src
+    with open(jobs[0].dst, encoding='utf-8') as fh:
+        assert fh.read() == conv.convertUIDataToXML(open(ui_file, 'rb').read())
+
+
+@pytest.mark.parametrize('dedupe', ['copy', 'link'])
+def test_dedupe_clones_outputs(ui_file, tmp_path, dedupe):
+    jobs = _jobs(_identical_inputs(ui_file, tmp_path, ['one.ui', 'two.ui']), tmp_path / 'out')
+    # A stale output is replaced, not appended to or left behind
+    with open(jobs[1].dst, 'w') as fh:
+        fh.write('stale')
+    results = conv.convert_many(jobs, workers=1, dedupe=dedupe, depth=0)
+    assert all(r.ok for r in results)
+    a, b = (open(j.dst, 'rb').read() for j in jobs)
+    assert a == b
+    assert sorted(os.listdir(tmp_path / 'out')) == sorted(os.path.basename(j.dst) for j in jobs)
+
+
+def test_failed_clone_keeps_previous_output(ui_file, tmp_path):
+    job = conv.plan_job('unpack', ui_file, str(tmp_path))
+    with open(job.dst, 'w') as fh:
+        fh.write('previous')
+    primary = conv.ConvertResult(job._replace(dst=str(tmp_path / 'missing.xml')), True)
+    res = conv._clone_output(primary, job, 'copy')
+    assert not res.ok
+    assert open(job.dst).read() == 'previous'
+    assert os.listdir(tmp_path) == [os.path.basename(job.dst)]
+
+
+@pytest.mark.parametrize('depth', [0, None])
+def test_rebuilding_a_linked_output_leaves_its_twin(ui_file, tmp_path, depth):
+    src = tmp_path / 'xml'
+    src.mkdir()
+    conv.convertUIToXML(ui_file, str(src / 'a.ui.xml'))
+    shutil.copyfile(src / 'a.ui.xml', src / 'b.ui.xml')
+    out = tmp_path / 'out'
+    out.mkdir()
+    jobs = [conv.plan_job('pack', str(src / n), str(out)) for n in ('a.ui.xml', 'b.ui.xml')]
+    assert all(r.ok for r in conv.convert_many(jobs, workers=1, dedupe='link', depth=depth))
+    a, b = (out / 'a.ui'), (out / 'b.ui')
+    assert os.path.samefile(a, b)
+    before = b.read_bytes()
+
+    xml = (src / 'a.ui.xml').read_text(encoding='utf-8')
+    (src / 'a.ui.xml').write_text(xml.replace('<xOff>0</xOff>', '<xOff>9</xOff>', 1), encoding='utf-8')
+    assert all(r.ok for r in conv.convert_many(jobs[:1], workers=1, depth=depth))
+    assert a.read_bytes() != before
+    assert b.read_bytes() == before
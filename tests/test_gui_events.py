@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+
+from uiunpack_gui import gui
+
+
+class _Log:
+    # The bits of ttk.Treeview the log uses
+    def __init__(self):
+        self.items = []
+        self.seen = None
+
+    def insert(self, parent, index, text):
+        self.items.append(text)
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *items):
+        drop = set(items)
+        self.items = [i for i in self.items if i not in drop]
+
+    def see(self, item):
+        self.seen = item
+
+
+class _Root:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, fn):
+        self.scheduled.append(ms)
+
+
+def _app():
+    # No window: only the event queue and what _drain_events touches
+    app = gui.UiUnpackPackApp.__new__(gui.UiUnpackPackApp)
+    app._events = queue.SimpleQueue()
+    app.log = _Log()
+    app.root = _Root()
+    app.shown = []
+    app._show_progress = lambda done, total: app.shown.append((done, total))
+    return app
+
+
+def test_events_are_batched_per_drain():
+    app = _app()
+    calls = []
+    app._log('one')
+    app._progress(1, 3)
+    app._call_in_ui(calls.append, 'a')
+    app._log('two')
+    app._progress(2, 3)
+    app._call_in_ui(calls.append, 'b')
+    app._drain_events()
+    assert app.log.items == ['one', 'two'] and app.log.seen == 'two'
+    # Only the latest progress is drawn
+    assert app.shown == [(2, 3)]
+    assert calls == ['a', 'b']
+    assert app.root.scheduled == [gui.DRAIN_MS]
+
+
+def test_log_is_capped(monkeypatch):
+    monkeypatch.setattr(gui, 'LOG_MAX_LINES', 5)
+    app = _app()
+    for k in range(4):
+        app._log(f'old {k}')
+    app._drain_events()
+    for k in range(8):
+        app._log(f'new {k}')
+    app._drain_events()
+    assert app.log.items == [f'new {k}' for k in range(3, 8)]
+
+
+def test_failing_call_does_not_stop_draining(capsys):
+    app = _app()
+    calls = []
+    app._call_in_ui(lambda: 1 / 0)
+    app._call_in_ui(calls.append, 'after')
+    app._drain_events()
+    assert calls == ['after']
+    assert 'ZeroDivisionError' in capsys.readouterr().err
+    assert app.root.scheduled == [gui.DRAIN_MS]
+
+
+def test_ask_in_ui_waits_for_the_main_thread():
+    app = _app()
+    answer = []
+    t = threading.Thread(target=lambda: answer.append(app._ask_in_ui(lambda x: x * 2, 21)))
+    t.start()
+    while app._events.empty():
+        time.sleep(0.01)
+    app._drain_events()
+    t.join(5)
+    assert answer == [42]
+
+
+class _Progress:
+    def config(self, **kw):
+        self.__dict__.update(kw)
+
+
+class _Text:
+    def set(self, value):
+        self.value = value
+
+
+def test_rate_is_measured_from_a_merged_start(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(gui.time, 'monotonic', lambda: clock[0])
+    app = _app()
+    del app._show_progress  # the real one
+    app._progress_start = 0.0
+    app.progress = _Progress()
+    app.progress_text = _Text()
+    app._progress(0, 1000)
+    clock[0] = 102.0
+    app._progress(10, 1000)
+    # Both arrive in one drain; only (10, 1000) is drawn
+    app._drain_events()
+    assert app.progress.value == 10
+    assert app.progress_text.value == '10/1000 files  5.0 files/s  ETA 0:03:18'
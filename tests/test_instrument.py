@@ -0,0 +1,32 @@
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import instrument
+
+
+def _jobs(paths, outdir):
+    outdir.mkdir(exist_ok=True)
+    return [conv.plan_job('unpack', p, str(outdir)) for p in paths]
+
+
+def test_inline_batch_records_stats_and_uninstalls_recorder(corpus, tmp_path, monkeypatch):
+    # Streaming drops entries as it goes, so it has no entry counts
+    monkeypatch.setattr(conv, 'STREAM_XML', False)
+    assert conv._recorder is None
+    results = conv.convert_many(_jobs(corpus, tmp_path / 'out'), workers=1, instrument=True)
+    assert all(r.ok for r in results)
+    for res in results:
+        assert res.stats['bytes_in'] > 0 and res.stats['entries'] > 0
+        assert 'decode' in res.stats['stages']
+    assert conv._recorder is None
+    # Later conversions don't pay for instrumentation
+    conv.convertUIToXML(corpus[0], str(tmp_path / 'again.xml'))
+    assert conv._recorder is None
+
+
+def test_inline_batch_keeps_an_installed_recorder(corpus, tmp_path):
+    rec = instrument.enable()
+    try:
+        conv.convert_many(_jobs(corpus[:1], tmp_path / 'out'), workers=1, instrument=True)
+        assert conv._recorder is rec
+        assert rec.files
+    finally:
+        instrument.disable()
@@ -0,0 +1,47 @@
+from xml.dom import minidom
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import lightdom
+
+
+def _walk(node):
+    # What the upstream code can see: node types, names, text, sibling order
+    out = []
+    while node is not None:
+        out.append((node.nodeType, node.nodeName, node.nodeValue))
+        if node.firstChild is not None:
+            out.append(_walk(node.firstChild))
+        node = node.nextSibling
+    return out
+
+
+def test_node_view_matches_minidom():
+    xml = '<ui>\n  <a x="1">t&amp;<![CDATA[c]]>d<!--k--><?p q?></a>\n  <b/>\n</ui>\n'
+    assert _walk(lightdom.parse_string(xml).firstChild) == _walk(minidom.parseString(xml).firstChild)
+
+
+@pytest.fixture
+def xml(ui_data) -> str:
+    return conv.convertUIDataToXML(ui_data)
+
+
+def test_light_parser_packs_same_bytes(xml, ui_data):
+    assert conv.convertXMLDataToUI(xml, parser='light') == ui_data
+    assert conv.convertXMLDataToUI(xml, parser='minidom') == ui_data
+
+
+def test_light_parser_from_file(xml, ui_data, tmp_path):
+    src = tmp_path / 'a.xml'
+    src.write_text(xml, encoding='utf-8')
+    conv.convertXMLToUI(str(src), str(tmp_path / 'a.ui'), parser='light')
+    assert (tmp_path / 'a.ui').read_bytes() == ui_data
+
+
+def test_entries_are_built_while_parsing(xml):
+    doc = lightdom.parse_string(xml, build_entries=True)
+    root = doc.getElementsByTagName('uiEntry')[0]
+    # Built and freed: nothing below the root element is kept
+    assert root._entry is not None and not root.childNodes
+
@@ -0,0 +1,63 @@
+import os
+import shutil
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui.manifest import BuildManifest
+
+
+def _job(src, outdir):
+    return conv.plan_job('unpack', str(src), str(outdir))
+
+
+def _build(manifest, job):
+    stamp = manifest.stamp(job)
+    conv.run_job(job)
+    manifest.record(job, stamp)
+    manifest.save()
+
+
+def test_unchanged_source_is_skipped(ui_file, tmp_path):
+    src = tmp_path / 'a.ui'
+    shutil.copyfile(ui_file, src)
+    job = _job(src, tmp_path)
+    manifest = BuildManifest(str(tmp_path))
+    assert manifest.needs_build(job)
+    _build(manifest, job)
+    assert not BuildManifest(str(tmp_path)).needs_build(job)
+
+
+def test_touched_but_identical_source_is_skipped(ui_file, tmp_path):
+    src = tmp_path / 'a.ui'
+    shutil.copyfile(ui_file, src)
+    job = _job(src, tmp_path)
+    _build(BuildManifest(str(tmp_path)), job)
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not BuildManifest(str(tmp_path)).needs_build(job)
+
+
+def test_edited_source_or_output_is_rebuilt(corpus, ui_file, tmp_path):
+    src = tmp_path / 'a.ui'
+    shutil.copyfile(ui_file, src)
+    job = _job(src, tmp_path)
+    _build(BuildManifest(str(tmp_path)), job)
+    with open(job.dst, 'a', encoding='utf-8') as fh:
+        fh.write('<!-- edited -->')
+    assert BuildManifest(str(tmp_path)).needs_build(job)
+    _build(BuildManifest(str(tmp_path)), job)
+    shutil.copyfile(corpus[0], src)
+    assert BuildManifest(str(tmp_path)).needs_build(job)
+
+
+def test_source_edited_during_conversion_is_rebuilt(corpus, ui_file, tmp_path):
+    src = tmp_path / 'a.ui'
+    shutil.copyfile(ui_file, src)
+    job = _job(src, tmp_path)
+    manifest = BuildManifest(str(tmp_path))
+    stamp = manifest.stamp(job)
+    conv.run_job(job)
+    # Saved over after the conversion read it, before the manifest records it
+    shutil.copyfile(corpus[0], src)
+    manifest.record(job, stamp)
+    manifest.save()
+    assert BuildManifest(str(tmp_path)).needs_build(job)
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from uiunpack_gui import packfile
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    packfile.close_all()
+    yield
+    packfile.close_all()
+
+
+def _pack(path, members, version='PFH0'):
+    packfile.write_pack(str(path), members, version)
+    return str(path)
+
+
+@pytest.mark.parametrize('version', packfile.PACK_VERSIONS)
+def test_round_trip(tmp_path, ui_data, version):
+    path = _pack(tmp_path / 'a.pack', [('ui/x.ui', ui_data), ('ui/readme.txt', b'hello')], version)
+    with packfile.PackFile(path) as pack:
+        assert [e.name for e in pack.entries] == ['ui/x.ui', 'ui/readme.txt']
+        assert bytes(pack.read('UI\\X.UI')) == ui_data
+        assert [(e.name, v) for e, v in pack.ui_entries()] == [('ui/x.ui', int(ui_data[7:10]))]
+    member = packfile.member_path(path, 'ui/x.ui')
+    assert packfile.scan_pack(path) == [(os.path.abspath(member), int(ui_data[7:10]))]
+    assert bytes(packfile.read_member(member)) == ui_data
+
+
+def test_changed_pack_closes_old_mapping(tmp_path):
+    path = _pack(tmp_path / 'a.pack', [('ui/a', b'one')])
+    old = packfile.open_pack(path)
+    view = packfile.read_member(packfile.member_path(path, 'ui/a'))
+    _pack(tmp_path / 'a.pack', [('ui/a', b'two!')])
+    os.utime(path, ns=(0, 0))
+    new = packfile.open_pack(path)
+    assert new is not old and old._mv is None
+    assert bytes(new.read('ui/a')) == b'two!'
+    # Views handed out earlier stay readable
+    assert bytes(view) == b'one'
+
+
+def test_cache_is_bounded(tmp_path):
+    paths = [_pack(tmp_path / f'{i}.pack', [('ui/a', b'x')]) for i in range(packfile.OPEN_PACKS + 2)]
+    packs = [packfile.open_pack(p) for p in paths]
+    assert len(packfile._open) == packfile.OPEN_PACKS
+    assert packs[0]._mv is None and packs[-1]._mv is not None
+    with pytest.raises(packfile.PackError):
+        packs[0].read('ui/a')
+    # Reopened on demand
+    assert bytes(packfile.read_member(packfile.member_path(paths[0], 'ui/a'))) == b'x'
+
+
+def test_close_all(tmp_path):
+    pack = packfile.open_pack(_pack(tmp_path / 'a.pack', [('ui/a', b'x')]))
+    packfile.close_all()
+    assert not packfile._open and pack._mv is None
@@ -0,0 +1,80 @@
+import os
+import threading
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import pipeline
+
+
+def _jobs(paths, outdir):
+    outdir.mkdir(exist_ok=True)
+    return [conv.plan_job('unpack', p, str(outdir)) for p in paths]
+
+
+def _outputs(jobs):
+    out = {}
+    for job in jobs:
+        with open(job.dst, 'rb') as fh:
+            out[os.path.basename(job.dst)] = fh.read()
+    return out
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_matches_one_file_at_a_time(corpus, tmp_path, workers):
+    serial = _jobs(corpus, tmp_path / 'serial')
+    conv.convert_many(serial, workers=1, depth=0)
+    piped = _jobs(corpus, tmp_path / 'piped')
+    results = conv.convert_many(piped, workers=workers, depth=2)
+    assert [r.job for r in results] == piped
+    assert all(r.ok and r.data is None for r in results)
+    assert _outputs(piped) == _outputs(serial)
+    assert sorted(os.listdir(tmp_path / 'piped')) == sorted(os.listdir(tmp_path / 'serial'))
+
+
+def test_conversion_and_read_errors_are_reported(corpus, tmp_path):
+    bad = tmp_path / 'bad.ui'
+    bad.write_bytes(b'Version054' + b'\xff' * 3)
+    jobs = _jobs([corpus[0], str(bad)], tmp_path / 'out')
+    jobs.append(conv.ConvertJob('unpack', str(tmp_path / 'missing.ui'), str(tmp_path / 'out' / 'missing.xml')))
+    results = conv.convert_many(jobs, workers=1, depth=4)
+    assert results[0].ok
+    assert not results[1].ok and results[1].detail
+    assert not results[2].ok and results[2].detail
+    assert os.listdir(tmp_path / 'out') == [os.path.basename(jobs[0].dst)]
+
+
+def test_cancel_stops_reading(corpus, tmp_path):
+    jobs = _jobs(corpus * 8, tmp_path / 'out')
+    cancel = threading.Event()
+    finished = []
+
+    def finish(i, res):
+        finished.append(i)
+        cancel.set()
+
+    pipeline.run(jobs, range(len(jobs)), finish, depth=1, readers=1, writers=1, cancel=cancel)
+    assert 1 <= len(finished) < len(jobs)
+
+
+def test_failing_finish_stops_the_stages(corpus, tmp_path):
+    jobs = _jobs(corpus * 4, tmp_path / 'out')
+    before = threading.active_count()
+
+    def finish(i, res):
+        raise RuntimeError('callback failed')
+
+    with pytest.raises(RuntimeError, match='callback failed'):
+        pipeline.run(jobs, range(len(jobs)), finish, depth=2)
+    assert threading.active_count() == before
+    assert not [n for n in os.listdir(tmp_path / 'out') if n.endswith('.tmp')]
+
+
+def test_crlf_only_for_python_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, 'linesep', '\r\n')
+    py = conv.ConvertJob('unpack', 'a.ui', str(tmp_path / 'a.xml'))
+    ruby = conv.ConvertJob('unpack', 'b.ui', str(tmp_path / 'b.xml'), 'ruby')
+    pipeline._write_output(py, b'<a>\n</a>\n')
+    pipeline._write_output(ruby, b'<b>\r\n</b>\r\n')
+    assert (tmp_path / 'a.xml').read_bytes() == b'<a>\r\n</a>\r\n'
+    assert (tmp_path / 'b.xml').read_bytes() == b'<b>\r\n</b>\r\n'
@@ -0,0 +1,57 @@
+import io
+from xml.dom.minidom import parseString
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import query
+
+
+def _text(node, tag):
+    found = [c for c in node.childNodes if c.nodeType == c.ELEMENT_NODE and c.tagName == tag]
+    return ''.join(t.data for t in found[0].childNodes) if found else None
+
+
+def _xml(path):
+    with open(path, 'rb') as fh:
+        return parseString(conv.convertUIDataToXML(fh.read()))
+
+
+def test_index_matches_full_decode(corpus):
+    for path in corpus:
+        dom = _xml(path)
+        entries = dom.getElementsByTagName('uiEntry')
+        index = query.UiIndex.build(path)
+        assert len(index) == len(entries)
+        assert [index.name(i) for i in range(len(index))] == [_text(e, query.NAME_FIELD) for e in entries]
+        assert index.parent(0) == -1
+        assert all(index.parent(j) == i for i in range(len(index)) for j in index.children(i))
+
+
+def test_cached_index_is_the_same(ui_file):
+    built = query.UiIndex.build(ui_file)
+    assert query.UiIndex.load(ui_file).entries == built.entries
+    # Second load comes from the cache file
+    assert query.UiIndex.load(ui_file).entries == built.entries
+
+
+def test_tgas_and_scripts(corpus):
+    for path in corpus:
+        dom = _xml(path)
+        assert query.tga_paths(path) == [_text(t, 'path') for t in dom.getElementsByTagName('tga')]
+        expected = [_text(e, 'script') for e in dom.getElementsByTagName('uiEntry')]
+        assert [text for _, field, text in query.iter_scripts(path) if field == 'script'] == \
+            [s for s in expected if s]
+
+
+def test_find_component(ui_file):
+    with open(ui_file, 'rb') as fh:
+        xml = conv.convertUIDataToXML(fh.read())
+    child = parseString(xml).getElementsByTagName('uiEntry')[1]
+    name = _text(child, query.NAME_FIELD)
+    shallow = query.find_component(ui_file, name, deep=False)
+    assert getattr(shallow, query.NAME_FIELD) == name
+    deep = query.find_component(ui_file, name)
+    out = io.StringIO()
+    deep.writeToXML(out)
+    # Same indentation as in the full export, so the subtree appears verbatim
+    assert out.getvalue() in xml
+    assert query.find_component(ui_file, 'no such component') is None
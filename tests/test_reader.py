@@ -0,0 +1,32 @@
+import io
+
+from uiunpack_gui import etw_ui_convert as conv
+
+
+def _decode(reader):
+    ns = conv._exec_upstream()
+    version = int(reader.read(10)[7:10])
+    entry = ns['UiEntry'](version, 1)
+    entry.readFrom(reader)
+    return version, entry
+
+
+def _xml(entry) -> str:
+    buf = io.StringIO()
+    entry.writeToXML(buf)
+    return buf.getvalue()
+
+
+def test_memory_reader_decodes_like_typecast_reader(ui_data):
+    _, old = _decode(conv.TypeCastReader(io.BytesIO(ui_data)))
+    with conv.MemoryReader(ui_data) as reader:
+        _, new = _decode(reader)
+        assert reader.tell() == len(ui_data)
+    assert _xml(new) == _xml(old)
+
+
+def test_memory_reader_on_a_view(ui_data):
+    with conv.MemoryReader(memoryview(bytearray(ui_data))) as reader:
+        _, new = _decode(reader)
+    _, old = _decode(conv.TypeCastReader(io.BytesIO(ui_data)))
+    assert _xml(new) == _xml(old)
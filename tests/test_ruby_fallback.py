@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import ruby_server
+
+pytestmark = [
+    pytest.mark.skipif(sys.platform == 'win32', reason='fake ruby is a shell script'),
+    pytest.mark.skipif(conv._data_root() is None, reason='etwng/ui not found'),
+]
+
+# Exits 3 when asked to run the worker server (-e), like a Ruby that can't;
+# run as `ruby SCRIPT SRC DST` it "converts" by copying
+_FAKE_RUBY = '''#!/bin/sh
+echo "$1" >> "$(dirname "$0")/calls.log"
+if [ "$1" = "-e" ]; then exit 3; fi
+cp "$2" "$3"
+'''
+
+
+@pytest.fixture
+def fake_ruby(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    exe = bin_dir / 'ruby'
+    exe.write_text(_FAKE_RUBY)
+    exe.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setattr(conv, 'RUBY_SERVER', True)
+    monkeypatch.setattr(ruby_server, '_pool', None)
+    monkeypatch.setattr(ruby_server, '_pool_failed', False)
+    return bin_dir / 'calls.log'
+
+
+def _calls(log) -> list[str]:
+    return log.read_text().split()
+
+
+def test_worker_start_failure_falls_back_to_one_process_per_file(fake_ruby, tmp_path):
+    src = tmp_path / 'a.ui'
+    src.write_bytes(b'layout')
+    conv.ruby_ui2xml(str(src), str(tmp_path / 'a.xml'))
+    assert (tmp_path / 'a.xml').read_bytes() == b'layout'
+    assert _calls(fake_ruby)[0] == '-e'
+
+
+def test_workers_are_not_retried_after_failing_to_start(fake_ruby, tmp_path):
+    src = tmp_path / 'a.ui'
+    src.write_bytes(b'layout')
+    conv.ruby_ui2xml(str(src), str(tmp_path / 'a.xml'))
+    conv.ruby_ui2xml(str(src), str(tmp_path / 'b.xml'))
+    assert _calls(fake_ruby).count('-e') == 1
+    assert (tmp_path / 'b.xml').read_bytes() == b'layout'
+
+
+# A worker that speaks the server protocol. Every start, request and plain
+# run is logged with its pid. Jobs whose input is `hang` never answer (plain
+# runs of it hang too); while `die.flag` exists the next request kills the
+# worker instead, once.
+_FAKE_WORKER = '''#!{python}
+import json, os, shutil, sys, time
+here = os.path.dirname(os.path.abspath(__file__))
+def log(what):
+    with open(os.path.join(here, 'calls.log'), 'a') as fh:
+        fh.write(f'{{what}}:{{os.getpid()}}\\n')
+def convert(src, dst):
+    with open(src, 'rb') as fh:
+        if fh.read() == b'hang':
+            time.sleep(60)
+    shutil.copyfile(src, dst)
+if sys.argv[1] != '-e':
+    log('run')
+    convert(sys.argv[2], sys.argv[3])
+    sys.exit(0)
+log('start')
+print(json.dumps({{'ready': True, 'pid': os.getpid()}}), flush=True)
+for line in sys.stdin:
+    req = json.loads(line)
+    log(req['op'])
+    flag = os.path.join(here, 'die.flag')
+    if os.path.exists(flag):
+        os.remove(flag)
+        os._exit(1)
+    if req['op'] != 'ping':
+        convert(req['src'], req['dst'])
+    print(json.dumps({{'id': req['id'], 'ok': True}}), flush=True)
+'''
+
+
+@pytest.fixture
+def fake_worker(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    exe = bin_dir / 'ruby'
+    exe.write_text(_FAKE_WORKER.format(python=sys.executable))
+    exe.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setattr(conv, 'RUBY_SERVER', True)
+    monkeypatch.setattr(ruby_server, '_pool', None)
+    monkeypatch.setattr(ruby_server, '_pool_failed', False)
+    yield bin_dir
+    if ruby_server._pool is not None:
+        ruby_server._pool.close()
+
+
+def _log(bin_dir) -> list[tuple[str, str]]:
+    path = bin_dir / 'calls.log'
+    return [tuple(line.split(':')) for line in path.read_text().split()] if path.exists() else []
+
+
+def _convert(tmp_path, name, data=b'layout'):
+    src = tmp_path / f'{name}.ui'
+    src.write_bytes(data)
+    conv.ruby_ui2xml(str(src), str(tmp_path / f'{name}.xml'))
+    return (tmp_path / f'{name}.xml').read_bytes()
+
+
+def test_one_worker_serves_every_job(fake_worker, tmp_path):
+    for name in 'abc':
+        assert _convert(tmp_path, name) == b'layout'
+    log = _log(fake_worker)
+    assert [what for what, _ in log] == ['start', 'ui2xml', 'ui2xml', 'ui2xml']
+    assert len({pid for _, pid in log}) == 1
+
+
+def test_crashed_worker_is_restarted(fake_worker, tmp_path):
+    _convert(tmp_path, 'a')
+    (fake_worker / 'die.flag').touch()
+    assert _convert(tmp_path, 'b') == b'layout'
+    assert _convert(tmp_path, 'c') == b'layout'
+    log = _log(fake_worker)
+    assert [what for what, _ in log] == ['start', 'ui2xml', 'ui2xml', 'start', 'ui2xml', 'ui2xml']
+    # The retry and the next job ran on the new worker
+    assert log[0][1] == log[2][1] != log[3][1] == log[5][1]
+
+
+def test_idle_worker_is_pinged_and_replaced_if_dead(fake_worker, tmp_path, monkeypatch):
+    monkeypatch.setattr(ruby_server, 'PING_AFTER', 0)
+    _convert(tmp_path, 'a')
+    time.sleep(0.01)
+    _convert(tmp_path, 'b')
+    (fake_worker / 'die.flag').touch()
+    time.sleep(0.01)
+    assert _convert(tmp_path, 'c') == b'layout'
+    assert [what for what, _ in _log(fake_worker)] == [
+        'start', 'ui2xml', 'ping', 'ui2xml', 'ping', 'start', 'ui2xml']
+
+
+def test_hung_job_times_out(fake_worker, tmp_path, monkeypatch):
+    monkeypatch.setattr(ruby_server, 'JOB_TIMEOUT', 0.5)
+    with pytest.raises(subprocess.TimeoutExpired):
+        _convert(tmp_path, 'a', b'hang')
+    # Two workers tried it, then one plain run, and no output is left behind
+    assert [what for what, _ in _log(fake_worker)] == ['start', 'ui2xml', 'start', 'ui2xml', 'run']
+    assert sorted(os.listdir(tmp_path)) == ['a.ui', 'bin']
+    assert _convert(tmp_path, 'b') == b'layout'
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import packfile, scan
+
+
+def _tree(corpus, root):
+    (root / 'sub').mkdir(parents=True)
+    layouts = []
+    for k, p in enumerate(corpus[:3]):
+        dst = root / ('sub' if k else '') / os.path.basename(p)
+        shutil.copyfile(p, dst)
+        layouts.append((str(dst), int(os.path.basename(p).split('_v')[1][:3])))
+    (root / 'notes.txt').write_text('not a layout')
+    with open(corpus[0], 'rb') as fh:
+        packfile.write_pack(str(root / 'mod.pack'), [('ui/in_pack', fh.read())])
+    return layouts
+
+
+def test_unpack_finds_layouts_and_pack_members(corpus, tmp_path):
+    layouts = _tree(corpus, tmp_path / 'in')
+    index = scan.ScanIndex(str(tmp_path / 'index.json'))
+    found = scan.scan_inputs(str(tmp_path / 'in'), 'unpack', index=index)
+    member = packfile.member_path(str(tmp_path / 'in' / 'mod.pack'), 'ui/in_pack')
+    assert sorted(found) == sorted(layouts + [(member, layouts[0][1])])
+
+
+def test_index_skips_unchanged_files(corpus, tmp_path, monkeypatch):
+    layouts = _tree(corpus, tmp_path / 'in')
+    index_path = str(tmp_path / 'index.json')
+    index = scan.ScanIndex(index_path)
+    first = scan.scan_inputs(str(tmp_path / 'in'), 'unpack', index=index)
+    index.save()
+
+    probed = []
+    real_probe = scan._probe
+    monkeypatch.setattr(scan, '_probe', lambda mode, path: probed.append(path) or real_probe(mode, path))
+    index = scan.ScanIndex(index_path)
+    assert scan.scan_inputs(str(tmp_path / 'in'), 'unpack', index=index) == first
+    assert probed == []
+
+    # An edited file is probed again and a deleted one forgotten
+    edited, removed = layouts[1][0], layouts[2][0]
+    with open(edited, 'r+b') as fh:
+        fh.write(b'NotAUi')
+    os.remove(removed)
+    found = scan.scan_inputs(str(tmp_path / 'in'), 'unpack', index=index)
+    assert probed == [edited]
+    assert {p for p, _ in found}.isdisjoint({edited, removed})
+    assert removed not in index.entries['unpack']
+
+
+def test_pack_mode_reads_xml_versions(ui_file, tmp_path):
+    conv.convertUIToXML(ui_file, str(tmp_path / 'a.xml'))
+    (tmp_path / 'b.xml').write_text('<ui></ui>')
+    (tmp_path / 'c.ui').write_bytes(b'Version054')
+    found = scan.scan_inputs(str(tmp_path), 'pack', index=scan.ScanIndex(str(tmp_path / 'i.json')))
+    assert found == [(str(tmp_path / 'a.xml'), 54), (str(tmp_path / 'b.xml'), None)]
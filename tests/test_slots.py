@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _decode(data):
+    with conv.MemoryReader(data) as reader:
+        return conv._decode_ui(reader, '<test>')[1]
+
+
+def _walk(node):
+    yield node
+    for value in conv._record_fields(node).values():
+        if type(value) is list and value and hasattr(value[0], 'readFrom'):
+            for item in value:
+                yield from _walk(item)
+
+
+@pytest.mark.skipif(not conv.SPECIALIZE, reason='slots come with the specialised classes')
+def test_records_have_no_instance_dict(ui_data):
+    nodes = list(_walk(_decode(ui_data)))
+    assert len(nodes) > 1
+    assert not any(hasattr(n, '__dict__') for n in nodes)
+
+
+def test_repeated_strings_are_shared():
+    with conv.MemoryReader(b'\x03\x00abc\x03\x00abc\x01\x00a\x00\x01\x00a\x00') as reader:
+        a, b = reader.readASCII(), reader.readASCII()
+        c, d = reader.readUTF16(), reader.readUTF16()
+    assert a == 'abc' and a is b
+    assert c == 'a' and c is d
+
+
+def test_output_is_the_same_without_slots(ui_file):
+    code = ('import sys\nfrom uiunpack_gui import etw_ui_convert as c\n'
+            f'sys.stdout.write(c.convertUIDataToXML(open({ui_file!r}, "rb").read()))')
+    env = dict(os.environ, UIUNPACK_SLOTS='0')
+    plain = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env, text=True)
+    with open(ui_file, 'rb') as fh:
+        assert plain == conv.convertUIDataToXML(fh.read())
@@ -0,0 +1,82 @@
+import ast
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import specialize
+
+
+def _fix(src: str, version: int) -> str:
+    tree = ast.parse(f'class C:\n    def readFrom(self, handle):\n        {src}\n')
+    return ast.unparse(ast.fix_missing_locations(specialize._FixVersion(version).visit(tree)))
+
+
+def test_version_checks_fold_away():
+    assert 'readByte' not in _fix('if self.version >= 50 and handle.readByte(): pass', 40)
+    assert 'version' not in _fix('if self.version >= 50 and handle.readByte(): pass', 54)
+
+
+def test_reads_before_a_deciding_constant_are_kept():
+    out = _fix('if handle.readByte() and self.version >= 50: self.x = 1', 40)
+    assert 'handle.readByte()' in out
+    out = _fix('if handle.readByte() or self.version >= 50: self.x = 1', 54)
+    assert 'handle.readByte()' in out
+
+
+def test_specialised_output_matches_generic(corpus):
+    assert specialize.check(corpus) == []
+
+
+def test_check_restores_the_specialize_setting(ui_file, monkeypatch):
+    monkeypatch.setattr(conv, 'SPECIALIZE', False)
+    specialize.check([ui_file])
+    assert conv.SPECIALIZE is False
+
+
+def test_cached_namespaces_follow_the_flag(monkeypatch):
+    from uiunpack_gui import lightdom, query, stream
+    classes = {}
+    for flag in (True, False):
+        monkeypatch.setattr(conv, 'SPECIALIZE', flag)
+        classes[flag] = (lightdom._entry_class(54), stream._entry_class(54), query._cached_ns('full', 54)['UiEntry'])
+    for fast, generic in zip(classes[True], classes[False]):
+        assert fast is not generic
+
+
+def test_check_uses_the_generic_light_parser(corpus, monkeypatch):
+    # A specialised build that gets one field wrong must be caught on the
+    # light parser's path too
+    monkeypatch.setattr(conv, 'XML_PARSER', 'light')
+    real = specialize.new_namespace
+
+    def broken(version):
+        ns = real(version)
+        base = ns['UiEntry']
+
+        def writeTo(self, handle, _base=base):
+            self.xOff += 1
+            try:
+                _base.writeTo(self, handle)
+            finally:
+                self.xOff -= 1
+        ns['UiEntry'] = type('UiEntry', (base,), {'writeTo': writeTo, '__module__': base.__module__,
+                                                  '__slots__': ()})
+        return ns
+
+    monkeypatch.setattr(specialize, 'new_namespace', broken)
+    monkeypatch.setattr(specialize, '_namespaces', {})
+    from uiunpack_gui import lightdom
+    monkeypatch.setattr(lightdom, '_namespaces', {})
+    problems = specialize.check(corpus[:1])
+    assert problems and problems[0].endswith('.ui differs')
+
+
+def test_failed_specialisation_is_reported(monkeypatch, capsys):
+    def fail(version):
+        raise RuntimeError('cannot specialise')
+
+    monkeypatch.setattr(specialize, 'new_namespace', fail)
+    monkeypatch.setattr(conv, '_specialize_failed', set())
+    monkeypatch.setattr(conv, 'SPECIALIZE', True)
+    ns = conv.record_namespace(54)
+    assert 'UiEntry' in ns
+    assert 54 in conv._specialize_failed
+    assert 'cannot specialise' in capsys.readouterr().err
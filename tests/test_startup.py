@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LAZY = ('tkinter', 'uiunpack_gui.archive', 'uiunpack_gui.packfile', 'uiunpack_gui.lightdom',
+         'zipfile', 'tarfile', 'lzma', 'xml.dom.minidom', 'concurrent.futures')
+
+
+def _loaded_after(code: str) -> set[str]:
+    probe = f'import sys\n{code}\nprint(",".join(m for m in {_LAZY!r} if m in sys.modules))'
+    out = subprocess.check_output([sys.executable, '-c', probe], cwd=ROOT, text=True)
+    return set(filter(None, out.strip().split(',')))
+
+
+def test_import_loads_no_optional_modules():
+    assert _loaded_after('from uiunpack_gui import etw_ui_convert') == set()
+
+
+def test_plain_file_conversion_stays_lean(ui_file, tmp_path):
+    code = f'from uiunpack_gui import etw_ui_convert as c; c.convertUIToXML({ui_file!r}, {str(tmp_path / "a.xml")!r})'
+    # The upstream converter imports minidom itself
+    assert _loaded_after(code) <= {'xml.dom.minidom'}
@@ -0,0 +1,22 @@
+import io
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import stream
+
+
+def test_streamed_xml_matches(ui_data):
+    buf = io.StringIO()
+    assert stream.stream_data(ui_data, buf) == int(ui_data[7:10])
+    assert buf.getvalue() == conv.convertUIDataToXML(ui_data)
+
+
+def test_job_data_is_the_same_with_streaming(ui_data, monkeypatch):
+    job = conv.ConvertJob('unpack', 'x.ui', 'x.xml')
+    expected = conv.convertUIDataToXML(ui_data).encode('utf-8')
+    for flag in (False, True):
+        monkeypatch.setattr(conv, 'STREAM_XML', flag)
+        assert conv.convert_job_data(job, ui_data) == expected
+
+
+def test_check(corpus):
+    assert stream.check(corpus) == []
@@ -0,0 +1,88 @@
+import os
+import struct
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import transcode
+
+
+def test_same_version_is_byte_identical(ui_data):
+    blob, report = transcode.transcode_data(ui_data, int(ui_data[7:10]))
+    assert blob == ui_data
+    assert not report.lossy
+
+
+def _version(corpus, ver):
+    with open(next(p for p in corpus if f'_v{ver:03d}_' in p), 'rb') as fh:
+        return fh.read()
+
+
+def _issues(report, kind):
+    return {(i.record, i.field): i for i in report.issues if i.kind == kind}
+
+
+def test_downgrade_reports_dropped_fields(corpus):
+    blob, report = transcode.transcode_data(_version(corpus, 54), 32)
+    assert blob[:10] == b'Version032'
+    # Decodes as a 032 layout, and the shared fields came along
+    xml = conv.convertUIDataToXML(blob)
+    assert conv.convertXMLDataToUI(xml) == blob
+    assert '<version>032</version>' in xml
+
+    dropped = _issues(report, 'dropped')
+    assert {'UiEntry.title2', 'UiEntry.string10', 'State.xOff'} <= {f'{r}.{f}' for r, f in dropped}
+    title = dropped['UiEntry', 'title2']
+    assert title.records and title.nondefault == title.records
+    assert dropped['State', 'xOff'].nondefault == 0
+    assert not _issues(report, 'defaulted')
+    assert report.lossy
+    assert 'dropped   UiEntry.title2' in report.format()
+
+
+def test_upgrade_reports_defaulted_fields(corpus):
+    old = _version(corpus, 32)
+    blob, report = transcode.transcode_data(old, 54)
+    assert blob[:10] == b'Version054'
+    assert conv.convertXMLDataToUI(conv.convertUIDataToXML(blob)) == blob
+
+    defaulted = _issues(report, 'defaulted')
+    assert {'UiEntry.title2', 'UiEntry.string10', 'State.xOff'} <= {f'{r}.{f}' for r, f in defaulted}
+    assert not _issues(report, 'dropped') and not report.lossy
+    # The defaults are all that was added: going back loses nothing
+    back, report = transcode.transcode_data(blob, 32)
+    assert back == old
+    assert not report.lossy and _issues(report, 'dropped')
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_strict_refuses_lossy_files(corpus, tmp_path, monkeypatch, capsys, strict):
+    src = tmp_path / 'in'
+    src.mkdir()
+    for ver in (54, 32):
+        (src / f'v{ver:03d}.ui').write_bytes(_version(corpus, ver))
+    out = tmp_path / 'out'
+    monkeypatch.setattr('sys.argv', ['transcode', '--to', '32', '--outdir', str(out), str(src)]
+                        + ['--strict'] * strict)
+    with pytest.raises(SystemExit) as exc:
+        transcode.main()
+    if strict:
+        assert exc.value.code == 1
+        assert sorted(os.listdir(out)) == ['v032.ui']
+        assert 'SKIPPED' in capsys.readouterr().err
+    else:
+        assert exc.value.code == 0
+        assert sorted(os.listdir(out)) == ['v032.ui', 'v054.ui']
+    assert (out / 'v032.ui').read_bytes() == _version(corpus, 32)
+
+
+def test_strings_are_read_as_stored():
+    text = 'a & <b>\r'
+    data = (struct.pack('<H', len(text)) + text.encode('ascii')
+            + struct.pack('<H', len(text)) + text.encode('utf-16-le'))
+    with transcode._RawReader(data) as raw:
+        assert raw.readASCII() == text
+        assert raw.readUTF16() == text
+    with conv.MemoryReader(data) as xml:
+        assert xml.readASCII() == 'a &amp; &lt;b&gt;&#x0D;'
+        assert xml.readUTF16() == 'a &amp; &lt;b&gt;&#x0D;'
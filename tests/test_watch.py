@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+import pytest
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui import watch
+
+
+@pytest.fixture
+def xml_dir(ui_file, tmp_path):
+    d = tmp_path / 'xml'
+    d.mkdir()
+    conv.convertUIToXML(ui_file, str(d / 'panel.ui.xml'))
+    return d
+
+
+def _edit(path, old, new):
+    text = path.read_text(encoding='utf-8')
+    path.write_text(text.replace(old, new, 1), encoding='utf-8')
+    st = os.stat(path)
+    # Coarse filesystem clocks: make sure the edit is visible as a change
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_sync_converts_only_stale_files(ui_file, xml_dir, tmp_path):
+    w = watch.Watcher(str(xml_dir), str(tmp_path / 'out'), poll=True)
+    try:
+        first = w.sync()
+        assert [r.ok for r in first] == [True]
+        with open(first[0].job.dst, 'rb') as fh, open(ui_file, 'rb') as orig:
+            assert fh.read() == orig.read()
+        assert w.sync() == []
+        _edit(xml_dir / 'panel.ui.xml', '<xOff>0</xOff>', '<xOff>7</xOff>')
+        again = w.sync()
+        assert [r.ok for r in again] == [True]
+        assert sorted(os.listdir(tmp_path / 'out')) == ['.uiunpack-manifest.json', 'panel.ui']
+    finally:
+        w.backend.close()
+
+
+def test_outputs_mirror_subfolders(ui_file, xml_dir, tmp_path):
+    for sub, x in (('a', '1'), ('b', '2')):
+        (xml_dir / sub).mkdir()
+        text = (xml_dir / 'panel.ui.xml').read_text(encoding='utf-8')
+        (xml_dir / sub / 'panel.ui.xml').write_text(text.replace('<xOff>0</xOff>', f'<xOff>{x}</xOff>', 1),
+                                                    encoding='utf-8')
+    out = tmp_path / 'out'
+    w = watch.Watcher(str(xml_dir), str(out), poll=True)
+    try:
+        assert all(r.ok for r in w.sync())
+    finally:
+        w.backend.close()
+    with open(ui_file, 'rb') as fh:
+        assert (out / 'panel.ui').read_bytes() == fh.read()
+    for sub in ('a', 'b'):
+        expected = conv.convertXMLDataToUI((xml_dir / sub / 'panel.ui.xml').read_bytes())
+        assert (out / sub / 'panel.ui').read_bytes() == expected
+    assert (out / 'a' / 'panel.ui').read_bytes() != (out / 'b' / 'panel.ui').read_bytes()
+
+
+def test_bad_xml_is_reported_and_keeps_the_old_output(xml_dir, tmp_path):
+    reported = []
+    w = watch.Watcher(str(xml_dir), str(tmp_path / 'out'), poll=True, on_result=reported.append)
+    try:
+        w.sync()
+        dst = tmp_path / 'out' / 'panel.ui'
+        before = dst.read_bytes()
+        _edit(xml_dir / 'panel.ui.xml', '<xOff>0</xOff>', '<xOff>zero</xOff>')
+        results = w.sync()
+        assert [r.ok for r in results] == [False] and results[0].error
+        assert reported[-1] is results[0]
+        assert dst.read_bytes() == before
+        assert not [n for n in os.listdir(tmp_path / 'out') if n.endswith('.tmp')]
+    finally:
+        w.backend.close()
+
+
+def test_run_repacks_saved_files(xml_dir, tmp_path):
+    done = threading.Event()
+    w = watch.Watcher(str(xml_dir), str(tmp_path / 'out'), poll=True, debounce=0.05, interval=0.05,
+                      on_result=lambda res: done.set())
+    stop = threading.Event()
+    t = threading.Thread(target=w.run, args=(stop,))
+    t.start()
+    try:
+        time.sleep(0.1)
+        _edit(xml_dir / 'panel.ui.xml', '<xOff>0</xOff>', '<xOff>3</xOff>')
+        assert done.wait(10)
+    finally:
+        stop.set()
+        t.join(10)
+    assert not t.is_alive()
+    assert (tmp_path / 'out' / 'panel.ui').exists()
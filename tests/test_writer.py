@@ -0,0 +1,28 @@
+import io
+from xml.dom.minidom import parseString
+
+from uiunpack_gui import etw_ui_convert as conv
+
+
+def test_buffer_writer_matches_typecast_writer(ui_data):
+    # Decoded strings are still XML-escaped, so build the tree from XML
+    # the way packing does
+    dom = parseString(conv.convertUIDataToXML(ui_data))
+    version = int(dom.getElementsByTagName('version')[0].firstChild.nodeValue)
+    entry = conv._exec_upstream()['UiEntry'](version, 0)
+    entry.constructFromNode(dom.getElementsByTagName('version')[0].nextSibling.nextSibling)
+    raw = io.BytesIO()
+    old = conv.TypeCastWriter(raw)
+    old.write(b'Version%03d' % version)
+    entry.writeTo(old)
+    old.flush()
+    new = conv.BufferWriter()
+    new.write(b'Version%03d' % version)
+    entry.writeTo(new)
+    assert new.getvalue() == raw.getvalue() == ui_data
+
+
+def test_round_trip_is_byte_identical(corpus):
+    for path in corpus:
+        with open(path, 'rb') as fh:
+            assert conv.roundtrip_ui(fh.read()), path
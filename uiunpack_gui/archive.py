@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+
+# Zip and tar archives as a batch output sink and input source.
+#
+# A full unpack writes thousands of small XML files; on network shares and
+# CI artifact storage the per-file overhead costs more than converting them.
+# ArchiveSink streams each converted file into one .zip, .tar, .tar.gz or
+# .tar.zst (the last needs the optional `zstandard` package) as results come
+# in; the archive is written under a temporary name and renamed into place
+# when complete. Archives are also read as inputs, with members addressed
+# like pack members: `C:/work/ui_xml.zip::ui/frontend.xml`.
+#
+# Zip members are read on demand; a plain .tar is memory-mapped and handed
+# out as zero-copy slices; compressed tars can't be read out of order, so
+# they are decompressed into memory when opened. A few archives stay open
+# between reads; batches close them all when done.
+#
+#   python -m uiunpack_gui.archive OUT.zip INPUTS... [--mode unpack|pack] [--level N]
+
+import io
+import mmap
+import os
+import re
+import tarfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+from uiunpack_gui.packfile import PACK_SEP, member_path, split_pack_path
+
+# Extension -> (container, compression)
+ARCHIVE_FORMATS = {
+    '.zip': ('zip', None),
+    '.tar': ('tar', None),
+    '.tar.gz': ('tar', 'gz'),
+    '.tgz': ('tar', 'gz'),
+    '.tar.zst': ('tar', 'zst'),
+    '.tzst': ('tar', 'zst'),
+}
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def archive_format(path: str) -> tuple[str, str | None] | None:
+    lower = path.lower()
+    for ext, fmt in ARCHIVE_FORMATS.items():
+        if lower.endswith(ext):
+            return fmt
+    return None
+
+
+def is_archive(path: str) -> bool:
+    return archive_format(path) is not None
+
+
+def is_archive_path(path: str) -> bool:
+    """True for an `archive::member` path (as opposed to a pack member)."""
+    return PACK_SEP in path and is_archive(split_pack_path(path)[0])
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ArchiveError('.tar.zst archives need the zstandard package (pip install zstandard)') from None
+    return zstandard
+
+
+# Reading
+
+class ArchiveFile:
+    """Read-only view of one zip or tar archive."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        fmt = archive_format(path)
+        if fmt is None:
+            raise ArchiveError(f'{path}: not a .zip or .tar archive')
+        self.kind, self.compression = fmt
+        self._lock = threading.Lock()
+        self._zip = None
+        self._mmap = None
+        self._data: dict[str, object] = {}   # lower-case name -> bytes or view
+        self._names: dict[str, str] = {}     # lower-case name -> stored name
+        self._closed = False
+        try:
+            if self.kind == 'zip':
+                self._zip = zipfile.ZipFile(self.path)
+                for info in self._zip.infolist():
+                    if not info.is_dir():
+                        self._names[info.filename.lower()] = info.filename
+            elif self.compression is None:
+                self._open_plain_tar()
+            else:
+                self._open_compressed_tar()
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            raise ArchiveError(f'{path}: {e}') from None
+
+    def _open_plain_tar(self) -> None:
+        with open(self.path, 'rb') as fh:
+            with tarfile.open(fileobj=fh, mode='r:') as tf:
+                members = [m for m in tf.getmembers() if m.isfile()]
+            if members:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        mv = memoryview(self._mmap) if members else None
+        for m in members:
+            self._names[m.name.lower()] = m.name
+            self._data[m.name.lower()] = mv[m.offset_data:m.offset_data + m.size]
+
+    def _open_compressed_tar(self) -> None:
+        with open(self.path, 'rb') as raw:
+            if self.compression == 'zst':
+                stream = _zstandard().ZstdDecompressor().stream_reader(raw)
+                tf = tarfile.open(fileobj=stream, mode='r|')
+            else:
+                tf = tarfile.open(fileobj=raw, mode='r|gz')
+            with tf:
+                for m in tf:
+                    if m.isfile():
+                        self._names[m.name.lower()] = m.name
+                        self._data[m.name.lower()] = tf.extractfile(m).read()
+
+    def close(self) -> None:
+        self._closed = True
+        if self._zip is not None:
+            self._zip.close()
+        self._data.clear()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Slices are still referenced; the mapping goes when they do
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def names(self) -> list[str]:
+        return list(self._names.values())
+
+    def read(self, name: str):
+        """Member data: bytes, or a zero-copy memoryview for plain tars."""
+        key = name.replace('\\', '/').lower()
+        if self._closed:
+            raise ArchiveError(f'{self.path} is closed')
+        if key not in self._names:
+            raise KeyError(f'{name} not found in {self.path}')
+        if self._zip is not None:
+            with self._lock:
+                return self._zip.read(self._names[key])
+        return self._data[key]
+
+    def head(self, name: str, n: int) -> bytes:
+        key = name.replace('\\', '/').lower()
+        if self._zip is not None and key in self._names:
+            with self._lock, self._zip.open(self._names[key]) as fh:
+                return fh.read(n)
+        return bytes(self.read(name)[:n])
+
+
+# Like packfile's cache: the last few archives stay open (compressed tars
+# decompressed in memory), until the file changes, they drop out, or
+# close_all() at the end of a batch.
+OPEN_ARCHIVES = 4
+_open: 'OrderedDict[str, tuple[int, int, ArchiveFile]]' = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def _cached_archive(path: str) -> ArchiveFile:
+    # Caller holds _open_lock
+    st = os.stat(path)
+    cached = _open.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        _open.move_to_end(path)
+        return cached[2]
+    archive = ArchiveFile(path)
+    if cached:
+        cached[2].close()
+    _open[path] = (st.st_size, st.st_mtime_ns, archive)
+    _open.move_to_end(path)
+    while len(_open) > OPEN_ARCHIVES:
+        _open.popitem(last=False)[1][2].close()
+    return archive
+
+
+def open_archive(path: str) -> ArchiveFile:
+    """A cached ArchiveFile for `path`; see packfile.open_pack for when it
+    is closed."""
+    with _open_lock:
+        return _cached_archive(os.path.abspath(path))
+
+
+def close_all() -> None:
+    """Close every cached archive and free decompressed tar contents."""
+    with _open_lock:
+        archives = [cached[2] for cached in _open.values()]
+        _open.clear()
+    for archive in archives:
+        archive.close()
+
+
+def read_member(path: str):
+    """Data of an `archive::member` path (see ArchiveFile.read)."""
+    archive, member = split_pack_path(path)
+    # Under the cache lock, so another thread can't close it mid-read
+    with _open_lock:
+        return _cached_archive(os.path.abspath(archive)).read(member)
+
+
+def _is_ui(head: bytes) -> int | None:
+    if len(head) == 10 and head.startswith(b'Version') and head[7:10].isdigit():
+        return int(head[7:10])
+    return None
+
+
+def scan_archive(path: str, mode: str) -> list[tuple[str, int | None]]:
+    """(`archive::member` path, version) for every input in an archive:
+    `.xml` members in pack mode, members with a `Version` header in unpack
+    mode."""
+    with _open_lock:
+        return _scan(_cached_archive(os.path.abspath(path)), mode)
+
+
+def _scan(archive: ArchiveFile, mode: str) -> list[tuple[str, int | None]]:
+    found = []
+    for name in sorted(archive.names()):
+        if mode == 'pack':
+            if name.lower().endswith('.xml'):
+                m = re.search(rb'<version>\s*(\d{3})\s*</version>', archive.head(name, 4000))
+                found.append((member_path(archive.path, name), int(m.group(1)) if m else None))
+        else:
+            ver = _is_ui(archive.head(name, 10))
+            if ver is not None:
+                found.append((member_path(archive.path, name), ver))
+    return found
+
+
+# Writing
+
+class ArchiveSink:
+    """Streams files into a new archive. `level` is the compression level
+    (zip/gz 0-9, zst 1-22; None for the library default). Outputs given by
+    path (add_output) are stored relative to `root`. Safe to feed from
+    several threads; nothing appears at `path` until close()."""
+
+    def __init__(self, path: str, level: int | None = None, root: str | None = None):
+        fmt = archive_format(path)
+        if fmt is None:
+            raise ArchiveError(f'{path}: choose a .zip, .tar, .tar.gz or .tar.zst name')
+        self.path = os.path.abspath(path)
+        self.kind, self.compression = fmt
+        self.level = level
+        self.root = os.path.abspath(root) if root else None
+        self.count = 0
+        self._lock = threading.Lock()
+        self._tmp = f'{self.path}.{os.getpid()}.tmp'
+        self._zip = self._tar = self._stream = None
+        self._raw = open(self._tmp, 'wb')
+        try:
+            if self.kind == 'zip':
+                method = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+                self._zip = zipfile.ZipFile(self._raw, 'w', method, compresslevel=level)
+            else:
+                if self.compression == 'zst':
+                    zstd = _zstandard()
+                    self._stream = zstd.ZstdCompressor(level=3 if level is None else level).stream_writer(
+                        self._raw, closefd=False)
+                elif self.compression == 'gz':
+                    import gzip
+                    self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb',
+                                                 compresslevel=6 if level is None else level)
+                self._tar = tarfile.open(fileobj=self._stream or self._raw, mode='w|', format=tarfile.PAX_FORMAT)
+        except BaseException:
+            self.abort()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, name: str, data) -> None:
+        name = name.replace('\\', '/').lstrip('/')
+        mtime = time.time()
+        with self._lock:
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, time.localtime(mtime)[:6])
+                info.compress_type = self._zip.compression
+                info.external_attr = 0o644 << 16
+                self._zip.writestr(info, data, compresslevel=self.level)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = memoryview(data).nbytes
+                info.mtime = int(mtime)
+                info.mode = 0o644
+                self._tar.addfile(info, io.BytesIO(data))
+            self.count += 1
+
+    def member_name(self, dst: str) -> str:
+        """Member name for an output that would otherwise go to `dst`."""
+        if self.root:
+            rel = os.path.relpath(os.path.abspath(dst), self.root)
+            if not rel.startswith(os.pardir):
+                return rel.replace(os.sep, '/')
+        return os.path.basename(dst)
+
+    def add_output(self, dst: str, data) -> str:
+        name = self.member_name(dst)
+        self.add(name, data)
+        return name
+
+    def close(self) -> None:
+        if self._raw is None:
+            return
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            if self._tar is not None:
+                self._tar.close()
+            if self._stream is not None:
+                self._stream.close()
+            self._raw.close()
+            self._raw = None
+            os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        """Throw the partial archive away."""
+        raw, self._raw = self._raw, None
+        if raw is None:
+            return
+        # Close the writers first, or they finish up into a closed file
+        # when collected
+        for writer in (self._zip, self._tar, self._stream):
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+        self._zip = self._tar = self._stream = None
+        try:
+            raw.close()
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+def main():
+    import argparse
+    import sys
+    import tempfile
+    from uiunpack_gui import etw_ui_convert as conv
+    from uiunpack_gui.scan import expand_inputs, scan_inputs
+
+    ap = argparse.ArgumentParser(description='Convert files straight into one archive.')
+    ap.add_argument('archive', help='output .zip, .tar, .tar.gz or .tar.zst')
+    ap.add_argument('inputs', nargs='+', help='files, folders, .pack files or archives')
+    ap.add_argument('--mode', choices=('unpack', 'pack'), default='unpack')
+    ap.add_argument('--level', type=int, default=None, help='compression level')
+    ap.add_argument('--workers', type=int, default=None)
+    args = ap.parse_args()
+
+    found = []
+    for item in args.inputs:
+        found.extend(scan_inputs(item, args.mode) if os.path.isdir(item) else expand_inputs([item], args.mode))
+    ruby_ok = conv.has_ruby()
+    nokogiri_ok = ruby_ok and args.mode == 'pack' and conv.has_ruby_nokogiri()
+    # Destinations are only used for member names, relative to this root
+    root = tempfile.gettempdir()
+    jobs = []
+    for path, ver in found:
+        try:
+            jobs.append(conv.plan_job(args.mode, path, root, ruby_ok, nokogiri_ok, ver))
+        except Exception as e:
+            print(f"skip {path}: {e}", file=sys.stderr)
+    try:
+        sink = ArchiveSink(args.archive, args.level, root)
+    except ArchiveError as e:
+        sys.exit(f"error: {e}")
+    with sink:
+        results = conv.convert_many(jobs, workers=args.workers, sink=sink, dedupe='copy')
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print(f"FAILED {r.job.src}: {r.error}", file=sys.stderr)
+    print(f"Wrote {sink.count} file(s) to {sink.path}; {len(failed)} failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+# Structural diff between two .ui files.
+#
+# Every entry gets two hashes, both over the file's own bytes: `own` covers
+# the entry without its child entries, so it includes its fields, TGAs,
+# states, events and effects, and `subtree` adds the child entries' subtree
+# hashes. Each owned record also gets a hash. Two layouts are compared top
+# down: an identical subtree hash skips the whole subtree, and only entries
+# whose own hash differs are decoded (shallowly, through query's offset
+# index) to report which fields and records changed.
+#
+# Hash trees are cached on disk next to the offset index, keyed on the
+# file's path, size and mtime. Comparing a new patch against many earlier
+# versions therefore decodes only what changed, once the trees exist.
+#
+#   python -m uiunpack_gui.diff OLD.ui NEW.ui [--json]
+#   python -m uiunpack_gui.diff NEW.ui --against OLD1.ui OLD2.ui ...
+#
+# The command exits with 1 when anything differs, like diff(1).
+#
+# Both files should have the same UI version; across versions every entry's
+# bytes differ, so everything is decoded and compared field by field.
+
+import difflib
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui.query import _IndexReader, UiIndex, open_index, unescape
+from uiunpack_gui.transcode import _NOT_FIELDS, field_layout, record_lists
+
+HASH_FORMAT = 1
+_DIGEST_SIZE = 16
+
+
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    for p in parts:
+        h.update(p.encode('ascii') if isinstance(p, str) else p)
+    return h.hexdigest()
+
+
+class Change(NamedTuple):
+    kind: str           # 'field', 'added', 'removed' or 'reordered'
+    path: str           # component path, e.g. 'root/frame/button_ok/State[1]'
+    field: str | None = None
+    old: object = None
+    new: object = None
+
+    def format(self) -> str:
+        if self.kind == 'field':
+            return f"~ {self.path}.{self.field}: {self.old!r} -> {self.new!r}"
+        if self.kind == 'reordered':
+            return f"~ {self.path}: children reordered"
+        return f"{'+' if self.kind == 'added' else '-'} {self.path}"
+
+
+# Hash trees
+
+class HashTree:
+    """Per-entry hashes of one .ui, in the same order as its UiIndex.
+
+    `entries[i]` is `[subtree, own, {kind: [[record hash, start], ...]}]`,
+    listing only the records an entry owns directly; records nested in
+    another record (an event inside a state) are part of that one's hash.
+    """
+
+    def __init__(self, index: UiIndex, entries: list):
+        self.index = index
+        self.entries = entries
+
+    @classmethod
+    def build(cls, index: UiIndex) -> 'HashTree':
+        with open(index.path, 'rb') as fh:
+            data = memoryview(fh.read())
+        n = len(index.entries)
+        entries: list = [None] * n
+        # Children follow their parent in file order, so walking backwards
+        # has every child's subtree hash ready before its parent needs it
+        for i in range(n - 1, -1, -1):
+            start, end, _parent, _name, spans = index.entries[i]
+            kids = index.children(i)
+            h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+            pos = start
+            for j in kids:
+                h.update(data[pos:index.entries[j][0]])
+                pos = index.entries[j][1]
+            h.update(data[pos:end])
+            own = h.hexdigest()
+            records = {}
+            top_end = -1
+            for s, e, kind in sorted((s, e, kind) for kind, ranges in spans.items() for s, e in ranges):
+                if s >= top_end:
+                    records.setdefault(kind, []).append([_digest(data[s:e]), s])
+                    top_end = e
+            subtree = _digest(own, *(entries[j][0] for j in kids))
+            entries[i] = [subtree, own, records]
+        return cls(index, entries)
+
+    @staticmethod
+    def _cache_name(path: str) -> str:
+        return 'uihash-' + UiIndex._cache_name(path)[len('uiindex-'):]
+
+    @classmethod
+    def load(cls, path: str, cache: bool = True) -> 'HashTree':
+        """Hash tree for `path`, from the cache when the file is unchanged."""
+        index = open_index(path, cache)
+        if not cache:
+            return cls.build(index)
+        name = cls._cache_name(path)
+        try:
+            with open(os.path.join(conv._cache_dir(), name), 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if data['format'] == HASH_FORMAT and len(data['entries']) == len(index.entries):
+                return cls(index, data['entries'])
+        except (OSError, ValueError, KeyError):
+            pass
+        tree = cls.build(index)
+        payload = {'format': HASH_FORMAT, 'entries': tree.entries}
+        conv._write_cache_file(name, json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return tree
+
+    def digest(self) -> str:
+        """Hash of the whole layout."""
+        return self.entries[0][0] if self.entries else _digest('')
+
+
+# Field comparison
+
+def _fields(obj, prefix: str = '', nested: bool = True) -> dict:
+    # Flattened field path -> value; nested records become `list[i].field`,
+    # or are left out when not `nested` (shallow entries hold placeholders).
+    # Values writeTo recomputes, like a count of a list, are left out too
+    kind = type(obj).__name__
+    layout = field_layout(obj.version).get(kind)
+    derived = layout[0] - layout[1] if layout else ()
+    # Known from the record class, so an empty list is still a record list
+    lists = record_lists(obj.version).get(kind, ())
+    out = {}
+    for name, value in sorted(conv._record_fields(obj).items()):
+        if name in _NOT_FIELDS or name in derived or callable(value):
+            continue
+        if name in lists:
+            if nested:
+                for k, item in enumerate(value):
+                    out.update(_fields(item, f'{prefix}{name}[{k}].'))
+            continue
+        if isinstance(value, str):
+            value = unescape(value)
+        elif type(value) is list:
+            value = tuple(value)
+        out[prefix + name] = value
+    return out
+
+
+def _field_changes(path: str, old: dict, new: dict) -> list[Change]:
+    changes = []
+    for name in sorted(old.keys() | new.keys()):
+        a, b = old.get(name), new.get(name)
+        if a != b:
+            changes.append(Change('field', path, name, a, b))
+    return changes
+
+
+class _Side:
+    # One file being compared: its hash tree and a reader for decoding
+    def __init__(self, tree: HashTree):
+        self.tree = tree
+        self.index = tree.index
+        self.reader = None
+
+    def __enter__(self):
+        self.reader = _IndexReader.open(self.index.path)
+        return self
+
+    def __exit__(self, *exc):
+        self.reader.close()
+
+    def name(self, i: int) -> str:
+        return self.index.name(i) or f'#{i}'
+
+    def entry_fields(self, i: int) -> dict:
+        return _fields(self.index.decode_entry(self.reader, i, deep=False), nested=False)
+
+    def record_fields(self, i: int, kind: str, k: int) -> dict:
+        start = self.tree.entries[i][2][kind][k][1]
+        return _fields(self.index.decode_record(self.reader, kind, start, i))
+
+
+def _pair_children(a: _Side, ai: list[int], b: _Side, bi: list[int]):
+    """Match child entries: identical subtrees first, then by name, then by
+    position among what is left. Returns (pairs, removed, added)."""
+    pairs = []
+    free_b = list(bi)
+    unmatched_a = []
+    by_hash: dict[str, list[int]] = {}
+    for j in bi:
+        by_hash.setdefault(b.tree.entries[j][0], []).append(j)
+    for i in ai:
+        hits = by_hash.get(a.tree.entries[i][0])
+        if hits:
+            j = hits.pop(0)
+            pairs.append((i, j))
+            free_b.remove(j)
+        else:
+            unmatched_a.append(i)
+    rest_a = []
+    for i in unmatched_a:
+        name = a.index.name(i)
+        same = [j for j in free_b if name is not None and b.index.name(j) == name]
+        if len(same) == 1:
+            pairs.append((i, same[0]))
+            free_b.remove(same[0])
+        else:
+            rest_a.append(i)
+    n = min(len(rest_a), len(free_b))
+    pairs += zip(rest_a[:n], free_b[:n])
+    return pairs, rest_a[n:], free_b[n:]
+
+
+def _diff_records(a: _Side, i: int, b: _Side, j: int, path: str) -> list[Change]:
+    changes = []
+    ra, rb = a.tree.entries[i][2], b.tree.entries[j][2]
+    for kind in sorted(ra.keys() | rb.keys()):
+        ha = [r[0] for r in ra.get(kind, ())]
+        hb = [r[0] for r in rb.get(kind, ())]
+        if ha == hb:
+            continue
+        ops = difflib.SequenceMatcher(None, ha, hb, autojunk=False).get_opcodes()
+        for op, a0, a1, b0, b1 in ops:
+            if op == 'equal':
+                continue
+            paired = min(a1 - a0, b1 - b0) if op == 'replace' else 0
+            for k in range(paired):
+                changes += _field_changes(f'{path}/{kind}[{b0 + k}]', a.record_fields(i, kind, a0 + k),
+                                          b.record_fields(j, kind, b0 + k))
+            changes += [Change('removed', f'{path}/{kind}[{k}]') for k in range(a0 + paired, a1)]
+            changes += [Change('added', f'{path}/{kind}[{k}]') for k in range(b0 + paired, b1)]
+    return changes
+
+
+def _diff_entry(a: _Side, i: int, b: _Side, j: int, path: str) -> list[Change]:
+    ea, eb = a.tree.entries[i], b.tree.entries[j]
+    if ea[0] == eb[0]:
+        return []
+    changes = []
+    if ea[1] != eb[1]:
+        changes += _field_changes(path, a.entry_fields(i), b.entry_fields(j))
+        changes += _diff_records(a, i, b, j, path)
+    pairs, removed, added = _pair_children(a, a.index.children(i), b, b.index.children(j))
+    if [q for _, q in sorted(pairs)] != sorted(q for _, q in pairs):
+        changes.append(Change('reordered', path))
+    for p, q in sorted(pairs, key=lambda pq: pq[1]):
+        changes += _diff_entry(a, p, b, q, f'{path}/{b.name(q)}')
+    changes += [Change('removed', f'{path}/{a.name(p)}') for p in removed]
+    changes += [Change('added', f'{path}/{b.name(q)}') for q in added]
+    return changes
+
+
+def diff_trees(old: HashTree, new: HashTree) -> list[Change]:
+    if not old.entries or not new.entries or old.digest() == new.digest():
+        return []
+    with _Side(old) as a, _Side(new) as b:
+        return _diff_entry(a, 0, b, 0, b.name(0))
+
+
+def diff_ui(a: str, b: str, cache: bool = True) -> list[Change]:
+    """Changes from .ui file `a` to .ui file `b`."""
+    return diff_trees(HashTree.load(a, cache), HashTree.load(b, cache))
+
+
+def diff_many(new: str, olds, cache: bool = True) -> dict[str, list[Change]]:
+    """diff_ui(old, new) for each old file, hashing `new` once."""
+    tree = HashTree.load(new, cache)
+    return {old: diff_trees(HashTree.load(old, cache), tree) for old in olds}
+
+
+def main():
+    import argparse
+    import sys
+    ap = argparse.ArgumentParser(description='Structural diff between .ui files.')
+    ap.add_argument('files', nargs='+', metavar='FILE', help='OLD NEW, or NEW with --against')
+    ap.add_argument('--against', nargs='+', metavar='OLD', help='compare FILE against each of these')
+    ap.add_argument('--json', action='store_true', help='print changes as JSON')
+    ap.add_argument('--no-cache', action='store_true')
+    args = ap.parse_args()
+    if args.against and len(args.files) != 1:
+        ap.error('give one file with --against')
+    if not args.against and len(args.files) != 2:
+        ap.error('give OLD and NEW')
+    try:
+        if args.against:
+            results = diff_many(args.files[0], args.against, not args.no_cache)
+        else:
+            results = {args.files[0]: diff_ui(args.files[0], args.files[1], not args.no_cache)}
+    except (OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+    if args.json:
+        print(json.dumps({old: [c._asdict() for c in changes] for old, changes in results.items()},
+                         indent=1, default=repr))
+    else:
+        for old, changes in results.items():
+            if len(results) > 1:
+                print(f"== {old}: {len(changes)} change(s)")
+            for c in changes:
+                print(c.format())
+    # Like diff(1): 1 when anything differs
+    sys.exit(1 if any(results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,13 @@
 # Vendored from taw/etwng/ui/bin/convert_ui.py and adapted for import.
 # CLI bits removed; exported functions: convertUIToXML, convertXMLToUI.
 
-import io, struct, os, sys, subprocess
-from xml.dom.minidom import parse
+import codecs, io, mmap, struct, os, re, sys, subprocess, threading, traceback
+from contextlib import contextmanager
+from typing import Callable, Iterable, NamedTuple
+
+# Separator of `container::member` paths (packfile.PACK_SEP); defined here too
+# so plain files never import the pack and archive readers
+PACK_SEP = '::'
 
 class TypeCastReader(io.BufferedReader):
     def readByte(self):
@@ -34,6 +39,195 @@ class TypeCastReader(io.BufferedReader):
         string = encodedString.decode("ascii")
         return(string.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#x0D;"))
 
+def _xml_escape(string):
+    return(string.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#x0D;"))
+
+_structs: dict[str, struct.Struct] = {}
+
+def _struct(fmt: str) -> struct.Struct:
+    st = _structs.get(fmt)
+    if st is None:
+        st = _structs[fmt] = struct.Struct(fmt)
+    return st
+
+_BYTE = _struct("<B")
+_INT = _struct("<i")
+_UINT = _struct("<I")
+_SHORT = _struct("<h")
+_USHORT = _struct("<H")
+_FLOAT = _struct("<f")
+_DOUBLE = _struct("<d")
+_unpack_byte = _BYTE.unpack_from
+_unpack_int = _INT.unpack_from
+_unpack_uint = _UINT.unpack_from
+_unpack_short = _SHORT.unpack_from
+_unpack_ushort = _USHORT.unpack_from
+_unpack_float = _FLOAT.unpack_from
+_unpack_double = _DOUBLE.unpack_from
+
+# Files at least this big are mapped instead of read in one go
+MMAP_THRESHOLD = 1 << 20
+
+class _ViewBytes:
+    # Slices of a memoryview as bytes, for MemoryReader's string decoding
+    __slots__ = ('_mv',)
+
+    def __init__(self, mv):
+        self._mv = mv
+
+    def __getitem__(self, key):
+        return self._mv[key].tobytes()
+
+class MemoryReader:
+    """Drop-in for TypeCastReader that decodes from an in-memory buffer.
+
+    Works on a memoryview over `bytes`, an `mmap` or any other buffer and
+    advances an integer offset, so fields are decoded with precompiled
+    `Struct.unpack_from` calls and no per-field IO or temporary bytes.
+    `unpack(st)` decodes a run of adjacent fixed-width fields in one call.
+    Strings go through a per-file intern table keyed on their raw bytes, so
+    each distinct string is decoded and escaped once and every repeat
+    shares the same `str` object.
+
+    Decoded strings are XML-escaped, as the XML writer expects; subclasses
+    that need them as stored override `escape`.
+    """
+    __slots__ = ('_buf', '_mv', '_pos', '_size', '_mmap', '_utf16', '_ascii')
+    escape = staticmethod(_xml_escape)
+
+    def __init__(self, data, _mmap=None):
+        # Always a view of our own, so close() never releases the caller's
+        mv = memoryview(data)
+        if mv.format != 'B' or mv.ndim != 1:
+            mv = mv.cast('B')
+        # Strings are decoded from slices of the original object: slicing
+        # bytes/mmap and calling .decode beats decoding a memoryview slice
+        self._buf = data if isinstance(data, (bytes, bytearray, mmap.mmap)) else _ViewBytes(mv)
+        self._mv = mv
+        self._pos = 0
+        self._size = len(mv)
+        self._mmap = _mmap
+        self._utf16: dict[bytes, str] = {}
+        self._ascii: dict[bytes, str] = {}
+
+    @classmethod
+    def open(cls, path: str) -> 'MemoryReader':
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                return cls(fh.read())
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, mm)
+
+    def close(self):
+        self._buf = None
+        self._utf16 = self._ascii = None
+        self._mv.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a slice; the map goes when that does
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self._pos
+        elif whence == 2:
+            pos += self._size
+        self._pos = max(0, pos)
+        return self._pos
+
+    def read(self, n=-1):
+        start = self._pos
+        end = self._size if n is None or n < 0 else min(start + n, self._size)
+        self._pos = end
+        return self._mv[start:end].tobytes()
+
+    def peek(self, n=1):
+        return self._mv[self._pos:self._pos + n].tobytes()
+
+    def view(self, n):
+        # Zero-copy slice of the next n bytes
+        start = self._pos
+        self._pos = min(start + n, self._size)
+        return self._mv[start:self._pos]
+
+    def unpack(self, st):
+        values = st.unpack_from(self._mv, self._pos)
+        self._pos += st.size
+        return values
+
+    def readStruct(self, fmt):
+        return self.unpack(_struct(fmt))
+
+    def readByte(self):
+        pos = self._pos
+        self._pos = pos + 1
+        return _unpack_byte(self._mv, pos)[0]
+    def readInt(self):
+        pos = self._pos
+        self._pos = pos + 4
+        return _unpack_int(self._mv, pos)[0]
+    def readUInt(self):
+        pos = self._pos
+        self._pos = pos + 4
+        return _unpack_uint(self._mv, pos)[0]
+    def readShort(self):
+        pos = self._pos
+        self._pos = pos + 2
+        return _unpack_short(self._mv, pos)[0]
+    def readUShort(self):
+        pos = self._pos
+        self._pos = pos + 2
+        return _unpack_ushort(self._mv, pos)[0]
+    def readFloat(self):
+        pos = self._pos
+        self._pos = pos + 4
+        return _unpack_float(self._mv, pos)[0]
+    def readDouble(self):
+        pos = self._pos
+        self._pos = pos + 8
+        return _unpack_double(self._mv, pos)[0]
+    def readBool(self):
+        pos = self._pos
+        if pos >= self._size:
+            return True  # matches TypeCastReader: b'' != b'\x00'
+        self._pos = pos + 1
+        return self._mv[pos] != 0
+    def readUTF16(self):
+        start = self._pos + 2
+        end = start + _unpack_ushort(self._mv, self._pos)[0]*2
+        if end > self._size:
+            end = self._size
+        self._pos = end
+        raw = self._buf[start:end]
+        s = self._utf16.get(raw)
+        if s is None:
+            s = self._utf16[raw] = self.escape(raw.decode("UTF-16"))
+        return s
+    def readASCII(self):
+        start = self._pos + 2
+        end = start + _unpack_ushort(self._mv, self._pos)[0]
+        if end > self._size:
+            end = self._size
+        self._pos = end
+        raw = self._buf[start:end]
+        s = self._ascii.get(raw)
+        if s is None:
+            s = self._ascii[raw] = self.escape(raw.decode("ascii"))
+        return s
+
 class TypeCastWriter(io.BufferedWriter):
     def writeByte(self,arg):
         self.write(struct.pack("B",arg))
@@ -61,6 +255,117 @@ class TypeCastWriter(io.BufferedWriter):
         self.writeUShort(len(arg))
         self.write(arg.encode("ascii"))
 
+_pack_byte = _BYTE.pack
+_pack_int = _INT.pack
+_pack_uint = _UINT.pack
+_pack_short = _SHORT.pack
+_pack_ushort = _USHORT.pack
+_pack_float = _FLOAT.pack
+_pack_double = _DOUBLE.pack
+_utf16le_encode = codecs.utf_16_le_encode
+_ascii_encode = codecs.ascii_encode
+
+def _temp_path(path) -> str:
+    # Next to `path`, so the rename stays on one volume; unique per thread
+    return f'{os.fspath(path)}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+@contextmanager
+def _replacing(path, mode='wb', **kw):
+    """Open a temporary file that is renamed over `path` when the block
+    ends without an error. The old file is replaced, never truncated, so
+    outputs hardlinked to it by dedupe keep their contents."""
+    tmp = _temp_path(path)
+    try:
+        with open(tmp, mode, **kw) as fh:
+            yield fh
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+class BufferWriter:
+    """Drop-in for TypeCastWriter that builds the whole file in memory.
+
+    Fields are appended to one growable `bytearray` with cached `Struct`
+    objects, strings are encoded straight to UTF-16-LE (no BOM to slice
+    off), and the result goes out in a single write on `close()`: to a
+    filename, to any binary stream, or nowhere (use `getvalue()`).
+    `writePacked(st, *values)` emits a run of fixed-width fields at once.
+    Leaving a `with` block on an exception discards the buffer, so no
+    partial file is written.
+    """
+    __slots__ = ('_buf', '_target')
+
+    def __init__(self, target=None):
+        self._buf = bytearray()
+        self._target = target
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._target = None
+
+    def tell(self):
+        return len(self._buf)
+
+    def getbuffer(self):
+        return memoryview(self._buf)
+
+    def getvalue(self):
+        return bytes(self._buf)
+
+    def close(self):
+        target, self._target = self._target, None
+        if target is None:
+            return
+        if isinstance(target, (str, os.PathLike)):
+            with _replacing(target) as fh:
+                fh.write(self._buf)
+        else:
+            target.write(self._buf)
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def writePacked(self, st, *values):
+        self._buf += st.pack(*values)
+
+    # Appending st.pack() results measures faster than pack_into on a
+    # pre-grown buffer: the bounds bookkeeping costs more in Python than
+    # the short-lived bytes object does
+    def writeByte(self,arg):
+        self._buf += _pack_byte(arg)
+    def writeInt(self,arg):
+        self._buf += _pack_int(arg)
+    def writeUInt(self,arg):
+        self._buf += _pack_uint(arg)
+    def writeShort(self,arg):
+        self._buf += _pack_short(arg)
+    def writeUShort(self,arg):
+        self._buf += _pack_ushort(arg)
+    def writeFloat(self,arg):
+        self._buf += _pack_float(arg)
+    def writeDouble(self,arg):
+        self._buf += _pack_double(arg)
+    def writeBool(self,arg):
+        self._buf += b'\x01' if arg else b'\x00'
+    def writeUTF16(self,arg):
+        buf = self._buf
+        buf += _pack_ushort(len(arg))
+        buf += _utf16le_encode(arg)[0]
+    def writeASCII(self,arg):
+        buf = self._buf
+        buf += _pack_ushort(len(arg))
+        buf += _ascii_encode(arg)[0]
+
 class DebuggableConverter:
   def indented_print(self, s, handle):
     print("%s%s (%x)" % (" "*self.indent, s, handle.tell()))
@@ -120,13 +425,33 @@ class UiEntry(DebuggableConverter):
     # and all referenced classes (Effect, State, Event, Tga, TgaUse, Transition, etc.)
     # must be included exactly as upstream for correctness.
 
-def _load_upstream_impl():
-    """Load full upstream UI converter implementation into this module.
+def _cache_dir() -> str:
+    """Per-user cache folder (bytecode, probe results, indexes)."""
+    d = os.environ.get('UIUNPACK_CACHE_DIR')
+    if not d:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+            d = os.path.join(base, 'uiunpack', 'cache')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            d = os.path.join(base, 'uiunpack')
+    return d
 
-    Prefer `etwng/ui_converter/convert_ui.py` (module form). Fallback to
-    `etwng/ui/bin/convert_ui.py` (CLI script) if needed, stripping its CLI
-    section. All public names are injected into this module's globals.
-    """
+def _write_cache_file(name: str, data: bytes) -> None:
+    # Best effort: a read-only or missing cache dir just means no caching
+    try:
+        d = _cache_dir()
+        os.makedirs(d, exist_ok=True)
+        tmp = os.path.join(d, f'{name}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, os.path.join(d, name))
+    except OSError:
+        pass
+
+def _upstream_source() -> tuple[str, str]:
+    """Locate the vendored converter and return (path, source) with any
+    CLI section stripped."""
     here = os.path.dirname(os.path.abspath(__file__))
     candidates = [
         os.path.abspath(os.path.join(here, '..', 'etwng', 'ui_converter', 'convert_ui.py')),
@@ -145,58 +470,309 @@ def _load_upstream_impl():
         code = fh.read()
     # If we loaded the CLI script, trim off CLI bits heuristically
     if '/bin/convert_ui.py' in src_path.replace('\\', '/'):
-        import re
         code = re.split(r"\nif\s+__name__\s*==\s*['\"]__main__['\"]\s*:\s*|\nif\s+sys\.argv\[1\]", code, maxsplit=1)[0]
+    return src_path, code
+
+_upstream_code_obj = None
+
+def _upstream_code():
+    """Compiled upstream module code, cached on disk keyed on the hash of the
+    (trimmed) source and the interpreter's bytecode version."""
+    global _upstream_code_obj
+    if _upstream_code_obj is not None:
+        return _upstream_code_obj
+    import hashlib, importlib.util, marshal
+    src_path, code = _upstream_source()
+    key = hashlib.sha256(importlib.util.MAGIC_NUMBER + code.encode('utf-8')).hexdigest()[:24]
+    name = f'convert_ui-{key}.{sys.implementation.cache_tag}.bin'
+    try:
+        with open(os.path.join(_cache_dir(), name), 'rb') as fh:
+            _upstream_code_obj = marshal.load(fh)
+    except (OSError, EOFError, ValueError, TypeError):
+        _upstream_code_obj = compile(code, src_path, 'exec')
+        _write_cache_file(name, marshal.dumps(_upstream_code_obj))
+    return _upstream_code_obj
+
+def _exec_upstream(ns: dict | None = None) -> dict:
+    """Run the upstream module code in a fresh namespace and return it."""
+    if ns is None:
+        ns = {}
+    ns.setdefault('__name__', __name__)
+    ns.setdefault('__builtins__', __builtins__)
+    exec(_upstream_code(), ns)
+    return ns
+
+def _load_upstream_impl():
+    """Load full upstream UI converter implementation into this module.
+
+    Prefer `etwng/ui_converter/convert_ui.py` (module form). Fallback to
+    `etwng/ui/bin/convert_ui.py` (CLI script) if needed, stripping its CLI
+    section. The upstream record classes are injected into this module's
+    globals; compiled code is reused from the bytecode cache when the
+    source is unchanged.
+    """
+    ns = _exec_upstream()
+    # Take the upstream record classes, but keep our own readers, writers and
+    # entry points rather than the upstream copies of them
     g = globals()
-    exec(compile(code, src_path, 'exec'), g, g)
+    for name, value in ns.items():
+        if name in _UPSTREAM_OVERRIDES or name not in g:
+            g[name] = value
 
+# Names defined above only as placeholders for the upstream versions
+_UPSTREAM_OVERRIDES = {'UiEntry', 'DebuggableConverter'}
 
-def convertUIToXML(uiFilename, textFilename):
+
+# Instrumentation hooks. instrument.enable() installs a Recorder here; until
+# then each hook costs one global lookup.
+_recorder = None
+
+class _NoStage:
+    __slots__ = ()
+    def __enter__(self):
+        return None
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def _stage(name):
+    return _NO_STAGE if _recorder is None else _recorder.stage(name)
+
+def _ensure_upstream(method):
     # Ensure upstream implementations are loaded
-    global UiEntry
-    if 'UiEntry' not in globals() or not hasattr(UiEntry, 'readFrom'):
-        _load_upstream_impl()
-    uiFile = TypeCastReader(open(uiFilename, "rb"))
+    if 'UiEntry' not in globals() or not hasattr(UiEntry, method):
+        with _stage('load_upstream'):
+            _load_upstream_impl()
+
+# Use the per-version specialised record classes from specialize.py; set
+# UIUNPACK_SPECIALIZE=0 to always run the generic upstream code.
+SPECIALIZE = os.environ.get('UIUNPACK_SPECIALIZE', '1') != '0'
+_specialize_failed: set[int] = set()
+
+def _entry_class(versionNumber):
+    if SPECIALIZE and versionNumber not in _specialize_failed:
+        try:
+            from uiunpack_gui import specialize
+            return specialize.namespace(versionNumber)['UiEntry']
+        except Exception:
+            # Can't specialise this upstream source; the generic code still works
+            traceback.print_exc()
+            _specialize_failed.add(versionNumber)
+    return UiEntry
+
+def record_namespace(version: int) -> dict:
+    """A fresh, private namespace of the upstream record classes for
+    `version`, specialised unless SPECIALIZE is off or specialisation
+    fails. For modules that subclass the record classes (lightdom, query,
+    stream); callers may patch it freely."""
+    if SPECIALIZE and version not in _specialize_failed:
+        try:
+            from uiunpack_gui import specialize
+            return specialize.new_namespace(version)
+        except Exception:
+            traceback.print_exc()
+            _specialize_failed.add(version)
+    return _exec_upstream()
+
+def _record_fields(obj) -> dict:
+    """Field name -> value of a decoded record, slotted or not."""
+    fields = dict(getattr(obj, '__dict__', ()))
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name not in fields and hasattr(obj, name):
+                fields[name] = getattr(obj, name)
+    return fields
+
+def _decode_ui(uiFile, name):
+    """Read the header and entry tree from a reader positioned at offset 0."""
+    _ensure_upstream('readFrom')
     versionString = uiFile.read(10)
     if versionString[0:7] != b"Version":
-        raise ValueError("Not a UI layout file or unknown file version: %s" % uiFilename)
+        raise ValueError("Not a UI layout file or unknown file version: %s" % name)
     versionNumber = int(versionString[7:10])
     if versionNumber not in [32, 33, 39, 43, 44, 46, 47, 49, 50, 51, 52, 54]:
         raise ValueError("Version %d not supported" % versionNumber)
-    outFile = open(textFilename, "w", encoding='utf-8')
-    outFile.write("<ui>\n  <version>%03d</version>\n" % versionNumber)
-    uiE = UiEntry(versionNumber, 1)
-    uiE.readFrom(uiFile)
-    uiE.writeToXML(outFile)
-    outFile.write("</ui>\n")
-    uiFile.close()
-    outFile.close()
+    uiE = _entry_class(versionNumber)(versionNumber, 1)
+    with _stage('decode'):
+        uiE.readFrom(uiFile)
+    if _recorder is not None:
+        _recorder.note(bytes_in=uiFile.tell())
+        _recorder.note_tree(uiE)
+    return versionNumber, uiE
 
+def _write_xml(versionNumber, uiE, outFile):
+    with _stage('write_xml'):
+        outFile.write("<ui>\n  <version>%03d</version>\n" % versionNumber)
+        uiE.writeToXML(outFile)
+        outFile.write("</ui>\n")
 
-def convertXMLToUI(xmlFilename, uiFilename):
-    # Ensure upstream implementations are loaded
-    global UiEntry
-    if 'UiEntry' not in globals() or not hasattr(UiEntry, 'constructFromNode'):
-        _load_upstream_impl()
-    dom = parse(xmlFilename)
+# Write XML while decoding instead of after (see stream.py); opt in with
+# UIUNPACK_STREAM=1 or stream=True
+STREAM_XML = os.environ.get('UIUNPACK_STREAM', '0') == '1'
+
+def convertUIDataToXML(data, out=None, stream=None):
+    """UI -> XML entirely in memory.
+
+    `data` is bytes, bytearray, memoryview, mmap or a binary file-like
+    object. The XML is returned as a str, or written to the text stream
+    `out` (returning None). With `stream`, XML goes out as entries are
+    decoded and finished entries are not kept.
+    """
+    if hasattr(data, 'read'):
+        data = data.read()
+    if STREAM_XML if stream is None else stream:
+        from uiunpack_gui.stream import stream_data
+        if out is not None:
+            stream_data(data, out)
+            return None
+        buf = io.StringIO()
+        stream_data(data, buf)
+        return buf.getvalue()
+    with MemoryReader(data) as uiFile:
+        versionNumber, uiE = _decode_ui(uiFile, '<memory>')
+    if out is not None:
+        _write_xml(versionNumber, uiE, out)
+        return None
+    buf = io.StringIO()
+    _write_xml(versionNumber, uiE, buf)
+    xml = buf.getvalue()
+    if _recorder is not None:
+        _recorder.note(bytes_out=len(xml))
+    return xml
+
+def _pack_member(path):
+    # Data of a `file.pack::member` or `archive.zip::member` path, else None
+    if PACK_SEP not in path:
+        return None
+    from uiunpack_gui import archive, packfile
+    if archive.is_archive_path(path):
+        return archive.read_member(path)
+    return packfile.read_member(path)
+
+def convertUIToXML(uiFilename, textFilename, stream=None):
+    if STREAM_XML if stream is None else stream:
+        from uiunpack_gui.stream import stream_file
+        # The XML written before an error never reaches textFilename
+        with _replacing(textFilename, "w", encoding='utf-8') as outFile:
+            stream_file(uiFilename, outFile)
+        if _recorder is not None:
+            _recorder.note(bytes_out=os.path.getsize(textFilename))
+        return
+    with _stage('read'):
+        member = _pack_member(uiFilename)
+    if member is not None:
+        with _replacing(textFilename, "w", encoding='utf-8') as outFile:
+            convertUIDataToXML(member, outFile)
+    else:
+        with _stage('read'):
+            uiFile = MemoryReader.open(uiFilename)
+        with uiFile:
+            versionNumber, uiE = _decode_ui(uiFile, uiFilename)
+        with _replacing(textFilename, "w", encoding='utf-8') as outFile:
+            _write_xml(versionNumber, uiE, outFile)
+    if _recorder is not None:
+        _recorder.note(bytes_out=os.path.getsize(textFilename))
+
+
+# 'minidom' (default) or 'light': the expat-built node view in lightdom,
+# which produces the same .ui bytes with far less memory and time.
+XML_PARSER = os.environ.get('UIUNPACK_XML_PARSER', 'minidom')
+
+def _parse_xml(source, parser, in_memory):
+    if (parser or XML_PARSER) == 'light':
+        from uiunpack_gui import lightdom
+        if in_memory and not hasattr(source, 'read'):
+            return lightdom.parse_string(source, build_entries=True)
+        return lightdom.parse(source, build_entries=True)
+    from xml.dom.minidom import parse, parseString
+    if in_memory and not hasattr(source, 'read'):
+        return parseString(source)
+    return parse(source)
+
+def _build_ui(dom):
+    _ensure_upstream('constructFromNode')
     versionNode = dom.getElementsByTagName("version")[0]
     version = versionNode.firstChild.nodeValue
     rootNode = versionNode.nextSibling.nextSibling
-    root = UiEntry(int(version), 0)
-    root.constructFromNode(rootNode)
-    outFile = TypeCastWriter(open(uiFilename, "wb"))
-    outFile.write(b'Version'+version.encode())
-    root.writeTo(outFile)
-    outFile.close()
+    # lightdom documents hand over the entries they built while parsing
+    entry_class = getattr(dom, 'entry_class', _entry_class)
+    root = entry_class(int(version))(int(version), 0)
+    with _stage('build'):
+        root.constructFromNode(rootNode)
+        # The node view is no longer needed once the entry tree is built
+        del versionNode, rootNode
+        dom.unlink()
+    if _recorder is not None:
+        _recorder.note_tree(root)
+    return version, root
+
+def convertXMLDataToUI(data, out=None, parser=None):
+    """XML -> UI entirely in memory.
+
+    `data` is the XML as str or bytes, or a file-like object. The .ui
+    bytes are returned, or written to the binary stream `out` (returning
+    None).
+    """
+    with _stage('parse_xml'):
+        dom = _parse_xml(data, parser, True)
+    if _recorder is not None:
+        _recorder.note(bytes_in=len(data) if isinstance(data, (str, bytes, bytearray)) else 0)
+    version, root = _build_ui(dom)
+    outFile = BufferWriter(out)
+    with _stage('encode'):
+        outFile.write(b'Version'+version.encode())
+        root.writeTo(outFile)
+    if _recorder is not None:
+        _recorder.note(bytes_out=outFile.tell())
+    if out is not None:
+        with _stage('write'):
+            outFile.close()
+        return None
+    return outFile.getvalue()
+
+def convertXMLToUI(xmlFilename, uiFilename, parser=None):
+    with _stage('read'):
+        member = _pack_member(xmlFilename)
+    with _stage('parse_xml'):
+        if member is not None:
+            dom = _parse_xml(bytes(member), parser, True)
+        else:
+            dom = _parse_xml(xmlFilename, parser, False)
+    if _recorder is not None:
+        _recorder.note(bytes_in=len(member) if member is not None else os.path.getsize(xmlFilename))
+    version, root = _build_ui(dom)
+    with BufferWriter(uiFilename) as outFile:
+        with _stage('encode'):
+            outFile.write(b'Version'+version.encode())
+            root.writeTo(outFile)
+        if _recorder is not None:
+            _recorder.note(bytes_out=outFile.tell())
+        with _stage('write'):
+            outFile.close()
+
+def roundtrip_ui(data, parser=None) -> bool:
+    """True if ui -> xml -> ui reproduces `data` byte for byte."""
+    if hasattr(data, 'read'):
+        data = data.read()
+    return convertXMLDataToUI(convertUIDataToXML(data), parser=parser) == bytes(data)
 
 
 # Helpers for detecting versions and Ruby fallbacks
 PY_SUPPORTED_VERSIONS = {32, 33, 39, 43, 44, 46, 47, 49, 50, 51, 52, 54}
 
 def detect_version(path: str) -> int | None:
+    with _stage('detect'):
+        return _detect_version(path)
+
+def _detect_version(path: str) -> int | None:
     try:
-        with open(path, 'rb') as fh:
-            hdr = fh.read(10)
+        member = _pack_member(path)
+        if member is not None:
+            hdr = bytes(member[:10])
+        else:
+            with open(path, 'rb') as fh:
+                hdr = fh.read(10)
         if len(hdr) >= 10 and hdr.startswith(b'Version'):
             return int(hdr[7:10].decode('ascii', errors='ignore'))
     except Exception:
@@ -225,54 +801,505 @@ def _bundled_ruby() -> str | None:
     # No bundled Ruby - users must install Ruby on their system
     return None
 
-def has_ruby() -> bool:
-    br = _bundled_ruby()
-    if br:
+# Ruby capability probes are cached in-process and on disk, keyed on the ruby
+# executable (path, size, mtime) so a Ruby upgrade invalidates them. Only
+# positive results are cached: installing Ruby or a gem while the app is
+# running is picked up on the next probe.
+RUBY_PROBE_TTL = 7 * 24 * 3600
+_ruby_probe: dict[str, bool] = {}
+
+def _ruby_exe() -> str | None:
+    import shutil
+    return _bundled_ruby() or shutil.which('ruby')
+
+def _ruby_probe_key(exe: str) -> str:
+    st = os.stat(exe)
+    return f'{os.path.abspath(exe)}|{st.st_size}|{st.st_mtime_ns}'
+
+def _probe_cached(what: str, probe: Callable[[str], bool]) -> bool:
+    if _ruby_probe.get(what):
         return True
+    import json, time
+    exe = _ruby_exe()
+    if not exe:
+        return False
+    path = os.path.join(_cache_dir(), 'ruby_probe.json')
+    try:
+        key = _ruby_probe_key(exe)
+        with open(path, 'r', encoding='utf-8') as fh:
+            saved = json.load(fh)
+        rec = saved.get(what)
+        if rec and rec['key'] == key and time.time() - rec['at'] < RUBY_PROBE_TTL:
+            _ruby_probe[what] = True
+            return True
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        saved = {}
+    ok = probe(exe)
+    if ok:
+        _ruby_probe[what] = True
+        try:
+            saved[what] = {'key': _ruby_probe_key(exe), 'at': time.time()}
+            _write_cache_file('ruby_probe.json', json.dumps(saved).encode('utf-8'))
+        except (OSError, AttributeError):
+            pass
+    return ok
+
+def invalidate_ruby_probe() -> None:
+    _ruby_probe.clear()
+    try:
+        os.remove(os.path.join(_cache_dir(), 'ruby_probe.json'))
+    except OSError:
+        pass
+
+def _probe_ruby(exe: str) -> bool:
     try:
-        subprocess.run(['ruby', '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, shell=True if sys.platform == 'win32' else False)
+        subprocess.run([exe, '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, shell=True if sys.platform == 'win32' else False)
         return True
     except Exception:
         return False
 
-def has_ruby_nokogiri() -> bool:
+def _probe_nokogiri(exe: str) -> bool:
     try:
-        ruby = _bundled_ruby() or 'ruby'
-        code = 'begin; require "nokogiri"; print "ok"; rescue; print "no"; end'
-        out = subprocess.check_output([ruby, '-e', code], text=True, shell=True if sys.platform == 'win32' else False)
+        code = 'begin; require "nokogiri"; print "ok"; rescue LoadError; print "no"; end'
+        out = subprocess.check_output([exe, '-e', code], text=True, stderr=subprocess.DEVNULL, shell=True if sys.platform == 'win32' else False)
         return 'ok' in out
     except Exception:
         return False
 
-def ruby_ui2xml(src: str, dst: str) -> None:
+def has_ruby() -> bool:
+    if _bundled_ruby():
+        return True
+    return _probe_cached('ruby', _probe_ruby)
+
+def has_ruby_nokogiri() -> bool:
+    return _probe_cached('nokogiri', _probe_nokogiri)
+
+# Ruby conversions go through long-lived workers (see ruby_server) unless
+# UIUNPACK_RUBY_SERVER=0; a worker that cannot start falls back to running
+# the etwng script in a fresh interpreter per file.
+RUBY_SERVER = os.environ.get('UIUNPACK_RUBY_SERVER', '1') != '0'
+
+def _ruby_convert(op: str, src: str, dst: str) -> None:
     root = _data_root()
     if not root:
         raise RuntimeError('Bundled etwng/ui not found for Ruby fallback')
-    script = os.path.join(root, 'bin', 'ui2xml')
+    script = os.path.join(root, 'bin', op)
     ruby = _bundled_ruby() or 'ruby'
+    # The script writes a temporary file that is renamed over dst, like
+    # every other output
+    tmp = _temp_path(dst)
     # Convert Windows paths to forward slashes for Ruby
     if sys.platform == 'win32':
         script = script.replace('\\', '/')
         src = src.replace('\\', '/')
-        dst = dst.replace('\\', '/')
-    subprocess.run([ruby, script, src, dst], check=True)
+        tmp = tmp.replace('\\', '/')
+    try:
+        with _stage('ruby'):
+            _ruby_run(ruby, script, op, src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if _recorder is not None:
+        _recorder.note(bytes_in=os.path.getsize(src), bytes_out=os.path.getsize(dst))
+
+def _ruby_run(ruby: str, script: str, op: str, src: str, dst: str) -> None:
+    from uiunpack_gui import ruby_server
+    if RUBY_SERVER:
+        try:
+            ruby_server.get_pool().convert(op, src, dst)
+            return
+        except ruby_server.RubyWorkerStartError:
+            # Workers can't start with this Ruby; don't try again per file
+            ruby_server.disable_pool()
+        except ruby_server.RubyWorkerError:
+            pass  # the worker failed twice on this file; try a fresh interpreter
+    # Same limit as a worker job, so a file that hangs Ruby can't stall the batch
+    subprocess.run([ruby, script, src, dst], check=True, timeout=ruby_server.JOB_TIMEOUT)
+
+def ruby_ui2xml(src: str, dst: str) -> None:
+    _ruby_convert('ui2xml', src, dst)
 
 def ruby_xml2ui(src_xml: str, dst_ui: str) -> None:
-    root = _data_root()
-    if not root:
-        raise RuntimeError('Bundled etwng/ui not found for Ruby fallback')
-    script = os.path.join(root, 'bin', 'xml2ui')
-    ruby = _bundled_ruby() or 'ruby'
-    # Convert Windows paths to forward slashes for Ruby
-    if sys.platform == 'win32':
-        script = script.replace('\\', '/')
-        src_xml = src_xml.replace('\\', '/')
-        dst_ui = dst_ui.replace('\\', '/')
-    subprocess.run([ruby, script, src_xml, dst_ui], check=True)
+    _ruby_convert('xml2ui', src_xml, dst_ui)
+
+
+# Batch conversion engine shared by the GUI and headless callers
+
+class ConvertJob(NamedTuple):
+    mode: str               # 'unpack' (UI -> XML) or 'pack' (XML -> UI)
+    src: str
+    dst: str
+    converter: str = 'python'  # 'python' or 'ruby'
+    version: int | None = None
+
+
+class ConvertResult(NamedTuple):
+    job: ConvertJob
+    ok: bool
+    error: str | None = None
+    detail: str | None = None  # formatted traceback for the console
+    cancelled: bool = False
+    stats: dict | None = None  # per-stage timings when instrumented
+    duplicate_of: str | None = None  # src whose output was linked/copied
+    data: bytes | None = None  # output on its way to a sink (convert_many)
+
+
+def detect_xml_version(path: str) -> int | None:
+    with _stage('detect'):
+        return _detect_xml_version(path)
+
+def _detect_xml_version(path: str) -> int | None:
+    # The <version> element sits right after <ui>, so the head is enough
+    try:
+        member = _pack_member(path)
+        if member is not None:
+            head = bytes(member[:4000]).decode('utf-8', 'replace')
+        else:
+            with open(path, 'r', encoding='utf-8') as fh:
+                head = fh.read(4000)
+    except Exception:
+        return None
+    m = re.search(r"<version>\s*(\d{3})\s*</version>", head)
+    if not m:
+        m = re.search(r"<ui[^>]*version=\"(\d{3})\"", head)
+    return int(m.group(1)) if m else None
+
+def plan_job(mode: str, src: str, outdir: str, ruby_ok: bool = False, nokogiri_ok: bool = False,
+             version: int | None = None) -> ConvertJob:
+    """Pick the destination and converter for one input file.
+
+    `version` may carry the header version already read by a scan, which
+    saves opening the file again. Raises an exception with a user-facing
+    message when the file cannot be converted with the tools available.
+    """
+    base = os.path.basename(src)
+    if mode == 'unpack':
+        if PACK_SEP in src:
+            # Pack members keep their folder layout (ui/...) under outdir
+            dst = os.path.join(outdir, *src.split(PACK_SEP, 1)[1].split('/')) + '.xml'
+        else:
+            dst = os.path.join(outdir, base + '.xml')
+        ver = version if version is not None else detect_version(src)
+        if ver is None:
+            raise ValueError(f"Not a UI layout file: {src}")
+        if ver in PY_SUPPORTED_VERSIONS:
+            return ConvertJob(mode, src, dst, 'python', ver)
+        if ruby_ok:
+            return ConvertJob(mode, src, dst, 'ruby', ver)
+        raise RuntimeError(
+            f"UI version {ver:03d} not supported by built-in converter.\n\n"
+            f"Please install Ruby from https://rubyinstaller.org/\n"
+            f"After installing Ruby, restart this application."
+        )
+    if PACK_SEP in src:
+        # Archive members keep their folder layout under outdir
+        dst = os.path.join(outdir, *os.path.splitext(src.split(PACK_SEP, 1)[1])[0].split('/'))
+    else:
+        dst = os.path.join(outdir, os.path.splitext(base)[0])
+    ver = version if version is not None else detect_xml_version(src)
+    if ver in PY_SUPPORTED_VERSIONS:
+        return ConvertJob(mode, src, dst, 'python', ver)
+    if ruby_ok and nokogiri_ok:
+        return ConvertJob(mode, src, dst, 'ruby', ver)
+    if ruby_ok:
+        raise RuntimeError(
+            "Ruby found but Nokogiri gem missing.\n\n"
+            "Please run in Command Prompt:\n"
+            "gem install nokogiri"
+        )
+    raise RuntimeError(
+        "Ruby not found. Please install Ruby from:\n"
+        "https://rubyinstaller.org/\n\n"
+        "After installing Ruby, run:\n"
+        "gem install nokogiri"
+    )
+
+def run_job(job: ConvertJob) -> None:
+    if PACK_SEP in job.src:
+        os.makedirs(os.path.dirname(job.dst), exist_ok=True)
+    if job.mode == 'unpack':
+        if job.converter == 'ruby' and PACK_SEP in job.src:
+            _ruby_member(ruby_ui2xml, job.src, job.dst, '.ui')
+        elif job.converter == 'ruby':
+            ruby_ui2xml(job.src, job.dst)
+        else:
+            convertUIToXML(job.src, job.dst)
+    else:
+        if job.converter == 'ruby' and PACK_SEP in job.src:
+            _ruby_member(ruby_xml2ui, job.src, job.dst, '.xml')
+        elif job.converter == 'ruby':
+            ruby_xml2ui(job.src, job.dst)
+        else:
+            convertXMLToUI(job.src, job.dst)
+
+def read_job_input(job: ConvertJob) -> bytes:
+    """The input bytes of a job (a file, or a pack/archive member)."""
+    with _stage('read'):
+        data = _pack_member(job.src)
+        if data is None:
+            with open(job.src, 'rb') as fh:
+                return fh.read()
+        return bytes(data)
+
+def convert_job_data(job: ConvertJob, data) -> bytes:
+    """Convert a python-converter job's input bytes; returns the output
+    (UTF-8 XML with '\n' line ends, or .ui bytes)."""
+    if job.mode == 'unpack':
+        # Encoded as it is written, so the XML is held once, as bytes
+        raw = io.BytesIO()
+        buf = io.TextIOWrapper(raw, encoding='utf-8', newline='\n')
+        if STREAM_XML:
+            from uiunpack_gui.stream import stream_data
+            stream_data(data, buf)
+        else:
+            with MemoryReader(data) as uiFile:
+                versionNumber, uiE = _decode_ui(uiFile, job.src)
+            _write_xml(versionNumber, uiE, buf)
+        buf.flush()
+        out = raw.getvalue()
+        if _recorder is not None:
+            _recorder.note(bytes_out=len(out))
+        return out
+    return convertXMLDataToUI(data)
+
+def run_job_data(job: ConvertJob) -> bytes:
+    """Like run_job, but return the output instead of writing job.dst."""
+    if job.converter == 'python':
+        return convert_job_data(job, read_job_input(job))
+    # The Ruby scripts write files; go through a temporary one
+    import tempfile
+    fd, tmp = tempfile.mkstemp(suffix='.xml' if job.mode == 'unpack' else '.ui')
+    os.close(fd)
+    try:
+        run_job(job._replace(dst=tmp))
+        with open(tmp, 'rb') as fh:
+            return fh.read()
+    finally:
+        os.remove(tmp)
+
+def _ruby_member(convert, src: str, dst: str, suffix: str) -> None:
+    # The Ruby scripts need a real file, so extract the member first
+    import tempfile
+    fd, tmp = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(_pack_member(src))
+        convert(tmp, dst)
+    finally:
+        os.remove(tmp)
+
+def _run_job_safe(job: ConvertJob, to_memory: bool = False) -> ConvertResult:
+    # Runs in pool workers; never raises so one bad file can't stop the batch
+    rec = _recorder
+    if rec is not None:
+        rec.begin(job.src, job.mode, job.converter)
+    data = None
+    try:
+        if to_memory:
+            data = run_job_data(job)
+        else:
+            run_job(job)
+    except Exception as e:
+        stats = rec.end(False).as_dict() if rec is not None else None
+        return ConvertResult(job, False, str(e) or type(e).__name__, traceback.format_exc(), stats=stats)
+    return ConvertResult(job, True, stats=rec.end().as_dict() if rec is not None else None, data=data)
+
+def _content_digest(path: str) -> str:
+    import hashlib
+    member = _pack_member(path)
+    if member is not None:
+        return hashlib.sha256(member).hexdigest()
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _dedupe_jobs(jobs: list[ConvertJob], threads: int = 8) -> tuple[list[int], dict[int, list[int]]]:
+    """Indexes of jobs to actually run, and primary index -> duplicates
+    (same mode, converter and input bytes)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def key(job):
+        try:
+            return (job.mode, job.converter, _content_digest(job.src))
+        except OSError:
+            return None
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        keys = list(pool.map(key, jobs))
+    primary: dict[tuple, int] = {}
+    run: list[int] = []
+    dups: dict[int, list[int]] = {}
+    for i, k in enumerate(keys):
+        first = primary.setdefault(k, i) if k is not None else i
+        if first == i:
+            run.append(i)
+        else:
+            dups.setdefault(first, []).append(i)
+    return run, dups
+
+
+def _same_path(a: str, b: str) -> bool:
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def _clone_output(primary: ConvertResult, job: ConvertJob, how: str) -> ConvertResult:
+    # Produce job.dst from the primary's output instead of converting again
+    if not primary.ok or _same_path(job.dst, primary.job.dst):
+        # Identical inputs planned onto one output: the primary wrote it
+        return primary._replace(job=job, detail=None, stats=None, duplicate_of=primary.job.src)
+    # The new file appears in one rename, so a failed copy never costs
+    # job.dst its previous contents
+    tmp = f'{job.dst}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(job.dst) or '.', exist_ok=True)
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        linked = False
+        if how == 'link':
+            try:
+                os.link(primary.job.dst, tmp)
+                linked = True
+            except OSError:
+                pass  # other volume or no hardlink support
+        if not linked:
+            import shutil
+            shutil.copyfile(primary.job.dst, tmp)
+        os.replace(tmp, job.dst)
+    except OSError as e:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return ConvertResult(job, False, str(e), traceback.format_exc(), duplicate_of=primary.job.src)
+    return ConvertResult(job, True, duplicate_of=primary.job.src)
+
+
+def convert_many(
+    jobs: Iterable[ConvertJob],
+    workers: int | None = None,
+    cancel=None,
+    on_result: Callable[[int, ConvertResult], None] | None = None,
+    instrument: bool = False,
+    dedupe: str | None = None,
+    sink=None,
+    depth: int | None = None,
+) -> list[ConvertResult]:
+    """Convert a batch of files across a process pool.
+
+    Results come back in job order. Per-file failures are collected rather
+    than raised. `cancel` is any object with `is_set()` (e.g. a
+    `threading.Event`); once set, jobs that have not started are dropped and
+    reported as cancelled. `on_result(index, result)` is called in the
+    calling thread as each job finishes. With `instrument`, each result
+    carries per-stage stats (see instrument.py).
+
+    With `dedupe` set to 'link' or 'copy', inputs are hashed first and
+    each distinct content is converted once; the outputs of byte-identical
+    inputs are hardlinked (falling back to a copy) or copied from it, and
+    their results carry `duplicate_of`.
+
+    With a `sink` (an archive.ArchiveSink), nothing is written to disk:
+    each output is streamed into the archive as it arrives, named after
+    job.dst relative to the sink's root.
+
+    Files go through the overlapped read/convert/write stages in
+    pipeline.py, with at most `depth` files in flight between reading and
+    writing (default pipeline.DEPTH). `depth=0` (or UIUNPACK_PIPELINE=0)
+    has each worker read, convert and write one file at a time instead, as
+    does `instrument`.
+    """
+    global _recorder
+    jobs = list(jobs)
+    results: list[ConvertResult | None] = [None] * len(jobs)
+    run = range(len(jobs))
+    dups: dict[int, list[int]] = {}
+    if dedupe and len(jobs) > 1:
+        run, dups = _dedupe_jobs(jobs)
+
+    def finish(i: int, res: ConvertResult) -> None:
+        data = res.data
+        if data is not None:
+            res = res._replace(data=None)
+            try:
+                sink.add_output(res.job.dst, data)
+            except Exception as e:
+                res = res._replace(ok=False, error=str(e) or type(e).__name__, detail=traceback.format_exc())
+        results[i] = res
+        if on_result:
+            on_result(i, res)
+        for d in dups.get(i, ()):
+            if sink is None:
+                finish(d, _clone_output(res, jobs[d], dedupe))
+            elif res.ok and not _same_path(jobs[d].dst, res.job.dst):
+                finish(d, ConvertResult(jobs[d], True, duplicate_of=res.job.src, data=data))
+            else:
+                finish(d, res._replace(job=jobs[d], detail=None, stats=None, duplicate_of=res.job.src))
 
+    workers = max(1, min(workers or os.cpu_count() or 1, len(run)))
+    from uiunpack_gui import pipeline
+    if pipeline.ENABLED and depth != 0 and not instrument and run:
+        pipeline.run(jobs, run, finish, workers=workers, depth=depth or pipeline.DEPTH,
+                     cancel=cancel, to_memory=sink is not None)
+        return [r if r is not None else ConvertResult(jobs[i], False, 'Cancelled', cancelled=True)
+                for i, r in enumerate(results)]
+    initializer = None
+    if instrument:
+        from uiunpack_gui.instrument import enable as initializer
+    if workers == 1:
+        # Not worth a pool; convert inline, with a recorder only for this batch
+        previous = _recorder
+        if initializer is not None:
+            initializer()
+        try:
+            for i in run:
+                if cancel is not None and cancel.is_set():
+                    break
+                finish(i, _run_job_safe(jobs[i], sink is not None))
+        finally:
+            _recorder = previous
+    else:
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+            pending = {pool.submit(_run_job_safe, jobs[i], sink is not None): i for i in run}
+            cancelling = False
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i = pending.pop(fut)
+                    if fut.cancelled():
+                        continue
+                    try:
+                        res = fut.result()
+                    except Exception as e:  # worker process died
+                        res = ConvertResult(jobs[i], False, f"{type(e).__name__}: {e}")
+                    finish(i, res)
+                if not cancelling and cancel is not None and cancel.is_set():
+                    cancelling = True
+                    for fut in pending:
+                        fut.cancel()
+    return [r if r is not None else ConvertResult(jobs[i], False, 'Cancelled', cancelled=True)
+            for i, r in enumerate(results)]
 
 
 __all__ = [
     'convertUIToXML',
     'convertXMLToUI',
+    'convertUIDataToXML',
+    'convertXMLDataToUI',
+    'roundtrip_ui',
+    'ConvertJob',
+    'ConvertResult',
+    'convert_many',
+    'plan_job',
+    'run_job',
+    'run_job_data',
+    'record_namespace',
+    'has_ruby',
+    'has_ruby_nokogiri',
+    'invalidate_ruby_probe',
 ]
@@ -1,33 +1,54 @@
 #!/usr/bin/env python3
 
+import multiprocessing
 import os
+import queue
+import subprocess
 import sys
 import threading
+import time
 import traceback
-from tkinter import Tk, StringVar, BooleanVar, ttk, filedialog, messagebox
 from typing import List
 
 # Local converter module
 from uiunpack_gui.etw_ui_convert import (
-    convertUIToXML,
-    convertXMLToUI,
-    detect_version,
-    PY_SUPPORTED_VERSIONS,
+    convert_many,
+    plan_job,
     has_ruby,
     has_ruby_nokogiri,
-    ruby_ui2xml,
-    ruby_xml2ui,
+    invalidate_ruby_probe,
 )
+from uiunpack_gui import archive
+from uiunpack_gui.archive import ArchiveSink
+from uiunpack_gui.manifest import BuildManifest
+from uiunpack_gui.packfile import close_all, member_name_for, write_pack
+from uiunpack_gui.scan import expand_inputs, scan_inputs
+
+# The worker thread never touches Tk: it posts events that the main loop
+# drains every DRAIN_MS. The log keeps at most LOG_MAX_LINES lines.
+DRAIN_MS = 100
+LOG_MAX_LINES = 2000
+
+
+def _import_tk():
+    # tkinter is only imported once a window is actually created, so process
+    # pool workers (which re-import this module on Windows) and headless users
+    # of the converter never pay for loading Tk
+    global Tk, StringVar, BooleanVar, ttk, filedialog, messagebox
+    from tkinter import Tk, StringVar, BooleanVar, ttk, filedialog, messagebox
 
 
 class UiUnpackPackApp:
-    def __init__(self, root: Tk):
+    def __init__(self, root: 'Tk'):
+        _import_tk()
         self.root = root
         root.title("Total War UI Unpack/Pack")
-        root.geometry("600x360")
+        root.geometry("600x400")
+        self._events = queue.SimpleQueue()
 
         self.mode = StringVar(value='unpack')  # 'unpack' or 'pack'
         self.input_files = []
+        self.input_versions = {}  # path -> version found while scanning
         # Set default output to 'output' folder relative to executable
         if getattr(sys, 'frozen', False):
             # Running as compiled exe
@@ -38,6 +59,8 @@ class UiUnpackPackApp:
         default_output = os.path.join(exe_dir, 'output')
         self.output_dir = StringVar(value=default_output)
         self.overwrite = BooleanVar(value=True)
+        self.incremental = BooleanVar(value=False)
+        self.write_pack = BooleanVar(value=False)
 
         frm = ttk.Frame(root, padding=12)
         frm.pack(fill='both', expand=True)
@@ -73,6 +96,8 @@ class UiUnpackPackApp:
         # Overwrite toggle
         chk = ttk.Checkbutton(frm, text="Overwrite existing files", variable=self.overwrite)
         chk.grid(row=3, column=1, sticky='w', pady=(8, 0))
+        inc_chk = ttk.Checkbutton(frm, text="Skip unchanged (incremental)", variable=self.incremental)
+        inc_chk.grid(row=3, column=2, columnspan=2, sticky='w', pady=(8, 0))
 
         # Log
         log_lbl = ttk.Label(frm, text="Log")
@@ -80,13 +105,29 @@ class UiUnpackPackApp:
         self.log = ttk.Treeview(frm, show='tree', height=8)
         self.log.grid(row=4, column=1, columnspan=3, sticky='nsew', pady=(12, 0))
 
-        # Run button
+        # Pack mode: also bundle the .ui output into a new .pack; unpack mode:
+        # stream the XML into one archive instead of the output folder
+        pack_chk = ttk.Checkbutton(frm, text="Write archive (.pack / .zip)", variable=self.write_pack)
+        pack_chk.grid(row=5, column=1, sticky='w', pady=(16, 0))
+
+        # Run / Cancel buttons
+        self._cancel = threading.Event()
+        self.cancel_btn = ttk.Button(frm, text="Cancel", command=self._cancel.set, state='disabled')
+        self.cancel_btn.grid(row=5, column=2, sticky='e', pady=(16, 0))
         self.run_btn = ttk.Button(frm, text="Run", command=self._run)
         self.run_btn.grid(row=5, column=3, sticky='e', pady=(16, 0))
 
+        # Progress
+        self.progress = ttk.Progressbar(frm, mode='determinate')
+        self.progress.grid(row=6, column=0, columnspan=4, sticky='we', pady=(12, 0))
+        self.progress_text = StringVar(value='')
+        ttk.Label(frm, textvariable=self.progress_text).grid(row=7, column=0, columnspan=4, sticky='w')
+        self._progress_start = 0.0
+
         # Layout weights
         frm.columnconfigure(1, weight=1)
         frm.rowconfigure(4, weight=1)
+        root.after(DRAIN_MS, self._drain_events)
 
     def _on_mode_change(self, box):
         val = box.get()
@@ -102,12 +143,20 @@ class UiUnpackPackApp:
 
     def _choose_inputs(self):
         if self.mode.get() == 'unpack':
-            types = [("All files", "*.*"), ("UI files", "*.ui")]
+            types = [("All files", "*.*"), ("UI files", "*.ui"), ("Pack archives", "*.pack"),
+                     ("Zip/tar archives", "*.zip *.tar *.tar.gz *.tgz *.tar.zst")]
         else:
-            types = [("All files", "*.*"), ("XML files", "*.xml")]
+            types = [("All files", "*.*"), ("XML files", "*.xml"),
+                     ("Zip/tar archives", "*.zip *.tar *.tar.gz *.tgz *.tar.zst")]
         files = filedialog.askopenfilenames(title="Select input files", filetypes=types)
         if files:
-            self.input_files = list(files)
+            try:
+                found = expand_inputs(files, self.mode.get())
+            except Exception as e:
+                messagebox.showerror("Cannot read archive", str(e))
+                return
+            self.input_files = [path for path, _ in found]
+            self.input_versions = {path: ver for path, ver in found if ver is not None}
             self._update_in_entry_placeholder()
 
     def _choose_input_folder(self):
@@ -126,33 +175,134 @@ class UiUnpackPackApp:
         self._update_in_entry_placeholder()
 
     def _scan_folder_for_inputs(self, root_dir: str) -> List[str]:
-        results: List[str] = []
-        for base, _, files in os.walk(root_dir):
-            for name in files:
-                path = os.path.join(base, name)
-                if self.mode.get() == 'pack':
-                    if name.lower().endswith('.xml'):
-                        results.append(path)
-                    continue
-                # unpack mode: any file that starts with b'Version' header
-                try:
-                    with open(path, 'rb') as fh:
-                        hdr = fh.read(10)
-                    if len(hdr) >= 10 and hdr.startswith(b'Version'):
-                        results.append(path)
-                except Exception:
-                    pass
-        return results
+        # unpack mode: any file that starts with b'Version' header plus the
+        # ui/ layouts inside *.pack archives; pack: *.xml
+        found = scan_inputs(root_dir, self.mode.get())
+        for path, ver in found:
+            if ver is not None:
+                self.input_versions[path] = ver
+        return [path for path, _ in found]
 
     def _choose_output_dir(self):
         d = filedialog.askdirectory(title="Select output folder", initialdir=self.output_dir.get() or os.getcwd())
         if d:
             self.output_dir.set(d)
 
+    # Events from any thread; only _drain_events touches the widgets
+
     def _log(self, msg):
-        self.log.insert('', 'end', text=str(msg))
-        self.log.see(self.log.get_children()[-1])
-        self.root.update_idletasks()
+        self._events.put(('log', str(msg)))
+
+    def _progress(self, done: int, total: int):
+        # Stamped here: progress events are merged before they are drawn,
+        # so the batch's (0, total) may never reach _show_progress
+        self._events.put(('progress', done, total, time.monotonic()))
+
+    def _call_in_ui(self, fn, *args):
+        self._events.put(('call', fn, args))
+
+    def _ask_in_ui(self, fn, *args):
+        # Run a dialog on the main thread and wait for its answer
+        if threading.current_thread() is threading.main_thread():
+            return fn(*args)
+        done = threading.Event()
+        box = []
+
+        def call():
+            try:
+                box.append(fn(*args))
+            finally:
+                done.set()
+        self._call_in_ui(call)
+        done.wait()
+        return box[0] if box else None
+
+    def _drain_events(self):
+        lines = []
+        progress = None
+        calls = []
+        try:
+            while True:
+                ev = self._events.get_nowait()
+                if ev[0] == 'log':
+                    lines.append(ev[1])
+                elif ev[0] == 'progress':
+                    if ev[1] == 0:
+                        self._progress_start = ev[3]
+                    progress = ev[1:3]
+                else:
+                    calls.append(ev[1:])
+        except queue.Empty:
+            pass
+        if lines:
+            # A backlog larger than the cap would be trimmed straight away
+            for line in lines[-LOG_MAX_LINES:]:
+                self.log.insert('', 'end', text=line)
+            items = self.log.get_children()
+            if len(items) > LOG_MAX_LINES:
+                self.log.delete(*items[:len(items) - LOG_MAX_LINES])
+                items = items[len(items) - LOG_MAX_LINES:]
+            self.log.see(items[-1])
+        if progress is not None:
+            self._show_progress(*progress)
+        for fn, args in calls:
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+        self.root.after(DRAIN_MS, self._drain_events)
+
+    def _show_progress(self, done: int, total: int):
+        self.progress.config(maximum=max(total, 1), value=done)
+        if done == 0:
+            self.progress_text.set(f"0/{total} files")
+            return
+        elapsed = max(time.monotonic() - self._progress_start, 1e-6)
+        rate = done / elapsed
+        eta = int((total - done) / rate) if rate > 0 else 0
+        self.progress_text.set(f"{done}/{total} files  {rate:.1f} files/s  ETA {eta // 3600}:{eta // 60 % 60:02d}:{eta % 60:02d}")
+
+    def _set_running(self, running: bool):
+        self.run_btn.config(state='disabled' if running else 'normal')
+        self.cancel_btn.config(state='normal' if running else 'disabled')
+
+    def _offer_nokogiri_install(self) -> bool:
+        try:
+            if not self._ask_in_ui(
+                messagebox.askyesno,
+                "Install Nokogiri",
+                "Ruby is installed but the Nokogiri gem is missing, which is required for packing.\n\nInstall it now?"
+            ):
+                return False
+            self._log("Installing Nokogiri gem...")
+            # On Windows, use shell=True to find gem in PATH
+            subprocess.run('gem install nokogiri --no-document', shell=True, check=True)
+            invalidate_ruby_probe()
+            if not has_ruby_nokogiri():
+                raise RuntimeError('Nokogiri still not available after installation')
+            self._log("Nokogiri installed.")
+            return True
+        except subprocess.CalledProcessError as cpe:
+            self._log(f"Failed to install Nokogiri: {cpe}")
+            self._call_in_ui(
+                messagebox.showerror,
+                "Installation Failed",
+                "Failed to install Nokogiri gem automatically.\n\n"
+                "Please install it manually by opening Command Prompt and running:\n"
+                "gem install nokogiri\n\n"
+                "If that doesn't work, try:\n"
+                "gem install nokogiri --platform=ruby"
+            )
+        except Exception as ie:
+            self._log(f"Failed to install Nokogiri: {ie}")
+            self._call_in_ui(
+                messagebox.showerror,
+                "Installation Error",
+                f"Could not install Nokogiri: {ie}\n\n"
+                "Please install manually in Command Prompt:\n"
+                "gem install nokogiri"
+            )
+        return False
 
     def _run(self):
         if not self.input_files:
@@ -162,133 +312,152 @@ class UiUnpackPackApp:
         if not outdir:
             messagebox.showwarning("No output", "Choose an output folder.")
             return
+        pack_path = archive_path = None
+        if self.mode.get() == 'pack' and self.write_pack.get():
+            pack_path = filedialog.asksaveasfilename(
+                title="Save .pack as", defaultextension=".pack", filetypes=[("Pack archives", "*.pack")],
+                initialdir=outdir)
+            if not pack_path:
+                return
+        elif self.write_pack.get():
+            archive_path = filedialog.asksaveasfilename(
+                title="Save XML archive as", defaultextension=".zip",
+                filetypes=[("Zip archives", "*.zip"), ("Gzipped tar", "*.tar.gz"),
+                           ("Zstandard tar", "*.tar.zst"), ("Tar archives", "*.tar")],
+                initialdir=outdir)
+            if not archive_path:
+                return
         os.makedirs(outdir, exist_ok=True)
-        self.run_btn.config(state='disabled')
+        self._set_running(True)
+        self._cancel.clear()
+        # Tk variables are read here, on the main thread, not by the worker
+        mode = self.mode.get()
+        incremental = self.incremental.get()
+        overwrite = self.overwrite.get()
+        inputs = list(self.input_files)
+        versions = dict(self.input_versions)
         self._log("Starting…")
 
         def worker():
             try:
-                total = len(self.input_files)
+                total = len(inputs)
                 self._log(f"Processing {total} file(s)...")
                 ruby_ok = has_ruby()
                 self._log(f"Ruby available: {ruby_ok}")
                 nokogiri_ok = has_ruby_nokogiri() if ruby_ok else False
                 if ruby_ok:
                     self._log(f"Nokogiri available: {nokogiri_ok}")
-                for idx, src in enumerate(self.input_files, start=1):
-                    base = os.path.basename(src)
-                    name, ext = os.path.splitext(base)
-                    if self.mode.get() == 'unpack':
-                        dst = os.path.join(outdir, base + '.xml')
-                        action = 'UI→XML'
-                        ver = detect_version(src)
-                        if ver is None:
-                            raise Exception(f"Not a UI layout file: {src}")
-                        if ver in PY_SUPPORTED_VERSIONS:
-                            do = lambda: convertUIToXML(src, dst)
-                        elif ruby_ok:
-                            do = lambda: ruby_ui2xml(src, dst)
-                        else:
-                            raise Exception(
-                                f"UI version {ver:03d} not supported by built-in converter.\n\n"
-                                f"Please install Ruby from https://rubyinstaller.org/\n"
-                                f"After installing Ruby, restart this application."
-                            )
-                    else:
-                        dst = os.path.join(outdir, name)
-                        action = 'XML→UI'
-                        # Prefer Python if supported by target version in XML, otherwise Ruby+Nokogiri
-                        # We read the version from the XML to decide
-                        ver = None
-                        try:
-                            with open(src, 'r', encoding='utf-8') as fh:
-                                head = fh.read(4000)
-                            import re
-                            m = re.search(r"<version>\s*(\d{3})\s*</version>", head)
-                            if not m:
-                                m = re.search(r"<ui[^>]*version=\"(\d{3})\"", head)
-                            if m:
-                                ver = int(m.group(1))
-                        except Exception:
-                            pass
-                        # If Ruby is present but Nokogiri is missing, offer to install it once
-                        if ruby_ok and not nokogiri_ok:
-                            try:
-                                if messagebox.askyesno(
-                                    "Install Nokogiri",
-                                    "Ruby is installed but the Nokogiri gem is missing, which is required for packing.\n\nInstall it now?"
-                                ):
-                                    import subprocess
-                                    self._log("Installing Nokogiri gem...")
-                                    # On Windows, use shell=True to find gem in PATH
-                                    subprocess.run('gem install nokogiri --no-document', shell=True, check=True)
-                                    nokogiri_ok = has_ruby_nokogiri()
-                                    if not nokogiri_ok:
-                                        raise RuntimeError('Nokogiri still not available after installation')
-                                    else:
-                                        self._log("Nokogiri installed.")
-                            except subprocess.CalledProcessError as cpe:
-                                self._log(f"Failed to install Nokogiri: {cpe}")
-                                messagebox.showerror(
-                                    "Installation Failed",
-                                    "Failed to install Nokogiri gem automatically.\n\n"
-                                    "Please install it manually by opening Command Prompt and running:\n"
-                                    "gem install nokogiri\n\n"
-                                    "If that doesn't work, try:\n"
-                                    "gem install nokogiri --platform=ruby"
-                                )
-                            except Exception as ie:
-                                self._log(f"Failed to install Nokogiri: {ie}")
-                                messagebox.showerror(
-                                    "Installation Error",
-                                    f"Could not install Nokogiri: {ie}\n\n"
-                                    "Please install manually in Command Prompt:\n"
-                                    "gem install nokogiri"
-                                )
-                        if ver in PY_SUPPORTED_VERSIONS:
-                            do = lambda: convertXMLToUI(src, dst)
-                        elif ruby_ok and nokogiri_ok:
-                            do = lambda: ruby_xml2ui(src, dst)
-                        elif ruby_ok and not nokogiri_ok:
-                            raise Exception(
-                                "Ruby found but Nokogiri gem missing.\n\n"
-                                "Please run in Command Prompt:\n"
-                                "gem install nokogiri"
-                            )
-                        else:
-                            raise Exception(
-                                "Ruby not found. Please install Ruby from:\n"
-                                "https://rubyinstaller.org/\n\n"
-                                "After installing Ruby, run:\n"
-                                "gem install nokogiri"
-                            )
-
-                    if os.path.exists(dst) and not self.overwrite.get():
-                        self._log(f"[{idx}/{total}] Skip (exists): {dst}")
-                        continue
+                # If Ruby is present but Nokogiri is missing, offer to install it once
+                if mode == 'pack' and ruby_ok and not nokogiri_ok:
+                    nokogiri_ok = self._offer_nokogiri_install()
 
-                    self._log(f"[{idx}/{total}] {action}: {src} → {dst}")
+                # Outputs streamed into an archive never land in outdir, so
+                # there is nothing there to skip or keep a manifest for
+                sink = ArchiveSink(archive_path, root=outdir) if archive_path else None
+                manifest = BuildManifest(outdir) if incremental and sink is None else None
+                planned = []
+                jobs = []
+                stamps = {}
+                failed = 0
+                skipped = 0
+                for src in inputs:
                     try:
-                        do()
+                        job = plan_job(mode, src, outdir, ruby_ok, nokogiri_ok, versions.get(src))
                     except Exception as e:
-                        self._log(f"ERROR: {e}")
-                        traceback.print_exc()
-                        messagebox.showerror("Conversion error", f"Failed on:\n{src}\n\n{e}")
-                        break
+                        failed += 1
+                        self._log(f"ERROR: {src}: {e}")
+                        continue
+                    planned.append(job)
+                    if sink is None and os.path.exists(job.dst) and not overwrite:
+                        skipped += 1
+                        self._log(f"Skip (exists): {job.dst}")
+                        continue
+                    if manifest is not None:
+                        if not manifest.needs_build(job):
+                            skipped += 1
+                            continue
+                        try:
+                            stamps[job] = manifest.stamp(job)
+                        except OSError:
+                            pass  # the conversion will report it
+                    jobs.append(job)
+                if manifest is not None and skipped:
+                    self._log(f"{skipped} file(s) unchanged since last run")
+
+                action = 'UI→XML' if mode == 'unpack' else 'XML→UI'
+                done = 0
+                self._progress(0, len(jobs))
+
+                def report(_idx, res):
+                    nonlocal done, failed
+                    done += 1
+                    self._progress(done, len(jobs))
+                    job = res.job
+                    if res.ok:
+                        self._log(f"[{done}/{len(jobs)}] {action}: {job.src} → {job.dst}")
+                    elif not res.cancelled:
+                        failed += 1
+                        self._log(f"[{done}/{len(jobs)}] ERROR: {job.src}: {res.error}")
+                        if res.detail:
+                            print(res.detail, file=sys.stderr)
+
+                # XML outputs get edited by hand, so duplicates are copied
+                # rather than hardlinked to each other
+                try:
+                    results = convert_many(jobs, cancel=self._cancel, on_result=report,
+                                           dedupe='copy' if mode == 'unpack' else 'link', sink=sink)
+                except BaseException:
+                    if sink is not None:
+                        sink.abort()
+                    raise
+                if sink is not None:
+                    if self._cancel.is_set():
+                        sink.abort()
+                    else:
+                        sink.close()
+                        self._log(f"Wrote {sink.count} file(s) to {archive_path}")
+                if manifest is not None:
+                    for res in results:
+                        if res.ok and res.job in stamps:
+                            manifest.record(res.job, stamps[res.job])
+                        elif not res.cancelled:
+                            manifest.forget(res.job)
+                    manifest.save()
+                converted = sum(1 for r in results if r.ok)
+                deduped = sum(1 for r in results if r.ok and r.duplicate_of)
+                if deduped:
+                    self._log(f"{deduped} duplicate input(s) reused an identical file's output instead of converting")
+                if pack_path and not self._cancel.is_set():
+                    bad = {r.job.dst for r in results if not r.ok}
+                    members = [(member_name_for(os.path.splitext(j.src)[0]), j.dst)
+                               for j in planned if j.dst not in bad and os.path.exists(j.dst)]
+                    n = write_pack(pack_path, members)
+                    self._log(f"Wrote {n} file(s) to {pack_path}")
+                summary = f"{converted} converted, {failed} failed, {skipped} skipped"
+                if self._cancel.is_set():
+                    self._log(f"Cancelled. {summary}")
                 else:
-                    self._log("Done.")
+                    self._log(f"Done. {summary}")
+                if failed:
+                    self._call_in_ui(messagebox.showerror, "Conversion errors",
+                                     f"{failed} file(s) failed to convert.\n\nSee the log for details.")
             except Exception as e:
                 self._log(f"FATAL ERROR: {e}")
                 traceback.print_exc()
-                import tkinter.messagebox as mb
-                mb.showerror("Fatal Error", f"An unexpected error occurred:\n\n{e}\n\nCheck the console for details.")
+                self._call_in_ui(messagebox.showerror, "Fatal Error",
+                                 f"An unexpected error occurred:\n\n{e}\n\nCheck the console for details.")
             finally:
-                self.run_btn.config(state='normal')
+                # Don't keep input packs and archives mapped (and locked on
+                # Windows) between runs
+                close_all()
+                archive.close_all()
+                self._call_in_ui(self._set_running, False)
 
         threading.Thread(target=worker, daemon=True).start()
 
 
 def main():
+    _import_tk()
     root = Tk()
     # Use native theme if available
     try:
@@ -303,4 +472,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # Needed so process-pool workers start correctly in the frozen exe
+    multiprocessing.freeze_support()
     main()
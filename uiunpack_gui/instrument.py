@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+# Per-stage instrumentation for conversions.
+#
+# etw_ui_convert has hooks around each stage of a conversion (version
+# detection, loading the upstream code, reading, binary decode, XML writing,
+# XML parsing, building the entry tree, binary encode, output write and the
+# Ruby fallback). They do nothing until a Recorder is installed with
+# enable(); then every file gets wall times per stage, bytes in/out and
+# entry/record counts, which can be written as JSON or CSV and summarised.
+#
+#   python -m uiunpack_gui.instrument batch --mode unpack --report run.json FILES_OR_DIRS...
+#   python -m uiunpack_gui.instrument profile FILE [--tracemalloc] [--pstats out.prof]
+
+import csv
+import json
+import os
+import sys
+import time
+
+from uiunpack_gui import etw_ui_convert as conv
+
+# Display order; stages not listed here sort after these
+STAGES = ('detect', 'load_upstream', 'specialize', 'read', 'decode', 'write_xml',
+          'parse_xml', 'build', 'transcode', 'encode', 'write', 'ruby')
+COUNTS = ('bytes_in', 'bytes_out', 'entries', 'records')
+
+
+class FileStats:
+    __slots__ = ('path', 'mode', 'converter', 'ok', 'wall', 'stages', 'counts')
+
+    def __init__(self, path: str, mode: str = '', converter: str = ''):
+        self.path = path
+        self.mode = mode
+        self.converter = converter
+        self.ok = True
+        self.wall = 0.0
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        return {'path': self.path, 'mode': self.mode, 'converter': self.converter, 'ok': self.ok,
+                'wall': self.wall, 'stages': dict(self.stages), **self.counts}
+
+
+class _Stage:
+    __slots__ = ('_stats', '_name', '_t0')
+
+    def __init__(self, stats: FileStats, name: str):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stages = self._stats.stages
+        stages[self._name] = stages.get(self._name, 0.0) + time.perf_counter() - self._t0
+        return False
+
+
+class Recorder:
+    """Collects FileStats; work outside begin()/end() (e.g. version
+    detection while planning) is booked to `unattributed`."""
+
+    def __init__(self):
+        self.files: list[FileStats] = []
+        self.unattributed = FileStats('<unattributed>')
+        self._current: FileStats | None = None
+        self._t0 = 0.0
+
+    def begin(self, path: str, mode: str = '', converter: str = '') -> None:
+        self._current = FileStats(path, mode, converter)
+        self._t0 = time.perf_counter()
+
+    def end(self, ok: bool = True) -> FileStats | None:
+        stats, self._current = self._current, None
+        if stats is not None:
+            stats.wall = time.perf_counter() - self._t0
+            stats.ok = ok
+            self.files.append(stats)
+        return stats
+
+    def _target(self) -> FileStats:
+        return self._current or self.unattributed
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self._target(), name)
+
+    def note(self, **counts) -> None:
+        target = self._target().counts
+        for k, v in counts.items():
+            target[k] = target.get(k, 0) + v
+
+    def note_tree(self, root) -> None:
+        entries, records = count_nodes(root)
+        self.note(entries=entries, records=records)
+
+
+def count_nodes(root) -> tuple[int, int]:
+    """(UiEntry count, other record count) of a decoded or built tree."""
+    entry_cls = type(root)
+    entries = records = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        entries += 1
+        for value in conv._record_fields(node).values():
+            if type(value) is list and value:
+                if isinstance(value[0], entry_cls):
+                    stack.extend(value)
+                elif hasattr(value[0], 'readFrom'):
+                    records += len(value)
+    return entries, records
+
+
+def enable() -> Recorder:
+    """Install a Recorder in this process (keeps an existing one)."""
+    if conv._recorder is None:
+        conv._recorder = Recorder()
+    return conv._recorder
+
+
+def disable() -> Recorder | None:
+    rec, conv._recorder = conv._recorder, None
+    return rec
+
+
+# Reports
+
+def _stats_dicts(items) -> list[dict]:
+    # Accepts FileStats, their dicts, or ConvertResults carrying stats
+    out = []
+    for item in items:
+        if isinstance(item, FileStats):
+            out.append(item.as_dict())
+        elif isinstance(item, conv.ConvertResult):
+            if item.stats:
+                out.append(item.stats)
+        elif item:
+            out.append(item)
+    return out
+
+
+def _stage_names(rows: list[dict]) -> list[str]:
+    seen = {name for r in rows for name in r.get('stages', {})}
+    return [s for s in STAGES if s in seen] + sorted(seen.difference(STAGES))
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(items) -> dict:
+    rows = _stats_dicts(items)
+    wall = sum(r.get('wall', 0.0) for r in rows)
+    stages = {}
+    for name in _stage_names(rows):
+        times = [r['stages'][name] for r in rows if name in r.get('stages', {})]
+        stages[name] = {'total': sum(times), 'files': len(times), 'mean': sum(times) / len(times),
+                        'p95': _pct(times, 0.95), 'share': sum(times) / wall if wall else 0.0}
+    counts = {k: sum(r.get(k, 0) for r in rows) for k in COUNTS}
+    return {'files': len(rows), 'failed': sum(1 for r in rows if not r.get('ok', True)),
+            'wall': wall, 'files_per_s': len(rows) / wall if wall else 0.0,
+            'mb_in_per_s': counts['bytes_in'] / 1e6 / wall if wall else 0.0,
+            'stages': stages, **counts}
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{summary['files']} file(s), {summary['failed']} failed, {summary['wall']:.3f}s converter time, "
+             f"{summary['files_per_s']:.1f} files/s, {summary['mb_in_per_s']:.2f} MB/s in",
+             f"bytes in {summary['bytes_in']:,}  out {summary['bytes_out']:,}  "
+             f"entries {summary['entries']:,}  records {summary['records']:,}",
+             f"{'stage':14} {'total s':>9} {'share':>6} {'mean ms':>9} {'p95 ms':>9} {'files':>6}"]
+    for name, s in summary['stages'].items():
+        lines.append(f"{name:14} {s['total']:9.3f} {s['share'] * 100:5.1f}% {s['mean'] * 1e3:9.2f} "
+                     f"{s['p95'] * 1e3:9.2f} {s['files']:6d}")
+    return '\n'.join(lines)
+
+
+def write_report(items, path: str) -> dict:
+    """Write per-file stats as CSV (by extension) or JSON with a summary;
+    returns the summary."""
+    rows = _stats_dicts(items)
+    summary = summarize(rows)
+    if path.lower().endswith('.csv'):
+        stages = _stage_names(rows)
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            w = csv.writer(fh)
+            w.writerow(['path', 'mode', 'converter', 'ok', 'wall', *COUNTS, *stages])
+            for r in rows:
+                w.writerow([r['path'], r.get('mode', ''), r.get('converter', ''), r.get('ok', True),
+                            f"{r.get('wall', 0.0):.6f}", *(r.get(k, 0) for k in COUNTS),
+                            *(f"{r['stages'][s]:.6f}" if s in r.get('stages', {}) else '' for s in stages)])
+    else:
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'summary': summary, 'files': rows}, fh, indent=1)
+    return summary
+
+
+# Single-file profiling
+
+def _convert_once(path: str, mode: str, out_dir: str) -> None:
+    if mode == 'unpack':
+        conv.convertUIToXML(path, os.path.join(out_dir, 'out.xml'))
+    else:
+        conv.convertXMLToUI(path, os.path.join(out_dir, 'out.ui'))
+
+
+def profile_file(path: str, mode: str | None = None, use_tracemalloc: bool = False,
+                 pstats_path: str | None = None, limit: int = 25) -> str:
+    """Convert one file under cProfile (and optionally tracemalloc) and
+    return a printable report. Upstream loading is done first so it doesn't
+    dominate the profile; its cost shows up in `batch` stage reports."""
+    import cProfile
+    import io
+    import pstats
+    import tempfile
+    import tracemalloc
+
+    if mode is None:
+        mode = 'pack' if path.lower().endswith('.xml') else 'unpack'
+    conv._load_upstream_impl()
+    out = io.StringIO()
+    with tempfile.TemporaryDirectory(prefix='uiunpack-profile-') as work:
+        _convert_once(path, mode, work)  # warm caches and specialised code
+        prof = cProfile.Profile()
+        prof.enable()
+        _convert_once(path, mode, work)
+        prof.disable()
+        if pstats_path:
+            prof.dump_stats(pstats_path)
+        pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(limit)
+        if use_tracemalloc:
+            tracemalloc.start(10)
+            _convert_once(path, mode, work)
+            snap = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out.write(f"\ntracemalloc: peak {peak / 1024:.1f} KiB, still allocated {current / 1024:.1f} KiB\n")
+            for stat in snap.statistics('lineno')[:limit]:
+                out.write(f"  {stat}\n")
+    return out.getvalue()
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description='Instrumented conversions and profiling.')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    b = sub.add_parser('batch', help='convert files with per-stage timings')
+    b.add_argument('inputs', nargs='+', help='files or folders')
+    b.add_argument('--mode', choices=('unpack', 'pack'), default='unpack')
+    b.add_argument('--outdir', help='output folder (default: a temporary one)')
+    b.add_argument('--workers', type=int, default=None)
+    b.add_argument('--report', help='write per-file stats here (.json or .csv)')
+    p = sub.add_parser('profile', help='cProfile (and tracemalloc) one conversion')
+    p.add_argument('file')
+    p.add_argument('--mode', choices=('unpack', 'pack'))
+    p.add_argument('--tracemalloc', action='store_true')
+    p.add_argument('--pstats', help='also save raw cProfile data here')
+    p.add_argument('--limit', type=int, default=25)
+    args = ap.parse_args()
+
+    if args.cmd == 'profile':
+        print(profile_file(args.file, args.mode, args.tracemalloc, args.pstats, args.limit))
+        return
+
+    import tempfile
+    from uiunpack_gui.scan import expand_inputs, scan_inputs
+    rec = enable()
+    found = []
+    for item in args.inputs:
+        found.extend(scan_inputs(item, args.mode) if os.path.isdir(item) else expand_inputs([item], args.mode))
+    with tempfile.TemporaryDirectory(prefix='uiunpack-instrument-') as tmp:
+        outdir = args.outdir or tmp
+        os.makedirs(outdir, exist_ok=True)
+        ruby_ok = conv.has_ruby()
+        jobs = []
+        for path, ver in found:
+            try:
+                jobs.append(conv.plan_job(args.mode, path, outdir, ruby_ok, ruby_ok and conv.has_ruby_nokogiri(), ver))
+            except Exception as e:
+                print(f"skip {path}: {e}", file=sys.stderr)
+        results = conv.convert_many(jobs, workers=args.workers, instrument=True)
+    for r in results:
+        if not r.ok:
+            print(f"FAILED {r.job.src}: {r.error}", file=sys.stderr)
+    summary = write_report(results, args.report) if args.report else summarize(results)
+    print(format_summary(summary))
+    if rec.unattributed.stages:
+        print('outside conversions: ' + ', '.join(f'{k} {v:.3f}s' for k, v in rec.unattributed.stages.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+# Lightweight, read-only stand-in for xml.dom.minidom used by convertXMLToUI.
+#
+# Built straight from expat callbacks (the same parser minidom uses), so text
+# is split and merged into nodes exactly as minidom does it: whitespace runs
+# between elements become Text nodes, adjacent character data is coalesced,
+# CDATA sections and comments are their own nodes. That keeps upstream code
+# that walks `firstChild`/`nextSibling` chains byte-for-byte compatible.
+# Nodes are __slots__ objects holding only what UiEntry.constructFromNode
+# reads, a fraction of minidom's per-node footprint.
+#
+# With build_entries=True the UiEntry tree is built while parsing: as each
+# <uiEntry> element closes, an entry is constructed from it (its own child
+# entries are already built) and the element's subtree is freed. Only the
+# elements still open are ever held, so the node view never exists in full
+# and peak memory is about the entry tree's. The entry classes from
+# Document.entry_class() pick those entries up when the upstream code walks
+# the document.
+
+import threading
+from xml.dom import Node
+from xml.parsers import expat
+
+__all__ = ['parse', 'parse_string']
+
+
+class _Node(Node):
+    # nextSibling is linked by the builder; previousSibling is derived on
+    # demand since nothing on the hot path walks backwards
+    __slots__ = ('parentNode', 'nextSibling')
+
+    nodeValue = None
+    childNodes = ()
+    attributes = None
+
+    @property
+    def previousSibling(self):
+        parent = self.parentNode
+        if parent is None:
+            return None
+        siblings = parent.childNodes
+        for i, node in enumerate(siblings):
+            if node is self:
+                return siblings[i - 1] if i else None
+        return None
+
+    @property
+    def firstChild(self):
+        return self.childNodes[0] if self.childNodes else None
+
+    @property
+    def lastChild(self):
+        return self.childNodes[-1] if self.childNodes else None
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+
+class _CharacterData(_Node):
+    __slots__ = ('data',)
+
+    def __init__(self, data, parent=None):
+        self.data = data
+        self.parentNode = parent
+        self.nextSibling = None
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+    @property
+    def length(self):
+        return len(self.data)
+
+
+class Text(_CharacterData):
+    __slots__ = ()
+    nodeType = Node.TEXT_NODE
+    nodeName = '#text'
+
+
+class CDATASection(_CharacterData):
+    __slots__ = ()
+    nodeType = Node.CDATA_SECTION_NODE
+    nodeName = '#cdata-section'
+
+
+class Comment(_CharacterData):
+    __slots__ = ()
+    nodeType = Node.COMMENT_NODE
+    nodeName = '#comment'
+
+
+class ProcessingInstruction(_Node):
+    __slots__ = ('target', 'data')
+    nodeType = Node.PROCESSING_INSTRUCTION_NODE
+
+    def __init__(self, target, data, parent=None):
+        self.target = target
+        self.data = data
+        self.parentNode = parent
+        self.nextSibling = None
+
+    @property
+    def nodeName(self):
+        return self.target
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+
+class _Container(_Node):
+    __slots__ = ('childNodes',)
+
+    def getElementsByTagName(self, name):
+        # Descendants in document order, like minidom
+        found = []
+        stack = [iter(self.childNodes)]
+        while stack:
+            for node in stack[-1]:
+                if node.nodeType == Node.ELEMENT_NODE:
+                    if name == '*' or node.tagName == name:
+                        found.append(node)
+                    if node.childNodes:
+                        stack.append(iter(node.childNodes))
+                        break
+            else:
+                stack.pop()
+        return found
+
+
+class Element(_Container):
+    # `_entry` holds the UiEntry built from a <uiEntry> while parsing
+    __slots__ = ('tagName', '_attrs', '_entry')
+    nodeType = Node.ELEMENT_NODE
+
+    def __init__(self, tagName, attrs, parent=None):
+        self.tagName = tagName
+        self._attrs = attrs or None
+        self._entry = None
+        self.childNodes = []
+        self.parentNode = parent
+        self.nextSibling = None
+
+    @property
+    def nodeName(self):
+        return self.tagName
+
+    @property
+    def localName(self):
+        return self.tagName.rpartition(':')[2]
+
+    @property
+    def attributes(self):
+        return dict(self._attrs or ())
+
+    def getAttribute(self, name):
+        return (self._attrs or {}).get(name, '')
+
+    def hasAttribute(self, name):
+        return bool(self._attrs) and name in self._attrs
+
+
+class Document(_Container):
+    __slots__ = ('documentElement',)
+    nodeType = Node.DOCUMENT_NODE
+    nodeName = '#document'
+
+    def __init__(self):
+        self.childNodes = []
+        self.documentElement = None
+        self.parentNode = self.nextSibling = None
+
+    def unlink(self):
+        _release(self)
+        self.documentElement = None
+
+    def entry_class(self, version: int):
+        """UiEntry class for building from this document: it takes over
+        entries built while parsing and frees each entry's element subtree
+        once the entry is built."""
+        return _entry_class(version)
+
+
+def _release(node) -> None:
+    # Break the parent/sibling cycles below `node` so its descendants are
+    # freed immediately; `node` itself stays linked to its siblings
+    stack = list(node.childNodes)
+    node.childNodes = []
+    while stack:
+        node = stack.pop()
+        node.parentNode = node.nextSibling = None
+        if node.childNodes:
+            stack.extend(node.childNodes)
+            node.childNodes = []
+
+
+def _releasing_namespace(version: int) -> dict:
+    from uiunpack_gui.etw_ui_convert import _record_fields, record_namespace
+    ns = record_namespace(version)
+    base = ns['UiEntry']
+
+    def constructFromNode(self, node, _base=base):
+        built = getattr(node, '_entry', None)
+        if built is None:
+            _base.constructFromNode(self, node)
+            _release(node)
+            return
+        node._entry = None
+        for name, value in _record_fields(built).items():
+            setattr(self, name, value)
+
+    ns['UiEntry'] = type('UiEntry', (base,), {'constructFromNode': constructFromNode,
+                                              '__module__': base.__module__, '__slots__': ()})
+    return ns
+
+
+_ns_lock = threading.Lock()
+_namespaces: dict[tuple[int, bool], dict] = {}
+
+
+def _entry_class(version: int):
+    from uiunpack_gui import etw_ui_convert as conv
+    # Keyed on SPECIALIZE too, which specialize.check() flips between runs
+    key = (version, conv.SPECIALIZE)
+    with _ns_lock:
+        ns = _namespaces.get(key)
+        if ns is None:
+            ns = _namespaces[key] = _releasing_namespace(version)
+        return ns['UiEntry']
+
+
+class _Builder:
+    def __init__(self, build_entries=False):
+        self.document = Document()
+        self.cur = self.document
+        self.in_cdata = False
+        self.cdata_continue = False
+        self.build_entries = build_entries
+        # Set once <version> has been read and is one the converter supports
+        self.version = None
+        self.entry_cls = None
+        self.entry_depth = 0
+
+    def _append(self, node):
+        siblings = self.cur.childNodes
+        if siblings:
+            siblings[-1].nextSibling = node
+        siblings.append(node)
+
+    def start_element(self, name, attrs):
+        parent = self.cur
+        node = Element(name, attrs, parent)
+        siblings = parent.childNodes
+        if siblings:
+            siblings[-1].nextSibling = node
+        siblings.append(node)
+        if parent is self.document:
+            parent.documentElement = node
+        elif name == 'uiEntry':
+            self.entry_depth += 1
+        self.cur = node
+
+    def end_element(self, name):
+        node = self.cur
+        self.cur = node.parentNode
+        if not self.build_entries:
+            return
+        if name == 'uiEntry' and node.parentNode is not self.document:
+            self.entry_depth -= 1
+            if self.entry_cls is not None:
+                # Same indent the upstream construction would give it
+                entry = self.entry_cls(self.version, 2 * self.entry_depth)
+                entry.constructFromNode(node)
+                node._entry = entry
+        elif name == 'version' and self.cur is self.document.documentElement and self.version is None:
+            from uiunpack_gui.etw_ui_convert import PY_SUPPORTED_VERSIONS, _ensure_upstream
+            try:
+                version = int(''.join(n.data for n in node.childNodes if n.nodeType == Node.TEXT_NODE))
+            except ValueError:
+                return
+            if version in PY_SUPPORTED_VERSIONS:
+                _ensure_upstream('constructFromNode')
+                self.version = version
+                self.entry_cls = _entry_class(version)
+
+    def character_data(self, data):
+        parent = self.cur
+        siblings = parent.childNodes
+        if self.in_cdata:
+            if self.cdata_continue and siblings[-1].nodeType == Node.CDATA_SECTION_NODE:
+                siblings[-1].data += data
+                return
+            self.cdata_continue = True
+            self._append(CDATASection(data, parent))
+        elif siblings:
+            last = siblings[-1]
+            if last.nodeType == Node.TEXT_NODE:
+                last.data += data
+                return
+            node = Text(data, parent)
+            last.nextSibling = node
+            siblings.append(node)
+        else:
+            siblings.append(Text(data, parent))
+
+    def start_cdata(self):
+        self.in_cdata = True
+        self.cdata_continue = False
+
+    def end_cdata(self):
+        self.in_cdata = False
+        self.cdata_continue = False
+
+    def comment(self, data):
+        self._append(Comment(data, self.cur))
+
+    def processing_instruction(self, target, data):
+        self._append(ProcessingInstruction(target, data, self.cur))
+
+    def make_parser(self):
+        p = expat.ParserCreate()
+        p.buffer_text = True
+        p.ordered_attributes = False
+        p.StartElementHandler = self.start_element
+        p.EndElementHandler = self.end_element
+        p.CharacterDataHandler = self.character_data
+        p.StartCdataSectionHandler = self.start_cdata
+        p.EndCdataSectionHandler = self.end_cdata
+        p.CommentHandler = self.comment
+        p.ProcessingInstructionHandler = self.processing_instruction
+        return p
+
+
+def _parse_with(feed, build_entries) -> Document:
+    builder = _Builder(build_entries)
+    feed(builder.make_parser())
+    return builder.document
+
+
+def parse(path_or_file, build_entries=False) -> Document:
+    if hasattr(path_or_file, 'read'):
+        return _parse_with(lambda p: p.ParseFile(path_or_file), build_entries)
+    with open(path_or_file, 'rb') as fh:
+        return _parse_with(lambda p: p.ParseFile(fh), build_entries)
+
+
+def parse_string(data, build_entries=False) -> Document:
+    return _parse_with(lambda p: p.Parse(data, True), build_entries)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Build manifest for incremental conversions.
+# Lives in the output folder and remembers, per output file, the source it was
+# built from (hash, size, mtime), the detected version and the converter used.
+
+import json
+import os
+
+from uiunpack_gui.etw_ui_convert import ConvertJob, _content_digest, _pack_member
+from uiunpack_gui.packfile import is_pack_path, split_pack_path
+
+MANIFEST_NAME = '.uiunpack-manifest.json'
+MANIFEST_FORMAT = 1
+
+
+def file_digest(path: str) -> str:
+    return _content_digest(path)
+
+
+def _src_stat(path: str) -> os.stat_result:
+    # A pack or archive member takes its mtime from the archive and its own size
+    if not is_pack_path(path):
+        return os.stat(path)
+    st = os.stat(split_pack_path(path)[0])
+    fields = list(st)
+    fields[6] = len(_pack_member(path))
+    return os.stat_result(fields, {'st_mtime_ns': st.st_mtime_ns})
+
+
+class BuildManifest:
+    def __init__(self, outdir: str):
+        self.outdir = outdir
+        self.path = os.path.join(outdir, MANIFEST_NAME)
+        self.entries: dict[str, dict] = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if data.get('format') == MANIFEST_FORMAT:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            # Missing or unreadable manifest: everything gets rebuilt
+            pass
+
+    def _key(self, job: ConvertJob) -> str:
+        return os.path.relpath(job.dst, self.outdir).replace('\\', '/')
+
+    def needs_build(self, job: ConvertJob) -> bool:
+        """True unless the output was built from identical source content
+        with the same converter and has not been touched since."""
+        rec = self.entries.get(self._key(job))
+        if rec is None:
+            return True
+        if (rec.get('src') != os.path.abspath(job.src) or rec.get('mode') != job.mode
+                or rec.get('converter') != job.converter):
+            return True
+        try:
+            st = _src_stat(job.src)
+            dst_st = os.stat(job.dst)
+        except OSError:
+            return True
+        if dst_st.st_size != rec.get('dst_size') or dst_st.st_mtime_ns != rec.get('dst_mtime_ns'):
+            return True
+        if st.st_size != rec.get('size'):
+            return True
+        if st.st_mtime_ns == rec.get('mtime_ns'):
+            return False
+        # Touched but possibly unchanged (checkout, copy): fall back to the hash
+        if file_digest(job.src) != rec.get('sha256'):
+            return True
+        rec['mtime_ns'] = st.st_mtime_ns
+        self._dirty = True
+        return False
+
+    def stamp(self, job: ConvertJob) -> dict:
+        """Size, mtime and hash of the source as it is now. Take it before
+        converting and pass it to record(): a source edited while it was
+        being converted then fails the check on the next run instead of
+        matching content that was never converted."""
+        # Stat first: an edit after it changes the mtime, which sends the
+        # next needs_build() to the hash
+        st = _src_stat(job.src)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': file_digest(job.src)}
+
+    def record(self, job: ConvertJob, stamp: dict | None = None) -> None:
+        if stamp is None:
+            stamp = self.stamp(job)
+        dst_st = os.stat(job.dst)
+        self.entries[self._key(job)] = {
+            'src': os.path.abspath(job.src),
+            'mode': job.mode,
+            'converter': job.converter,
+            'version': job.version,
+            'size': stamp['size'],
+            'mtime_ns': stamp['mtime_ns'],
+            'sha256': stamp['sha256'],
+            'dst_size': dst_st.st_size,
+            'dst_mtime_ns': dst_st.st_mtime_ns,
+        }
+        self._dirty = True
+
+    def forget(self, job: ConvertJob) -> None:
+        if self.entries.pop(self._key(job), None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'format': MANIFEST_FORMAT, 'entries': self.entries}, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._dirty = False
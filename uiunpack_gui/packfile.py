@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+
+# Total War .pack archives as an input source and output sink.
+#
+# A pack is memory-mapped and only its file index is parsed; member data is
+# handed out as zero-copy memoryview slices of the mapping, so `.ui` layouts
+# can be converted straight out of the game's archives. Members are addressed
+# with virtual paths of the form `C:/game/data/patch.pack::ui/frontend.ui`.
+#
+# Supported: PFH0, PFH2, PFH3, PFH4 and PFH5 headers, extended headers,
+# index timestamps and (PFH5) LZMA-compressed members. Encrypted indexes and
+# members are reported as errors.
+
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple
+
+PACK_SEP = '::'
+PACK_VERSIONS = ('PFH0', 'PFH2', 'PFH3', 'PFH4', 'PFH5')
+
+# Low nibble of the flags word is the pack type
+PACK_TYPE_BOOT, PACK_TYPE_RELEASE, PACK_TYPE_PATCH, PACK_TYPE_MOD, PACK_TYPE_MOVIE = range(5)
+HAS_EXTENDED_HEADER = 0x100
+HAS_ENCRYPTED_INDEX = 0x80
+HAS_INDEX_WITH_TIMESTAMPS = 0x40
+HAS_ENCRYPTED_DATA = 0x10
+
+_HEADER = struct.Struct('<4s5I')
+# Bytes after the common header: the pack timestamp
+_HEADER_EXTRA = {'PFH0': 0, 'PFH2': 8, 'PFH3': 8, 'PFH4': 4, 'PFH5': 4}
+_EXTENDED_HEADER_SIZE = 20
+
+
+class PackError(ValueError):
+    pass
+
+
+class PackEntry(NamedTuple):
+    name: str        # '/'-separated member path as stored (case preserved)
+    offset: int      # absolute offset of the data in the archive
+    size: int        # stored size
+    compressed: bool = False
+    timestamp: int = 0
+
+
+def _decode_name(raw: bytes) -> str:
+    try:
+        name = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        name = raw.decode('latin-1')
+    return name.replace('\\', '/')
+
+
+class PackFile:
+    """Read-only view of one .pack archive."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < _HEADER.size:
+                raise PackError(f'{path}: too small to be a pack file')
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mv = memoryview(self._mmap)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        buf = self._mmap
+        magic, flags, dep_count, dep_size, file_count, index_size = _HEADER.unpack_from(buf, 0)
+        version = magic.decode('ascii', 'replace')
+        if version not in PACK_VERSIONS:
+            raise PackError(f'{self.path}: unsupported pack format {version!r}')
+        if flags & HAS_ENCRYPTED_INDEX:
+            raise PackError(f'{self.path}: packs with an encrypted index are not supported')
+        self.version = version
+        self.flags = flags
+        self.pack_type = flags & 0xF
+        pos = _HEADER.size + _HEADER_EXTRA[version]
+        if flags & HAS_EXTENDED_HEADER:
+            pos += _EXTENDED_HEADER_SIZE
+
+        # Dependency list: NUL-terminated pack names
+        self.dependencies = []
+        end = pos + dep_size
+        for _ in range(dep_count):
+            nul = buf.find(b'\0', pos, end)
+            if nul < 0:
+                raise PackError(f'{self.path}: truncated dependency list')
+            self.dependencies.append(_decode_name(buf[pos:nul]))
+            pos = nul + 1
+        pos = end
+
+        # File index; member data follows it back to back in index order
+        stamp_size = 0
+        if flags & HAS_INDEX_WITH_TIMESTAMPS:
+            stamp_size = 8 if version in ('PFH2', 'PFH3') else 4
+        has_compressed_flag = version == 'PFH5' and not flags & HAS_EXTENDED_HEADER
+        index_end = pos + index_size
+        data_pos = index_end
+        entries = []
+        for _ in range(file_count):
+            size = int.from_bytes(buf[pos:pos + 4], 'little')
+            pos += 4
+            stamp = int.from_bytes(buf[pos:pos + stamp_size], 'little') if stamp_size else 0
+            pos += stamp_size
+            compressed = False
+            if has_compressed_flag:
+                compressed = buf[pos] != 0
+                pos += 1
+            nul = buf.find(b'\0', pos, index_end)
+            if nul < 0:
+                raise PackError(f'{self.path}: truncated file index')
+            entries.append(PackEntry(_decode_name(buf[pos:nul]), data_pos, size, compressed, stamp))
+            pos = nul + 1
+            data_pos += size
+        if data_pos > len(buf):
+            raise PackError(f'{self.path}: file index points past the end of the archive')
+        self.entries = entries
+        self._by_name = {e.name.lower(): e for e in entries}
+
+    def close(self) -> None:
+        mv, self._mv = self._mv, None
+        if mv is not None:
+            mv.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Slices are still referenced; the mapping goes when they do
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def entry(self, name: str) -> PackEntry:
+        e = self._by_name.get(name.replace('\\', '/').lower())
+        if e is None:
+            raise KeyError(f'{name} not found in {self.path}')
+        return e
+
+    def read(self, entry: PackEntry | str):
+        """Member data: a zero-copy memoryview, or bytes for compressed
+        members."""
+        if isinstance(entry, str):
+            entry = self.entry(entry)
+        view = self._view(entry)
+        if entry.compressed:
+            return _lzma_member(view)
+        return view
+
+    def _view(self, entry: PackEntry) -> memoryview:
+        # Stored bytes of a member
+        if self.flags & HAS_ENCRYPTED_DATA:
+            raise PackError(f'{entry.name}: encrypted pack data is not supported')
+        if self._mv is None:
+            raise PackError(f'{self.path} is closed')
+        return self._mv[entry.offset:entry.offset + entry.size]
+
+    def head(self, entry: PackEntry, n: int) -> bytes:
+        if entry.compressed:
+            return bytes(self.read(entry)[:n])
+        return self._mmap[entry.offset:entry.offset + min(n, entry.size)]
+
+    def ui_entries(self) -> list[tuple[PackEntry, int]]:
+        """(entry, version) for every member under ui/ with a `Version`
+        header."""
+        found = []
+        for e in self.entries:
+            if not e.name.lower().startswith('ui/') or self.flags & HAS_ENCRYPTED_DATA:
+                continue
+            try:
+                hdr = self.head(e, 10)
+            except PackError:
+                continue
+            if len(hdr) == 10 and hdr.startswith(b'Version') and hdr[7:10].isdigit():
+                found.append((e, int(hdr[7:10])))
+        return found
+
+
+def _lzma_member(view) -> bytes:
+    # u32 uncompressed size, then an LZMA-alone stream without its size field
+    import lzma
+    usize = int.from_bytes(view[0:4], 'little')
+    stream = bytes(view[4:9]) + usize.to_bytes(8, 'little') + bytes(view[9:])
+    try:
+        return lzma.decompress(stream, format=lzma.FORMAT_ALONE)
+    except lzma.LZMAError as e:
+        raise PackError(f'cannot decompress pack member: {e}') from None
+
+
+# Recently used archives stay mapped (until the file changes or they drop
+# out of the cache), so batch jobs and scans don't re-read the index per
+# member. Front ends call close_all() when a batch is over.
+OPEN_PACKS = 4
+_open: 'OrderedDict[str, tuple[int, int, PackFile]]' = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def _cached_pack(path: str) -> PackFile:
+    # Caller holds _open_lock
+    st = os.stat(path)
+    cached = _open.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        _open.move_to_end(path)
+        return cached[2]
+    pack = PackFile(path)
+    if cached:
+        cached[2].close()
+    _open[path] = (st.st_size, st.st_mtime_ns, pack)
+    _open.move_to_end(path)
+    while len(_open) > OPEN_PACKS:
+        _open.popitem(last=False)[1][2].close()
+    return pack
+
+
+def open_pack(path: str) -> PackFile:
+    """A cached PackFile for `path`. It is closed when the file changes, when
+    it drops out of the cache, or by close_all(); hold on to member data,
+    not to the PackFile."""
+    with _open_lock:
+        return _cached_pack(os.path.abspath(path))
+
+
+def close_all() -> None:
+    """Unmap every cached archive. Member views already handed out stay
+    valid; each mapping goes when the last of them does."""
+    with _open_lock:
+        packs = [cached[2] for cached in _open.values()]
+        _open.clear()
+    for pack in packs:
+        pack.close()
+
+
+def is_pack_path(path: str) -> bool:
+    return PACK_SEP in path
+
+
+def split_pack_path(path: str) -> tuple[str, str]:
+    pack, _, member = path.partition(PACK_SEP)
+    return pack, member
+
+
+def member_path(pack: str, member: str) -> str:
+    return f'{pack}{PACK_SEP}{member}'
+
+
+def read_member(path: str):
+    """Data of a `pack::member` path (see PackFile.read)."""
+    pack, member = split_pack_path(path)
+    with _open_lock:
+        pack = _cached_pack(os.path.abspath(pack))
+        entry = pack.entry(member)
+        # The slice keeps the mapping alive if another thread closes the
+        # pack right after; decompression runs outside the lock
+        view = pack._view(entry)
+    return _lzma_member(view) if entry.compressed else view
+
+
+def scan_pack(path: str) -> list[tuple[str, int]]:
+    """(`pack::member` path, version) for every UI layout in a pack."""
+    with _open_lock:
+        pack = _cached_pack(os.path.abspath(path))
+        return [(member_path(pack.path, e.name), ver) for e, ver in pack.ui_entries()]
+
+
+def member_name_for(path: str, root: str | None = None) -> str:
+    """Pack member name for an output file: relative to `root` if given,
+    else from the nearest `ui` folder up, else `ui/<file name>`."""
+    if root:
+        rel = os.path.relpath(path, root).replace(os.sep, '/')
+        if not rel.startswith('../'):
+            return rel if rel.lower().startswith('ui/') else 'ui/' + rel
+    parts = os.path.abspath(path).replace(os.sep, '/').split('/')
+    for i in range(len(parts) - 2, -1, -1):
+        if parts[i].lower() == 'ui':
+            return '/'.join(parts[i:])
+    return 'ui/' + parts[-1]
+
+
+def write_pack(path: str, members: Iterable[tuple[str, object]], version: str = 'PFH0',
+               pack_type: int = PACK_TYPE_MOD, dependencies: Iterable[str] = ()) -> int:
+    """Write a new uncompressed .pack. `members` yields (name, data) where
+    data is bytes-like or a filesystem path. Returns the member count."""
+    if version not in PACK_VERSIONS:
+        raise PackError(f'unsupported pack format {version!r}')
+    members = [(name.replace('/', '\\'), data) for name, data in members]
+    dependencies = list(dependencies)
+    index = bytearray()
+    sizes = []
+    for name, data in members:
+        size = os.path.getsize(data) if isinstance(data, str) else memoryview(data).nbytes
+        sizes.append(size)
+        index += size.to_bytes(4, 'little')
+        if version == 'PFH5':
+            index += b'\0'  # not compressed
+        index += name.encode('utf-8') + b'\0'
+    deps = b''.join(d.encode('utf-8') + b'\0' for d in dependencies)
+    header = _HEADER.pack(version.encode('ascii'), pack_type, len(dependencies), len(deps), len(members), len(index))
+    extra = _HEADER_EXTRA[version]
+    if extra:
+        header += int(time.time()).to_bytes(extra, 'little')
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as out:
+            out.write(header)
+            out.write(deps)
+            out.write(index)
+            for (name, data), size in zip(members, sizes):
+                if isinstance(data, str):
+                    with open(data, 'rb') as fh:
+                        chunk = fh.read()
+                else:
+                    chunk = data
+                if len(chunk) != size:
+                    raise PackError(f'{name}: size changed while writing the pack')
+                out.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return len(members)
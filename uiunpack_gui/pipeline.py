@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Overlapped read / convert / write stages for batch conversion.
+#
+# Converting a file one step after another leaves the CPU idle while the
+# disk (or network share) reads and writes, and the disk idle while the CPU
+# decodes. Here each stage runs on its own:
+#
+#   readers (threads)  ->  converters (a thread, or a process pool)  ->  writers (threads)
+#
+# Readers prefetch input bytes, converters work purely in memory, and
+# writers put each output in place with a temporary file and a rename, so a
+# crash never leaves a half-written file. At most `depth` files are between
+# being read and being written; a stage that gets ahead blocks until the
+# next one catches up. I/O overlaps with decoding even with one converter.
+#
+# convert_many() uses this unless UIUNPACK_PIPELINE=0, depth=0 is passed, or
+# per-file instrumentation is on (its stage timings need a file to stay on
+# one thread).
+
+import os
+import queue
+import threading
+import traceback
+from typing import Callable
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui.etw_ui_convert import ConvertJob, ConvertResult
+
+ENABLED = os.environ.get('UIUNPACK_PIPELINE', '1') != '0'
+# Files allowed between being read and being written
+DEPTH = int(os.environ.get('UIUNPACK_PIPELINE_DEPTH', '16'))
+READERS = int(os.environ.get('UIUNPACK_READERS', '2'))
+WRITERS = int(os.environ.get('UIUNPACK_WRITERS', '2'))
+
+_END = object()
+
+
+def _convert(job: ConvertJob, data: bytes | None) -> ConvertResult:
+    # Converter stage; also the process pool's task, so it never raises.
+    # `data` is None for jobs that read their own input (Ruby)
+    try:
+        out = conv.run_job_data(job) if data is None else conv.convert_job_data(job, data)
+    except Exception as e:
+        return ConvertResult(job, False, str(e) or type(e).__name__, traceback.format_exc())
+    return ConvertResult(job, True, data=out)
+
+
+def write_atomic(dst: str, data: bytes) -> None:
+    """Write `data` to a temporary file next to `dst` and rename it over."""
+    with conv._replacing(dst) as fh:
+        fh.write(data)
+
+
+def _write_output(job: ConvertJob, data: bytes) -> None:
+    os.makedirs(os.path.dirname(job.dst) or '.', exist_ok=True)
+    if job.mode == 'unpack' and job.converter == 'python' and os.linesep != '\n':
+        # Same bytes as the text-mode write convertUIToXML does; Ruby's
+        # output is already what its script wrote
+        data = data.replace(b'\n', os.linesep.encode())
+    write_atomic(job.dst, data)
+
+
+class Pipeline:
+    """Runs `jobs[i]` for each i in `indexes` through the stages and calls
+    `finish(i, result)` in the calling thread as each one completes. With
+    `to_memory`, outputs are not written but returned in `result.data`.
+    Jobs dropped by `cancel` are not finished."""
+
+    def __init__(self, jobs: list[ConvertJob], indexes, finish: Callable[[int, ConvertResult], None],
+                 workers: int = 1, depth: int = DEPTH, readers: int = READERS, writers: int = WRITERS,
+                 cancel=None, to_memory: bool = False):
+        self.jobs = jobs
+        self.finish = finish
+        self.workers = max(1, workers)
+        self.readers = max(1, readers)
+        self.writers = max(1, writers)
+        self.cancel = cancel
+        self.to_memory = to_memory
+        self._todo = iter(list(indexes))
+        self._todo_lock = threading.Lock()
+        self._stop = threading.Event()
+        depth = max(1, depth)
+        # Backpressure: the read queue bounds prefetching, and a slot is held
+        # from the start of a conversion until its output is written
+        self._read_q = queue.Queue(maxsize=depth)
+        self._slots = threading.Semaphore(depth)
+        self._depth = depth
+        self._write_q = queue.SimpleQueue()
+        self._done_q = queue.SimpleQueue()
+        self._readers_left = self.readers
+        self._readers_lock = threading.Lock()
+
+    # Stages
+
+    def _next_index(self):
+        with self._todo_lock:
+            return next(self._todo, None)
+
+    def _reader(self) -> None:
+        try:
+            while not self._stop.is_set():
+                i = self._next_index()
+                if i is None:
+                    break
+                job = self.jobs[i]
+                try:
+                    data = conv.read_job_input(job) if job.converter == 'python' else None
+                except Exception as e:
+                    self._done_q.put((i, ConvertResult(job, False, str(e) or type(e).__name__,
+                                                       traceback.format_exc())))
+                    continue
+                self._read_q.put((i, data))
+        finally:
+            with self._readers_lock:
+                self._readers_left -= 1
+                last = self._readers_left == 0
+            if last:
+                self._read_q.put(_END)
+
+    def _items(self):
+        # What the readers produced, minus what a cancel made stale
+        while True:
+            item = self._read_q.get()
+            if item is _END:
+                return
+            if self._stop.is_set():
+                continue
+            yield item
+
+    def _convert_inline(self) -> None:
+        try:
+            for i, data in self._items():
+                self._slots.acquire()
+                self._write_q.put((i, _convert(self.jobs[i], data)))
+        finally:
+            self._end_writes()
+
+    def _convert_pooled(self) -> None:
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for i, data in self._items():
+                    self._slots.acquire()
+                    try:
+                        fut = pool.submit(_convert, self.jobs[i], data)
+                    except Exception as e:  # the pool broke
+                        self._write_q.put((i, ConvertResult(self.jobs[i], False, f"{type(e).__name__}: {e}")))
+                        continue
+                    fut.add_done_callback(lambda f, i=i: self._write_q.put((i, self._result_of(f, i))))
+        finally:
+            self._end_writes()
+
+    def _result_of(self, fut, i: int) -> ConvertResult:
+        try:
+            return fut.result()
+        except Exception as e:  # worker process died
+            return ConvertResult(self.jobs[i], False, f"{type(e).__name__}: {e}")
+
+    def _end_writes(self) -> None:
+        # Every slot back means every conversion has been written
+        for _ in range(self._depth):
+            self._slots.acquire()
+        for _ in range(self.writers):
+            self._write_q.put(_END)
+
+    def _writer(self) -> None:
+        while True:
+            item = self._write_q.get()
+            if item is _END:
+                break
+            i, res = item
+            try:
+                if res.ok and not self.to_memory:
+                    try:
+                        _write_output(res.job, res.data)
+                        res = res._replace(data=None)
+                    except Exception as e:
+                        res = ConvertResult(res.job, False, str(e) or type(e).__name__, traceback.format_exc())
+                self._done_q.put((i, res))
+            finally:
+                self._slots.release()
+        self._done_q.put(_END)
+
+    # Driver
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self._reader, daemon=True) for _ in range(self.readers)]
+        convert = self._convert_inline if self.workers == 1 else self._convert_pooled
+        threads.append(threading.Thread(target=convert, daemon=True))
+        threads += [threading.Thread(target=self._writer, daemon=True) for _ in range(self.writers)]
+        for t in threads:
+            t.start()
+        writers_left = self.writers
+        try:
+            while writers_left:
+                try:
+                    item = self._done_q.get(timeout=0.2)
+                except queue.Empty:
+                    item = None
+                if self.cancel is not None and self.cancel.is_set():
+                    self._stop.set()
+                if item is _END:
+                    writers_left -= 1
+                elif item is not None:
+                    self.finish(*item)
+        finally:
+            if writers_left:
+                # finish() raised: read nothing more, let the files in flight
+                # drain through the stages and drop their results
+                self._stop.set()
+                while writers_left:
+                    if self._done_q.get() is _END:
+                        writers_left -= 1
+            for t in threads:
+                t.join()
+
+
+def run(jobs, indexes, finish, **kw) -> None:
+    Pipeline(jobs, indexes, finish, **kw).run()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+# Selective queries over .ui files without a full XML export.
+#
+# The first query on a file decodes it once with instrumented copies of the
+# upstream record classes and keeps a compact offset index: where every
+# UiEntry starts and ends, its parent, its name, and the [start, end) span of
+# each record it owns (TGAs, states, events, effects, ...). The index is cached
+# on disk keyed on the file's path, size and mtime. Later queries seek straight
+# to the records they need and decode only those:
+#
+#   for tga in iter_tgas('ui/frontend.ui'): print(tga.path)
+#   entry = find_component('ui/frontend.ui', 'button_ok')   # decoded subtree
+#
+# Strings on decoded records are XML-escaped exactly as the converter leaves
+# them; `unescape()` (and the *_paths/iter_scripts helpers) give plain text.
+
+import hashlib
+import json
+import os
+import threading
+from typing import Iterator
+
+from uiunpack_gui import etw_ui_convert as conv
+
+INDEX_FORMAT = 1
+# UiEntry attribute used as the component name by find_component
+NAME_FIELD = 'title'
+_ENTRY = 'UiEntry'
+_UNESCAPES = (('&#x0D;', '\r'), ('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&'))
+
+
+def unescape(s: str) -> str:
+    """Undo the converter's XML escaping of a decoded string."""
+    if '&' not in s:
+        return s
+    for esc, ch in _UNESCAPES:
+        s = s.replace(esc, ch)
+    return s
+
+
+class _IndexReader(conv.MemoryReader):
+    # `rec` collects offsets while indexing; `ends` maps record start -> end
+    # for shallow decodes that skip over owned records
+    __slots__ = ('rec', 'ends')
+
+
+def _record_kinds(ns: dict) -> list[str]:
+    return [name for name, value in ns.items()
+            if isinstance(value, type) and 'readFrom' in vars(value) and value.__module__ == conv.__name__]
+
+
+def _recording_namespace(version: int) -> dict:
+    # Subclasses that note their span on handle.rec while decoding normally
+    ns = conv.record_namespace(version)
+    for kind in _record_kinds(ns):
+        base = ns[kind]
+        if kind == _ENTRY:
+            def readFrom(self, handle, _base=base):
+                rec = handle.rec
+                idx = len(rec['entries'])
+                rec['entries'].append([handle.tell(), 0, rec['stack'][-1] if rec['stack'] else -1, None, {}])
+                rec['stack'].append(idx)
+                _base.readFrom(self, handle)
+                rec['stack'].pop()
+                entry = rec['entries'][idx]
+                entry[1] = handle.tell()
+                name = getattr(self, NAME_FIELD, None)
+                entry[3] = unescape(name) if isinstance(name, str) else None
+        else:
+            def readFrom(self, handle, _base=base, _kind=kind):
+                start = handle.tell()
+                _base.readFrom(self, handle)
+                rec = handle.rec
+                if rec['stack']:
+                    owner = rec['entries'][rec['stack'][-1]]
+                    owner[4].setdefault(_kind, []).append([start, handle.tell()])
+        ns[kind] = type(kind, (base,), {'readFrom': readFrom, '__module__': base.__module__})
+    return ns
+
+
+def _shallow_namespace(version: int) -> tuple[dict, type]:
+    # The real entry class, in a namespace where every record it would
+    # create just seeks past itself using handle.ends
+    ns = conv.record_namespace(version)
+    entry_cls = ns[_ENTRY]
+
+    def readFrom(self, handle):
+        handle.seek(handle.ends[handle.tell()])
+
+    for kind in _record_kinds(ns):
+        ns[kind] = type(kind, (ns[kind],), {'readFrom': readFrom, '__module__': ns[kind].__module__})
+    return ns, entry_cls
+
+
+_ns_lock = threading.Lock()
+_namespaces: dict[tuple[str, int, bool], object] = {}
+
+
+def _cached_ns(which: str, version: int):
+    # SPECIALIZE is part of the key: specialize.check() flips it between runs
+    key = (which, version, conv.SPECIALIZE)
+    with _ns_lock:
+        if key not in _namespaces:
+            if which == 'record':
+                _namespaces[key] = _recording_namespace(version)
+            elif which == 'shallow':
+                _namespaces[key] = _shallow_namespace(version)
+            else:
+                _namespaces[key] = conv.record_namespace(version)
+        return _namespaces[key]
+
+
+class UiIndex:
+    """Offset index of one .ui file.
+
+    `entries[i]` is `[start, end, parent, name, {kind: [[start, end], ...]}]`
+    in file order, so entry 0 is the root and a parent always precedes its
+    children.
+    """
+
+    def __init__(self, path: str, version: int, entries: list):
+        self.path = path
+        self.version = version
+        self.entries = entries
+        self._children = None
+        self._end_map = None
+
+    @classmethod
+    def build(cls, path: str) -> 'UiIndex':
+        with _IndexReader.open(path) as reader:
+            header = reader.read(10)
+            if header[0:7] != b'Version':
+                raise ValueError(f'Not a UI layout file or unknown file version: {path}')
+            version = int(header[7:10])
+            if version not in conv.PY_SUPPORTED_VERSIONS:
+                raise ValueError(f'Version {version} not supported')
+            reader.rec = {'entries': [], 'stack': []}
+            ns = _cached_ns('record', version)
+            ns[_ENTRY](version, 1).readFrom(reader)
+            return cls(path, version, reader.rec['entries'])
+
+    # Cache
+
+    @staticmethod
+    def _cache_name(path: str) -> str:
+        st = os.stat(path)
+        _, code = conv._upstream_source()
+        key = f'{INDEX_FORMAT}|{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{NAME_FIELD}|'
+        digest = hashlib.sha256(key.encode('utf-8') + code.encode('utf-8')).hexdigest()[:32]
+        return f'uiindex-{digest}.json'
+
+    @classmethod
+    def load(cls, path: str, cache: bool = True) -> 'UiIndex':
+        """Index for `path`, from the cache when the file is unchanged."""
+        if not cache:
+            return cls.build(path)
+        name = cls._cache_name(path)
+        try:
+            with open(os.path.join(conv._cache_dir(), name), 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            return cls(path, data['version'], data['entries'])
+        except (OSError, ValueError, KeyError):
+            pass
+        index = cls.build(path)
+        data = {'version': index.version, 'entries': index.entries}
+        conv._write_cache_file(name, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return index
+
+    # Structure
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def children(self, i: int) -> list[int]:
+        if self._children is None:
+            self._children = [[] for _ in self.entries]
+            for j, e in enumerate(self.entries):
+                if e[2] >= 0:
+                    self._children[e[2]].append(j)
+        return self._children[i]
+
+    def parent(self, i: int) -> int:
+        return self.entries[i][2]
+
+    def name(self, i: int) -> str | None:
+        return self.entries[i][3]
+
+    def depth(self, i: int) -> int:
+        d = 0
+        while self.entries[i][2] >= 0:
+            i = self.entries[i][2]
+            d += 1
+        return d
+
+    def spans(self, kind: str, i: int | None = None) -> list[tuple[int, int]]:
+        """[start, end) of every `kind` record owned by entry i (or by any
+        entry)."""
+        if i is not None:
+            return [tuple(s) for s in self.entries[i][4].get(kind, ())]
+        return [tuple(s) for e in self.entries for s in e[4].get(kind, ())]
+
+    def find(self, name: str) -> list[int]:
+        return [i for i, e in enumerate(self.entries) if e[3] == name]
+
+    # Decoding
+
+    def _indent(self, i: int) -> int:
+        # Same indentation the full decode would have given the entry
+        return 1 + 2 * self.depth(i)
+
+    def decode_record(self, reader, kind: str, start: int, owner: int):
+        ns = _cached_ns('full', self.version)
+        reader.seek(start)
+        obj = ns[kind](self.version, self._indent(owner) + 4)
+        obj.readFrom(reader)
+        return obj
+
+    def decode_entry(self, reader, i: int, deep: bool = True):
+        """Entry i with its whole subtree (deep) or only its own fields, in
+        which case its record lists hold undecoded placeholders."""
+        start = self.entries[i][0]
+        if deep:
+            ns = _cached_ns('full', self.version)
+            cls = ns[_ENTRY]
+        else:
+            _, cls = _cached_ns('shallow', self.version)
+            reader.ends = self._ends()
+        reader.seek(start)
+        entry = cls(self.version, self._indent(i))
+        entry.readFrom(reader)
+        return entry
+
+    def _ends(self) -> dict[int, int]:
+        if self._end_map is None:
+            ends = {e[0]: e[1] for e in self.entries}
+            for e in self.entries:
+                for spans in e[4].values():
+                    ends.update(spans)
+            self._end_map = ends
+        return self._end_map
+
+
+def open_index(path: str, cache: bool = True) -> UiIndex:
+    return UiIndex.load(path, cache)
+
+
+def iter_records(path: str, kind: str, index: UiIndex | None = None) -> Iterator[tuple[int, object]]:
+    """(entry index, record) for every `kind` record in the file, decoding
+    only those records."""
+    index = index or open_index(path)
+    with _IndexReader.open(path) as reader:
+        for i, e in enumerate(index.entries):
+            for start, _ in e[4].get(kind, ()):
+                yield i, index.decode_record(reader, kind, start, i)
+
+
+def iter_tgas(path: str, index: UiIndex | None = None) -> Iterator[object]:
+    """Every TGA record in the file."""
+    for _, tga in iter_records(path, 'Tga', index):
+        yield tga
+
+
+def tga_paths(path: str, index: UiIndex | None = None) -> list[str]:
+    """Plain-text path of every TGA referenced by the file."""
+    return [unescape(t.path) for t in iter_tgas(path, index)]
+
+
+def iter_scripts(path: str, index: UiIndex | None = None) -> Iterator[tuple[int, str, str]]:
+    """(entry index, field, text) for every non-empty script-like string
+    field (name contains "script") on every entry."""
+    index = index or open_index(path)
+    with _IndexReader.open(path) as reader:
+        for i in range(len(index)):
+            entry = index.decode_entry(reader, i, deep=False)
+            for field, value in conv._record_fields(entry).items():
+                if isinstance(value, str) and value and 'script' in field.lower():
+                    yield i, field, unescape(value)
+
+
+def find_component(path: str, name: str, index: UiIndex | None = None, deep: bool = True):
+    """First entry whose name (NAME_FIELD) is `name`, decoded with its
+    subtree, or None."""
+    index = index or open_index(path)
+    hits = index.find(name)
+    if not hits:
+        return None
+    with _IndexReader.open(path) as reader:
+        return index.decode_entry(reader, hits[0], deep)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# Long-lived Ruby workers for the etwng ui2xml/xml2ui fallback.
+#
+# Starting `ruby` and loading Nokogiri costs far more than converting one
+# file, so instead of one interpreter per file we keep a few running and feed
+# them jobs over a JSON-lines protocol on stdin/stdout. Each worker `load`s the
+# etwng bin script with ARGV set per job; anything the script requires (the
+# etwng libs, Nokogiri) stays loaded between jobs. Workers that die or hang
+# are restarted.
+
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from uiunpack_gui.etw_ui_convert import _data_root, _ruby_exe
+
+# Runs inside Ruby. Its stdout is redirected to stderr so chatter from the
+# etwng scripts can't corrupt the protocol; replies go to the original stdout.
+_SERVER_RB = r'''
+require "json"
+proto = $stdout.dup
+proto.sync = true
+$stdout.reopen($stderr)
+bin = File.join(ARGV[0], "bin")
+scripts = { "ui2xml" => File.join(bin, "ui2xml"), "xml2ui" => File.join(bin, "xml2ui") }
+reply = lambda { |h| proto.puts(JSON.generate(h)) }
+reply.call("ready" => true, "pid" => Process.pid)
+while (line = $stdin.gets)
+  begin
+    req = JSON.parse(line)
+  rescue JSON::ParserError => e
+    reply.call("id" => nil, "ok" => false, "error" => "bad request: #{e.message}")
+    next
+  end
+  id = req["id"]
+  script = scripts[req["op"]]
+  if req["op"] == "ping"
+    reply.call("id" => id, "ok" => true)
+    next
+  elsif script.nil?
+    reply.call("id" => id, "ok" => false, "error" => "unknown op #{req["op"]}")
+    next
+  end
+  begin
+    ARGV.replace([req["src"], req["dst"]])
+    $0 = script
+    load script, true
+    reply.call("id" => id, "ok" => true)
+  rescue SystemExit => e
+    if e.success?
+      reply.call("id" => id, "ok" => true)
+    else
+      reply.call("id" => id, "ok" => false, "error" => "#{File.basename(script)} exited with status #{e.status}")
+    end
+  rescue Exception => e
+    reply.call("id" => id, "ok" => false, "error" => "#{e.class}: #{e.message}")
+  ensure
+    $stdout.flush
+  end
+end
+'''
+
+# Seconds to wait for a worker to come up, and for one conversion
+START_TIMEOUT = 60
+JOB_TIMEOUT = 600
+# Idle workers are pinged before reuse after this many seconds
+PING_AFTER = 30
+
+
+class RubyWorkerError(RuntimeError):
+    pass
+
+
+class RubyWorkerStartError(RubyWorkerError):
+    """No worker could be started: Ruby can't run the server script here."""
+
+
+class RubyWorker:
+    def __init__(self, exe: str, data_root: str):
+        self.exe = exe
+        self.data_root = data_root
+        self._proc = None
+        self._replies = None
+        self._next_id = 0
+        self.last_used = 0.0
+
+    def start(self) -> None:
+        self.stop()
+        stderr = subprocess.DEVNULL if sys.stderr is None else None
+        flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        try:
+            self._proc = subprocess.Popen(
+                [self.exe, '-e', _SERVER_RB, self.data_root],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                text=True, encoding='utf-8', bufsize=1, creationflags=flags,
+            )
+        except OSError as e:
+            raise RubyWorkerStartError(f'Ruby worker failed to start: {e}') from None
+        self._replies = queue.SimpleQueue()
+        threading.Thread(target=self._pump, args=(self._proc, self._replies), daemon=True).start()
+        try:
+            hello = self._reply(START_TIMEOUT)
+        except RubyWorkerError as e:
+            self.stop()
+            raise RubyWorkerStartError(f'Ruby worker failed to start: {e}') from None
+        if not hello.get('ready'):
+            self.stop()
+            raise RubyWorkerStartError(f'Ruby worker failed to start: {hello}')
+        self.last_used = time.monotonic()
+
+    @staticmethod
+    def _pump(proc, replies) -> None:
+        # Reader thread: turns stdout lines into messages; None means EOF
+        for line in proc.stdout:
+            try:
+                replies.put(json.loads(line))
+            except ValueError:
+                pass
+        replies.put(None)
+
+    def _reply(self, timeout: float) -> dict:
+        try:
+            msg = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise RubyWorkerError(f'Ruby worker did not answer within {timeout:.0f}s; restarting it')
+        if msg is None:
+            code = self._proc.wait() if self._proc else None
+            self._proc = None
+            raise RubyWorkerError(f'Ruby worker exited unexpectedly (status {code})')
+        return msg
+
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _request(self, op: str, timeout: float, **fields) -> dict:
+        self._next_id += 1
+        req = dict(fields, id=self._next_id, op=op)
+        try:
+            self._proc.stdin.write(json.dumps(req) + '\n')
+            self._proc.stdin.flush()
+        except (OSError, ValueError):
+            self.stop()
+            raise RubyWorkerError('Ruby worker pipe closed')
+        while True:
+            msg = self._reply(timeout)
+            if msg.get('id') == req['id']:
+                self.last_used = time.monotonic()
+                return msg
+
+    def ping(self, timeout: float = 10) -> bool:
+        if not self.alive():
+            return False
+        try:
+            return bool(self._request('ping', timeout).get('ok'))
+        except RubyWorkerError:
+            return False
+
+    def convert(self, op: str, src: str, dst: str, timeout: float | None = None) -> None:
+        if not self.alive():
+            self.start()
+        msg = self._request(op, JOB_TIMEOUT if timeout is None else timeout, src=src, dst=dst)
+        if not msg.get('ok'):
+            raise RuntimeError(msg.get('error') or f'Ruby {op} failed')
+
+    def stop(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+            proc.wait()
+
+
+class RubyServerPool:
+    """A small set of RubyWorkers shared by threads in this process."""
+
+    def __init__(self, size: int = 1, exe: str | None = None, data_root: str | None = None):
+        exe = exe or _ruby_exe()
+        data_root = data_root or _data_root()
+        if not exe:
+            raise RubyWorkerError('Ruby not found')
+        if not data_root:
+            raise RuntimeError('Bundled etwng/ui not found for Ruby fallback')
+        self._all = [RubyWorker(exe, data_root) for _ in range(max(1, size))]
+        self._idle = queue.SimpleQueue()
+        for w in self._all:
+            self._idle.put(w)
+
+    def convert(self, op: str, src: str, dst: str) -> None:
+        worker = self._idle.get()
+        try:
+            if worker.alive() and time.monotonic() - worker.last_used > PING_AFTER and not worker.ping():
+                worker.stop()
+            try:
+                worker.convert(op, src, dst)
+            except RubyWorkerStartError:
+                raise
+            except RubyWorkerError:
+                # Crashed or hung mid-job: one retry on a fresh interpreter
+                worker.start()
+                worker.convert(op, src, dst)
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        for w in self._all:
+            w.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Set by disable_pool() once workers turned out not to start
+_pool_failed = False
+
+
+def get_pool() -> RubyServerPool:
+    global _pool
+    with _pool_lock:
+        if _pool_failed:
+            raise RubyWorkerStartError('Ruby workers are unavailable in this process')
+        if _pool is None:
+            size = int(os.environ.get('UIUNPACK_RUBY_WORKERS', '1'))
+            _pool = RubyServerPool(size)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def disable_pool() -> None:
+    """Stop using workers in this process; callers fall back to one Ruby
+    process per file."""
+    global _pool, _pool_failed
+    with _pool_lock:
+        _pool_failed = True
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# Folder scanner for batch inputs.
+#
+# Walks the tree with os.scandir (the directory listing already carries the
+# size/mtime we need), reads the 10-byte `Version` headers on a thread pool,
+# and remembers (size, mtime, version) per file in an on-disk index so a
+# rescan only opens files that changed since last time.
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from uiunpack_gui.archive import ArchiveError, is_archive, scan_archive
+from uiunpack_gui.etw_ui_convert import _cache_dir, _write_cache_file, detect_version, detect_xml_version
+from uiunpack_gui.packfile import PackError, scan_pack
+
+INDEX_NAME = 'scan_index.json'
+INDEX_FORMAT = 1
+# Version stored for files that turned out not to be inputs
+_NOT_INPUT = -1
+
+
+class ScanIndex:
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(_cache_dir(), INDEX_NAME)
+        self.entries: dict[str, dict[str, list]] = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if data.get('format') == INDEX_FORMAT:
+                self.entries = data.get('modes', {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, mode: str, path: str, size: int, mtime_ns: int):
+        """Cached version for an unchanged file: an int, None (input with no
+        detectable version) or _NOT_INPUT. Returns False on a miss."""
+        rec = self.entries.get(mode, {}).get(path)
+        if rec is not None and rec[0] == size and rec[1] == mtime_ns:
+            return rec[2]
+        return False
+
+    def store(self, mode: str, path: str, size: int, mtime_ns: int, version) -> None:
+        self.entries.setdefault(mode, {})[path] = [size, mtime_ns, version]
+        self._dirty = True
+
+    def prune(self, mode: str, root_dir: str, seen: set[str]) -> None:
+        # Forget files under root_dir that no longer exist
+        table = self.entries.get(mode, {})
+        prefix = os.path.join(root_dir, '')
+        gone = [p for p in table if p.startswith(prefix) and p not in seen]
+        for p in gone:
+            del table[p]
+        self._dirty = self._dirty or bool(gone)
+
+    def save(self) -> None:
+        if self._dirty:
+            data = json.dumps({'format': INDEX_FORMAT, 'modes': self.entries}, separators=(',', ':'))
+            if self.path == os.path.join(_cache_dir(), INDEX_NAME):
+                _write_cache_file(INDEX_NAME, data.encode('utf-8'))
+            else:
+                with open(self.path, 'w', encoding='utf-8') as fh:
+                    fh.write(data)
+            self._dirty = False
+
+
+def _walk(root_dir: str):
+    # Depth-first, entries sorted per directory like a stable os.walk
+    stack = [root_dir]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime_ns
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def _probe(mode: str, path: str):
+    if mode == 'pack':
+        return detect_xml_version(path)
+    ver = detect_version(path)
+    return _NOT_INPUT if ver is None else ver
+
+
+def scan_inputs(root_dir: str, mode: str, threads: int = 8, index: ScanIndex | None = None) -> list[tuple[str, int | None]]:
+    """Find convertible files under root_dir as (path, version) pairs.
+
+    Unpack mode keeps any file with a `Version` header and expands `*.pack`
+    archives into their ui/ layouts (as `archive.pack::ui/...` paths); pack
+    mode keeps `*.xml` and reports the `<version>` it declares (None if
+    absent). Zip and tar archives are expanded into their members in both
+    modes.
+    """
+    root_dir = os.path.abspath(root_dir)
+    own_index = index is None
+    if own_index:
+        index = ScanIndex()
+    files = []
+    seen = set()
+    packs = {}  # position in files -> members of a .pack or archive found there
+    for path, size, mtime_ns in _walk(root_dir):
+        if is_archive(path):
+            try:
+                packs.setdefault(len(files), []).extend(scan_archive(path, mode))
+            except (OSError, ArchiveError):
+                pass
+            continue
+        if mode == 'pack' and not path.lower().endswith('.xml'):
+            continue
+        if mode == 'unpack' and path.lower().endswith('.pack'):
+            try:
+                packs.setdefault(len(files), []).extend(scan_pack(path))
+            except (OSError, PackError):
+                pass
+            continue
+        files.append((path, size, mtime_ns))
+        seen.add(path)
+
+    versions = [index.lookup(mode, p, size, mtime) for p, size, mtime in files]
+    todo = [i for i, v in enumerate(versions) if v is False]
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            found = pool.map(lambda i: _probe(mode, files[i][0]), todo)
+            for i, ver in zip(todo, found):
+                path, size, mtime = files[i]
+                versions[i] = ver
+                index.store(mode, path, size, mtime, ver)
+    index.prune(mode, root_dir, seen)
+    if own_index:
+        index.save()
+    found = []
+    for i, (f, v) in enumerate(zip(files, versions)):
+        found.extend(packs.get(i, ()))
+        if v != _NOT_INPUT:
+            found.append((f[0], v))
+    found.extend(packs.get(len(files), ()))
+    return found
+
+
+def expand_inputs(paths, mode: str) -> list[tuple[str, int | None]]:
+    """Explicitly chosen files as (path, version) pairs; in unpack mode a
+    `.pack` stands for the UI layouts inside it, and in either mode a zip or
+    tar archive for its members."""
+    found = []
+    for path in paths:
+        if is_archive(path):
+            found.extend(scan_archive(path, mode))
+        elif mode == 'unpack' and path.lower().endswith('.pack'):
+            found.extend(scan_pack(path))
+        else:
+            found.append((path, None))
+    return found
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+
+# Per-version specialised copies of the upstream converter.
+#
+# The upstream record classes test `self.version` over and over while reading
+# and writing every entry, state, event and effect. For each version in
+# PY_SUPPORTED_VERSIONS this module rewrites the upstream AST with the version
+# fixed: `self.version` becomes a constant, comparisons on it are folded and
+# dead branches dropped, and runs of adjacent fixed-width reads/writes
+# (`handle.readInt()` ... / `handle.writeInt(x)` ...) are merged into one
+# precompiled Struct call. The record classes also get `__slots__` (what
+# their methods assign on self, plus anything the module assigns on other
+# objects), which drops the per-instance `__dict__` of every entry, state,
+# TGA, event and effect. The result is
+# compiled once and kept in the bytecode cache keyed on the upstream source
+# hash.
+#
+#   python -m uiunpack_gui.specialize --build          # fill the cache ahead of time
+#   python -m uiunpack_gui.specialize --emit DIR       # write the generated sources
+#   python -m uiunpack_gui.specialize --check FILE...  # compare with the generic path
+
+import ast
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+
+from uiunpack_gui import etw_ui_convert as conv
+
+# Bump when the transformation changes so stale cache entries are ignored
+GENERATOR_VERSION = 3
+# Give the record classes __slots__; UIUNPACK_SLOTS=0 keeps plain instances
+SLOTS = os.environ.get('UIUNPACK_SLOTS', '1') != '0'
+
+_READ_CODES = {
+    'readByte': 'B', 'readInt': 'i', 'readUInt': 'I', 'readShort': 'h',
+    'readUShort': 'H', 'readFloat': 'f', 'readDouble': 'd',
+}
+_WRITE_CODES = {'write' + name[4:]: code for name, code in _READ_CODES.items()}
+_LITERALS = (ast.Constant, ast.List, ast.Tuple, ast.Set)
+
+
+def _is_self_version(node) -> bool:
+    return (isinstance(node, ast.Attribute) and node.attr == 'version'
+            and isinstance(node.value, ast.Name) and node.value.id == 'self')
+
+
+def _is_self(node) -> bool:
+    return isinstance(node, ast.Name) and node.id == 'self'
+
+
+def _is_literal(node) -> bool:
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return all(isinstance(e, ast.Constant) for e in node.elts)
+    return False
+
+
+def _version_assigned_outside_init(cls: ast.ClassDef) -> bool:
+    for fn in cls.body:
+        if isinstance(fn, ast.FunctionDef) and fn.name != '__init__':
+            for node in ast.walk(fn):
+                if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+                    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                    if any(_is_self_version(t) for t in targets):
+                        return True
+    return False
+
+
+class _FixVersion(ast.NodeTransformer):
+    """Replace self.version with a constant and fold what that makes
+    constant."""
+
+    def __init__(self, version: int):
+        self.version = version
+
+    def visit_ClassDef(self, node):
+        # A class that changes its own version can't be specialised safely
+        if _version_assigned_outside_init(node):
+            return node
+        return self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        if node.name == '__init__':
+            return node
+        return self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if _is_self_version(node) and isinstance(node.ctx, ast.Load):
+            return ast.copy_location(ast.Constant(self.version), node)
+        return self.generic_visit(node)
+
+    def _fold(self, node):
+        try:
+            value = eval(compile(ast.Expression(node), '<fold>', 'eval'), {'__builtins__': {}})
+        except Exception:
+            return node
+        return ast.copy_location(ast.Constant(value), node)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if _is_literal(node.left) and all(_is_literal(c) for c in node.comparators):
+            return self._fold(node)
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        values = []
+        for v in node.values:
+            if isinstance(v, ast.Constant):
+                # and: a false constant decides it, true ones drop out; or: mirror
+                if bool(v.value) == isinstance(node.op, ast.Or):
+                    if not values:
+                        return ast.copy_location(ast.Constant(v.value), node)
+                    # Earlier operands still run (they may read from the
+                    # handle); only what follows the constant is dead
+                    node.values = values + [v]
+                    return node
+                continue
+            values.append(v)
+        if not values:
+            return ast.copy_location(ast.Constant(isinstance(node.op, ast.And)), node)
+        if len(values) == 1:
+            # Only safe when used as a condition; the If/IfExp visitors are the
+            # consumers here, and truthiness is all they look at
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not) and isinstance(node.operand, ast.Constant):
+            return ast.copy_location(ast.Constant(not node.operand.value), node)
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return (node.body if node.test.value else node.orelse) or None
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            return node.orelse or None
+        return node
+
+
+class _MergeFixedRuns(ast.NodeTransformer):
+    """Merge adjacent fixed-width reads/writes into single Struct calls."""
+
+    def __init__(self):
+        self.structs: dict[str, str] = {}
+
+    def _struct_name(self, codes: str) -> str:
+        fmt = '<' + codes
+        if fmt not in self.structs:
+            self.structs[fmt] = f'_S_{codes}'
+        return self.structs[fmt]
+
+    @staticmethod
+    def _read_of(stmt):
+        # `<self.attr | name> = <handle>.readX()` -> (handle, code, target)
+        if (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                and isinstance(stmt.value, ast.Call) and not stmt.value.args and not stmt.value.keywords):
+            func, target = stmt.value.func, stmt.targets[0]
+            if (isinstance(func, ast.Attribute) and func.attr in _READ_CODES and isinstance(func.value, ast.Name)
+                    and (isinstance(target, ast.Name) or (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)))):
+                return func.value.id, _READ_CODES[func.attr], target
+        return None
+
+    @staticmethod
+    def _write_of(stmt):
+        # `<handle>.writeX(expr)` where expr doesn't touch the handle
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+            call = stmt.value
+            func = call.func
+            if (isinstance(func, ast.Attribute) and func.attr in _WRITE_CODES and isinstance(func.value, ast.Name)
+                    and len(call.args) == 1 and not call.keywords):
+                handle = func.value.id
+                if not any(isinstance(n, ast.Name) and n.id == handle for n in ast.walk(call.args[0])):
+                    return handle, _WRITE_CODES[func.attr], call.args[0]
+        return None
+
+    def _run_at(self, stmts, i):
+        # Longest run of same-handle reads (or writes) starting at i
+        for probe, build in ((self._read_of, self._build_read), (self._write_of, self._build_write)):
+            first = probe(stmts[i])
+            if first is None:
+                continue
+            run = [first]
+            for stmt in stmts[i + 1:]:
+                nxt = probe(stmt)
+                if nxt is None or nxt[0] != first[0]:
+                    break
+                run.append(nxt)
+            return run, build
+        return [], None
+
+    def _merge(self, stmts):
+        out = []
+        i = 0
+        while i < len(stmts):
+            run, build = self._run_at(stmts, i)
+            if len(run) > 1:
+                out.append(ast.copy_location(build(run), stmts[i]))
+                i += len(run)
+            else:
+                out.append(stmts[i])
+                i += 1
+        return out
+
+    def _build_read(self, run):
+        handle = run[0][0]
+        name = self._struct_name(''.join(code for _, code, _ in run))
+        targets = []
+        for _, _, t in run:
+            t = ast.Name(t.id, ast.Store()) if isinstance(t, ast.Name) else ast.Attribute(t.value, t.attr, ast.Store())
+            targets.append(t)
+        call = ast.Call(ast.Attribute(ast.Name(handle, ast.Load()), 'unpack', ast.Load()), [ast.Name(name, ast.Load())], [])
+        return ast.Assign([ast.Tuple(targets, ast.Store())], call)
+
+    def _build_write(self, run):
+        handle = run[0][0]
+        name = self._struct_name(''.join(code for _, code, _ in run))
+        args = [ast.Name(name, ast.Load())] + [expr for _, _, expr in run]
+        return ast.Expr(ast.Call(ast.Attribute(ast.Name(handle, ast.Load()), 'writePacked', ast.Load()), args, []))
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        for field in ('body', 'orelse', 'finalbody'):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                setattr(node, field, self._merge(stmts))
+        return node
+
+
+class _Slotify(ast.NodeTransformer):
+    """Add __slots__ to DebuggableConverter and the classes built on it."""
+
+    def __init__(self, tree):
+        # Attribute names stored on anything but `self` (e.g. a parent
+        # setting a field on a child) go into every class's slots
+        self.external = {n.attr for n in ast.walk(tree) if isinstance(n, ast.Attribute)
+                         and isinstance(n.ctx, ast.Store) and not _is_self(n.value)}
+        self.slotted: dict[str, set[str]] = {}
+
+    def visit_Subscript(self, node):
+        # debug() reads self.__dict__[name]; getattr works with slots too
+        self.generic_visit(node)
+        v = node.value
+        if isinstance(v, ast.Attribute) and v.attr == '__dict__' and isinstance(node.ctx, ast.Load):
+            return ast.copy_location(ast.Call(ast.Name('getattr', ast.Load()), [v.value, node.slice], []), node)
+        return node
+
+    @staticmethod
+    def _uses_dict(cls) -> bool:
+        for n in ast.walk(cls):
+            if isinstance(n, ast.Attribute) and n.attr == '__dict__':
+                return True
+            if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id in ('vars', 'setattr'):
+                return True
+        return False
+
+    def visit_ClassDef(self, node):
+        self.generic_visit(node)
+        bases = [b.id for b in node.bases if isinstance(b, ast.Name)]
+        if len(bases) != len(node.bases) or node.keywords:
+            return node
+        own = {n.attr for n in ast.walk(node) if isinstance(n, ast.Attribute)
+               and isinstance(n.ctx, ast.Store) and _is_self(n.value)}
+        if node.name == 'DebuggableConverter':
+            names = []
+        elif bases and all(b in self.slotted for b in bases):
+            class_level = {t.id for stmt in node.body if isinstance(stmt, (ast.Assign, ast.AnnAssign))
+                           for t in (stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target])
+                           if isinstance(t, ast.Name)}
+            class_level |= {stmt.name for stmt in node.body
+                            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+            inherited = set().union(*(self.slotted[b] for b in bases))
+            names = sorted((own | self.external) - class_level - inherited)
+        else:
+            return node
+        if self._uses_dict(node) or any(isinstance(stmt, ast.Assign) and any(
+                isinstance(t, ast.Name) and t.id == '__slots__' for t in stmt.targets) for stmt in node.body):
+            return node
+        slots = ast.Assign([ast.Name('__slots__', ast.Store())], ast.Tuple([ast.Constant(n) for n in names], ast.Load()))
+        node.body.insert(0, slots)
+        self.slotted[node.name] = set(names) | set().union(*(self.slotted[b] for b in bases if b in self.slotted))
+        return node
+
+
+def _fill_empty_bodies(tree) -> None:
+    for node in ast.walk(tree):
+        for field in ('body',):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list) and not stmts and not isinstance(node, ast.Module):
+                stmts.append(ast.Pass())
+
+
+def generate_source(version: int, code: str | None = None, slots: bool | None = None) -> str:
+    """Python source of the upstream module specialised for `version`."""
+    if code is None:
+        code = conv._upstream_source()[1]
+    if slots is None:
+        slots = SLOTS
+    tree = ast.parse(code)
+    tree = _FixVersion(version).visit(tree)
+    _fill_empty_bodies(tree)
+    merger = _MergeFixedRuns()
+    tree = merger.visit(tree)
+    if slots:
+        tree = _Slotify(tree).visit(tree)
+    prelude = ast.parse('import struct as _specialize_struct\n' + ''.join(
+        f'{name} = _specialize_struct.Struct({fmt!r})\n' for fmt, name in sorted(merger.structs.items())))
+    tree.body[:0] = prelude.body
+    ast.fix_missing_locations(tree)
+    return f'# Generated by uiunpack_gui.specialize for UI version {version:03d}. Do not edit.\n' + ast.unparse(tree) + '\n'
+
+
+def _code_for(version: int):
+    src_path, code = conv._upstream_source()
+    key = hashlib.sha256(importlib.util.MAGIC_NUMBER + code.encode('utf-8')
+                         + f'|{GENERATOR_VERSION}|{version}|{SLOTS}'.encode()).hexdigest()[:24]
+    name = f'convert_ui-v{version:03d}-{key}.{sys.implementation.cache_tag}.bin'
+    try:
+        with open(os.path.join(conv._cache_dir(), name), 'rb') as fh:
+            return marshal.load(fh)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    compiled = compile(generate_source(version, code), f'{src_path}<v{version:03d}>', 'exec')
+    conv._write_cache_file(name, marshal.dumps(compiled))
+    return compiled
+
+
+def new_namespace(version: int) -> dict:
+    """A fresh, private namespace running the code specialised for
+    `version`; callers may patch its globals freely."""
+    ns = {'__name__': conv.__name__, '__builtins__': __builtins__}
+    exec(_code_for(version), ns)
+    return ns
+
+
+_namespaces: dict[int, dict] = {}
+
+
+def namespace(version: int) -> dict:
+    """Shared upstream namespace whose record classes are specialised for
+    `version` (built on first use, then cached in-process and on disk)."""
+    ns = _namespaces.get(version)
+    if ns is None:
+        with conv._stage('specialize'):
+            ns = _namespaces[version] = new_namespace(version)
+    return ns
+
+
+def build_all() -> None:
+    for version in sorted(conv.PY_SUPPORTED_VERSIONS):
+        namespace(version)
+
+
+def check(paths) -> list[str]:
+    """Convert each .ui through the generic and specialised paths and list
+    every file whose XML or repacked .ui differs, one line per file."""
+    problems = []
+    saved = conv.SPECIALIZE
+    try:
+        for path in paths:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            try:
+                conv.SPECIALIZE = False
+                generic_xml = conv.convertUIDataToXML(data)
+                generic_ui = conv.convertXMLDataToUI(generic_xml)
+                conv.SPECIALIZE = True
+                fast_xml = conv.convertUIDataToXML(data)
+                fast_ui = conv.convertXMLDataToUI(generic_xml)
+            except Exception as e:
+                problems.append(f'{path}: {type(e).__name__}: {e}')
+                continue
+            differs = [what for what, same in (('XML', fast_xml == generic_xml), ('.ui', fast_ui == generic_ui))
+                       if not same]
+            if differs:
+                problems.append(f"{path}: {' and '.join(differs)} differ{'s' if len(differs) == 1 else ''}")
+    finally:
+        conv.SPECIALIZE = saved
+    return problems
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description='Per-version specialised UI decoders.')
+    ap.add_argument('--build', action='store_true', help='generate and cache code for every supported version')
+    ap.add_argument('--emit', metavar='DIR', help='write the generated source for every version to DIR')
+    ap.add_argument('--check', nargs='+', metavar='FILE', help='compare specialised vs generic output for these .ui files')
+    args = ap.parse_args()
+    if args.build:
+        build_all()
+        print(f"Cached specialised code for {len(conv.PY_SUPPORTED_VERSIONS)} versions in {conv._cache_dir()}")
+    if args.emit:
+        os.makedirs(args.emit, exist_ok=True)
+        for version in sorted(conv.PY_SUPPORTED_VERSIONS):
+            with open(os.path.join(args.emit, f'convert_ui_v{version:03d}.py'), 'w', encoding='utf-8') as fh:
+                fh.write(generate_source(version))
+        print(f"Wrote generated sources to {args.emit}")
+    if args.check:
+        problems = check(args.check)
+        for p in problems:
+            print(p)
+        print(f"{len(args.check) - len(problems)}/{len(args.check)} file(s) identical")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+# Streaming UI -> XML with memory bounded by tree depth.
+#
+# The normal path decodes the whole entry tree and only then writes XML. Here
+# each UiEntry writes its XML while the file is being decoded: the part
+# before its children as soon as the first child starts, each child as it
+# completes, and the closing part once the entry ends. Finished children are
+# not kept, so at any time only the entries on the path from the root to
+# the one being decoded are in memory.
+#
+# The upstream writeToXML is reused unchanged. An entry's XML is rendered
+# with a marker in place of its children and split there. When the entry
+# ends it is rendered again; if fields decoded after the children would
+# have changed the part already written, the conversion fails rather than
+# writing different XML. `python -m uiunpack_gui.stream --check FILE...`
+# compares the streamed output with the normal path.
+#
+# Opt in with convertUIToXML(..., stream=True) or UIUNPACK_STREAM=1.
+
+import io
+import threading
+
+from uiunpack_gui import etw_ui_convert as conv
+
+_ENTRY = 'UiEntry'
+_MARK = '\0uiunpack-children\0'
+# Intern tables are dropped past this many strings to keep memory flat
+INTERN_LIMIT = 4096
+
+
+class StreamError(RuntimeError):
+    pass
+
+
+class _StreamReader(conv.MemoryReader):
+    # `out` is the text stream; `stack` holds [entry, tail, head] for each
+    # open entry, tail and head being None until the head has been written
+    __slots__ = ('out', 'stack')
+
+
+class _Marker:
+    __slots__ = ()
+
+    def writeToXML(self, handle):
+        handle.write(_MARK)
+
+
+class _Dropped(list):
+    """Stands in for an entry's children list once streaming: appends are
+    counted, not kept."""
+    __slots__ = ('_n',)
+
+    def __init__(self):
+        super().__init__()
+        self._n = 0
+
+    def append(self, item):
+        self._n += 1
+
+    def __len__(self):
+        return self._n
+
+
+def _split(entry) -> tuple[str, str]:
+    # The entry's XML before and after its children
+    children = entry.children
+    entry.children = [_Marker()]
+    try:
+        buf = io.StringIO()
+        entry.writeToXML(buf)
+    finally:
+        entry.children = children
+    head, mark, tail = buf.getvalue().partition(_MARK)
+    if not mark:
+        raise StreamError('UiEntry.writeToXML does not write its children; cannot stream')
+    return head, tail
+
+
+def _streaming_namespace(version: int) -> dict:
+    ns = conv.record_namespace(version)
+    base = ns[_ENTRY]
+
+    def readFrom(self, handle, _base=base):
+        stack = handle.stack
+        if stack and stack[-1][1] is None:
+            # First child of the parent: everything before the children
+            # has been decoded, so the parent's head can go out
+            parent = stack[-1]
+            parent[2], parent[1] = _split(parent[0])
+            handle.out.write(parent[2])
+            parent[0].children = _Dropped()
+        frame = [self, None, None]
+        stack.append(frame)
+        _base.readFrom(self, handle)
+        stack.pop()
+        if frame[1] is None:
+            self.writeToXML(handle.out)
+        else:
+            head, tail = _split(self)
+            if head != frame[2]:
+                raise StreamError(f'UiEntry fields decoded after its children change its XML '
+                                  f'(at offset {handle.tell():#x}); use the normal path')
+            handle.out.write(tail)
+        if len(handle._utf16) > INTERN_LIMIT:
+            handle._utf16.clear()
+        if len(handle._ascii) > INTERN_LIMIT:
+            handle._ascii.clear()
+
+    ns[_ENTRY] = type(_ENTRY, (base,), {'readFrom': readFrom, '__module__': base.__module__, '__slots__': ()})
+    return ns
+
+
+_ns_lock = threading.Lock()
+_namespaces: dict[tuple[int, bool], dict] = {}
+
+
+def _entry_class(version: int):
+    # Keyed on SPECIALIZE too, which specialize.check() flips between runs
+    key = (version, conv.SPECIALIZE)
+    with _ns_lock:
+        ns = _namespaces.get(key)
+        if ns is None:
+            ns = _namespaces[key] = _streaming_namespace(version)
+        return ns[_ENTRY]
+
+
+def stream_xml(reader: conv.MemoryReader, out) -> int:
+    """Decode the .ui in `reader` (positioned at offset 0) and write its XML
+    to the text stream `out` as it goes. Returns the UI version."""
+    conv._ensure_upstream('readFrom')
+    header = reader.read(10)
+    if header[0:7] != b'Version':
+        raise ValueError("Not a UI layout file or unknown file version")
+    version = int(header[7:10])
+    if version not in conv.PY_SUPPORTED_VERSIONS:
+        raise ValueError("Version %d not supported" % version)
+    entry_cls = _entry_class(version)
+    out.write("<ui>\n  <version>%03d</version>\n" % version)
+    reader.out = out
+    reader.stack = []
+    with conv._stage('decode'):
+        entry_cls(version, 1).readFrom(reader)
+    out.write("</ui>\n")
+    if conv._recorder is not None:
+        conv._recorder.note(bytes_in=reader.tell())
+    return version
+
+
+def stream_data(data, out) -> int:
+    """stream_xml for .ui bytes (or anything MemoryReader accepts)."""
+    with _StreamReader(data) as reader:
+        return stream_xml(reader, out)
+
+
+def stream_file(ui_path: str, out) -> int:
+    with conv._stage('read'):
+        member = conv._pack_member(ui_path)
+        reader = _StreamReader(member) if member is not None else _StreamReader.open(ui_path)
+    with reader:
+        return stream_xml(reader, out)
+
+
+def check(paths) -> list[str]:
+    """Stream each .ui and list every file whose XML differs from the normal
+    path."""
+    problems = []
+    for path in paths:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        try:
+            expected = conv.convertUIDataToXML(data)
+            buf = io.StringIO()
+            stream_data(data, buf)
+        except Exception as e:
+            problems.append(f'{path}: {type(e).__name__}: {e}')
+            continue
+        if buf.getvalue() != expected:
+            problems.append(f'{path}: XML differs')
+    return problems
+
+
+def main():
+    import argparse
+    import sys
+    ap = argparse.ArgumentParser(description='Streaming UI -> XML conversion.')
+    ap.add_argument('--check', nargs='+', metavar='FILE', help='compare streamed vs normal output for these .ui files')
+    ap.add_argument('convert', nargs='*', metavar='UI XML', help='convert UI to XML')
+    args = ap.parse_args()
+    if args.check:
+        problems = check(args.check)
+        for p in problems:
+            print(p)
+        print(f"{len(args.check) - len(problems)}/{len(args.check)} file(s) identical")
+        sys.exit(1 if problems else 0)
+    if len(args.convert) != 2:
+        ap.error('give a .ui file and an output .xml path, or --check FILE...')
+    with conv._replacing(args.convert[1], 'w', encoding='utf-8') as out:
+        stream_file(args.convert[0], out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+# Binary-to-binary version transcoding of .ui layouts.
+#
+# Moving a layout to another game version used to mean unpacking to XML,
+# editing <version> and packing again. This decodes the .ui into the
+# in-memory entry tree, copies every record onto the record classes of the
+# target version and encodes that directly: no XML text, no DOM.
+#
+# Which fields a version carries is read off the upstream code itself: the
+# attributes readFrom/writeTo touch once `self.version` is fixed (the same
+# folding specialize.py does). Fields the source has but the target can't
+# store are reported as dropped; fields the target reads and writes but the
+# source never had are reported as defaulted (they keep the upstream
+# __init__ value). Values only read, like a count that writeTo recomputes
+# from its list, are not fields of their own.
+#
+#   python -m uiunpack_gui.transcode --to 54 --outdir OUT FILES_OR_DIRS... [--strict]
+
+import ast
+import os
+import sys
+from typing import NamedTuple
+
+from uiunpack_gui import etw_ui_convert as conv
+from uiunpack_gui.specialize import _FixVersion, _fill_empty_bodies, _is_self
+
+# Bookkeeping attributes that are not file fields
+_NOT_FIELDS = {'version', 'indent'}
+
+
+class _RawReader(conv.MemoryReader):
+    # Strings as stored: the converter's XML escaping is only right for XML
+    __slots__ = ()
+    escape = staticmethod(str)
+
+
+# Field layouts
+
+def _method_fields(classes: dict[str, ast.ClassDef], cls: str, method: str) -> set[str] | None:
+    # self.<attr> names used by `method` and the methods it calls on self,
+    # looking through base classes; None if the class has no such method
+    def lookup(c, name):
+        while c in classes:
+            node = classes[c]
+            for stmt in node.body:
+                if isinstance(stmt, ast.FunctionDef) and stmt.name == name:
+                    return stmt
+            c = node.bases[0].id if node.bases and isinstance(node.bases[0], ast.Name) else None
+        return None
+
+    if lookup(cls, method) is None:
+        return None
+    fields, seen, todo = set(), set(), [method]
+    while todo:
+        name = todo.pop()
+        fn = lookup(cls, name)
+        if fn is None or name in seen:
+            continue
+        seen.add(name)
+        for n in ast.walk(fn):
+            if isinstance(n, ast.Attribute) and _is_self(n.value):
+                if lookup(cls, n.attr) is not None:
+                    todo.append(n.attr)
+                else:
+                    fields.add(n.attr)
+    return fields - _NOT_FIELDS
+
+
+_layouts: dict[int, dict[str, tuple[frozenset, frozenset]]] = {}
+
+
+def field_layout(version: int) -> dict[str, tuple[frozenset, frozenset]]:
+    """Record class name -> (fields read, fields written) for `version`."""
+    layout = _layouts.get(version)
+    if layout is None:
+        tree = _FixVersion(version).visit(ast.parse(conv._upstream_source()[1]))
+        _fill_empty_bodies(tree)
+        classes = {n.name: n for n in tree.body if isinstance(n, ast.ClassDef)}
+        layout = {}
+        for name in classes:
+            read = _method_fields(classes, name, 'readFrom')
+            write = _method_fields(classes, name, 'writeTo')
+            if read is not None and write is not None:
+                layout[name] = (frozenset(read), frozenset(write))
+        _layouts[version] = layout
+    return layout
+
+
+_record_lists: dict[int, dict[str, frozenset]] = {}
+
+
+def record_lists(version: int) -> dict[str, frozenset]:
+    """Record class name -> attributes that hold lists of records (e.g.
+    UiEntry's `states`), from what readFrom appends to them."""
+    lists = _record_lists.get(version)
+    if lists is None:
+        tree = _FixVersion(version).visit(ast.parse(conv._upstream_source()[1]))
+        classes = {n.name: n for n in tree.body if isinstance(n, ast.ClassDef)}
+        lists = {}
+        for name, node in classes.items():
+            for fn in node.body:
+                if isinstance(fn, ast.FunctionDef) and fn.name == 'readFrom':
+                    lists[name] = frozenset(_appended_records(fn, classes))
+        _record_lists[version] = lists
+    return lists
+
+
+def _appended_records(fn: ast.FunctionDef, classes) -> set[str]:
+    # self.<attr> lists that get `x.append(o)` with `o = RecordClass(...)`
+    made = {t.id for n in ast.walk(fn) if isinstance(n, ast.Assign)
+            and isinstance(n.value, ast.Call) and isinstance(n.value.func, ast.Name)
+            and n.value.func.id in classes for t in n.targets if isinstance(t, ast.Name)}
+    found = set()
+    for n in ast.walk(fn):
+        if (isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and n.func.attr == 'append'
+                and isinstance(n.func.value, ast.Attribute) and _is_self(n.func.value.value)
+                and len(n.args) == 1 and isinstance(n.args[0], ast.Name) and n.args[0].id in made):
+            found.add(n.func.value.attr)
+    return found
+
+
+# Reports
+
+class FieldIssue(NamedTuple):
+    kind: str        # 'dropped' or 'defaulted'
+    record: str      # record class name, e.g. 'UiEntry'
+    field: str
+    records: int     # records of that class in the file
+    nondefault: int  # dropped: records whose value was not the default
+
+
+class TranscodeReport:
+    def __init__(self, source: int, target: int, issues: list[FieldIssue] | None = None):
+        self.source = source
+        self.target = target
+        self.issues = issues or []
+
+    @property
+    def lossy(self) -> bool:
+        """True if any dropped field held a non-default value."""
+        return any(i.kind == 'dropped' and i.nondefault for i in self.issues)
+
+    def format(self) -> str:
+        lines = [f"version {self.source:03d} -> {self.target:03d}"]
+        for i in self.issues:
+            if i.kind == 'dropped':
+                detail = f"{i.nondefault} of {i.records} record(s) had a non-default value"
+            else:
+                detail = f"{i.records} record(s) get the default"
+            lines.append(f"  {i.kind:9} {i.record}.{i.field}: {detail}")
+        if not self.issues:
+            lines.append('  every field carried over')
+        return '\n'.join(lines)
+
+
+# Transcoding
+
+def _classes(version: int) -> dict:
+    # The namespace the entry class for `version` runs in: a specialised
+    # one, or the generic upstream module
+    return conv._entry_class(version).readFrom.__globals__
+
+
+class _Transcoder:
+    def __init__(self, source: int, target: int):
+        self.source = source
+        self.target = target
+        self.classes = _classes(target)
+        self.src_layout = field_layout(source)
+        self.tgt_layout = field_layout(target)
+        # (record, field) -> [records, non-default]
+        self.dropped: dict[tuple[str, str], list[int]] = {}
+        self.defaulted: dict[tuple[str, str], int] = {}
+
+    def convert(self, node):
+        kind = type(node).__name__
+        read, src_written = self.src_layout[kind]
+        tgt_read, written = self.tgt_layout[kind]
+        out = self.classes[kind](self.target, node.indent)
+        fields = conv._record_fields(node)
+        for name in read:
+            if name not in fields:
+                continue
+            value = fields[name]
+            if name not in written:
+                if name not in src_written:
+                    continue  # derived on write, e.g. a count kept for reading
+                counts = self.dropped.setdefault((kind, name), [0, 0])
+                counts[0] += 1
+                if value != getattr(out, name, None):
+                    counts[1] += 1
+                continue
+            if type(value) is list:
+                value = [self.convert(v) if hasattr(v, 'readFrom') else v for v in value]
+            setattr(out, name, value)
+        for name in (written & tgt_read) - read:
+            key = (kind, name)
+            self.defaulted[key] = self.defaulted.get(key, 0) + 1
+        return out
+
+    def report(self) -> TranscodeReport:
+        issues = [FieldIssue('dropped', k, f, n, nd) for (k, f), (n, nd) in sorted(self.dropped.items())]
+        issues += [FieldIssue('defaulted', k, f, n, 0) for (k, f), n in sorted(self.defaulted.items())]
+        return TranscodeReport(self.source, self.target, issues)
+
+
+def transcode_data(data, target: int, out=None) -> tuple[bytes | None, TranscodeReport]:
+    """Re-encode .ui bytes (or a binary file-like object) as version
+    `target`. Returns (bytes, report), or (None, report) after writing to
+    the binary stream or filename `out`."""
+    if target not in conv.PY_SUPPORTED_VERSIONS:
+        raise ValueError("Version %d not supported" % target)
+    if hasattr(data, 'read'):
+        data = data.read()
+    with _RawReader(data) as reader:
+        source, root = conv._decode_ui(reader, '<memory>')
+    conv._ensure_upstream('writeTo')
+    tr = _Transcoder(source, target)
+    with conv._stage('transcode'):
+        new_root = tr.convert(root)
+    del root
+    outFile = conv.BufferWriter(out)
+    with conv._stage('encode'):
+        outFile.write(b'Version%03d' % target)
+        new_root.writeTo(outFile)
+    if conv._recorder is not None:
+        conv._recorder.note(bytes_out=outFile.tell())
+    if out is not None:
+        with conv._stage('write'):
+            outFile.close()
+        return None, tr.report()
+    return outFile.getvalue(), tr.report()
+
+
+def _read_input(src: str):
+    with conv._stage('read'):
+        data = conv._pack_member(src)
+        if data is None:
+            with open(src, 'rb') as fh:
+                data = fh.read()
+    return data
+
+
+def transcode_file(src: str, dst: str, target: int) -> TranscodeReport:
+    """Transcode a .ui file (or `pack::member` path) to `dst`."""
+    return transcode_data(_read_input(src), target, dst)[1]
+
+
+def main():
+    import argparse
+    from uiunpack_gui.packfile import is_pack_path, split_pack_path
+    from uiunpack_gui.scan import expand_inputs, scan_inputs
+
+    ap = argparse.ArgumentParser(description='Convert .ui layouts to another UI version without XML.')
+    ap.add_argument('inputs', nargs='+', help='.ui files, .pack archives or folders')
+    ap.add_argument('--to', dest='target', type=int, required=True, help='target UI version, e.g. 54')
+    ap.add_argument('--outdir', required=True)
+    ap.add_argument('--strict', action='store_true',
+                    help="don't write files that would lose non-default values")
+    ap.add_argument('--quiet', action='store_true', help='only report files with dropped values')
+    args = ap.parse_args()
+
+    jobs = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            root = os.path.abspath(item)
+            jobs.extend((p, os.path.relpath(p, root)) for p, _ in scan_inputs(item, 'unpack')
+                        if not is_pack_path(p))
+        else:
+            for p, _ in expand_inputs([item], 'unpack'):
+                jobs.append((p, split_pack_path(p)[1] if is_pack_path(p) else os.path.basename(p)))
+
+    failed = 0
+    for src, rel in jobs:
+        dst = os.path.join(args.outdir, rel)
+        try:
+            blob, report = transcode_data(_read_input(src), args.target)
+            if args.strict and report.lossy:
+                failed += 1
+                print(f"SKIPPED {src}: would drop values\n{report.format()}", file=sys.stderr)
+                continue
+            os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+            with conv._replacing(dst) as fh:
+                fh.write(blob)
+        except Exception as e:
+            failed += 1
+            print(f"ERROR {src}: {e}", file=sys.stderr)
+            continue
+        if not args.quiet or report.lossy:
+            print(f"{src} -> {dst}: {report.format()}")
+    print(f"{len(jobs) - failed} of {len(jobs)} file(s) transcoded to version {args.target:03d}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
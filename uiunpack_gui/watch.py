@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+# Watch a folder of unpacked XML and repack edited files automatically.
+#
+# Changes are picked up with inotify on Linux (through ctypes, no extra
+# dependency) and by polling size/mtime elsewhere or when inotify is not
+# available. Bursts of saves are debounced, then only the XML files that
+# changed are converted, in this process so the upstream code stays loaded.
+# Outputs mirror the folder layout of the watched tree.
+# Each .ui is written to a temporary file next to its destination and renamed
+# into place, so the game or another tool never sees a half-written file.
+# The output folder's build manifest skips saves that didn't change content.
+#
+#   python -m uiunpack_gui.watch XML_DIR OUT_DIR [--poll] [--debounce 0.3]
+
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+from typing import Callable
+
+from uiunpack_gui import archive
+from uiunpack_gui.etw_ui_convert import ConvertJob, ConvertResult, has_ruby, has_ruby_nokogiri, plan_job, run_job
+from uiunpack_gui.manifest import BuildManifest
+from uiunpack_gui.packfile import close_all
+from uiunpack_gui.scan import _walk
+
+DEBOUNCE = 0.3
+POLL_INTERVAL = 1.0
+
+
+def _is_xml(path: str) -> bool:
+    return path.lower().endswith('.xml')
+
+
+def _snapshot(root: str) -> dict[str, tuple[int, int]]:
+    return {p: (size, mtime) for p, size, mtime in _walk(root) if _is_xml(p)}
+
+
+class PollBackend:
+    """Detects changes by comparing size/mtime snapshots of the tree."""
+
+    def __init__(self, root: str, interval: float = POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._seen = _snapshot(root)
+        self._next = time.monotonic() + interval
+
+    def wait(self, timeout: float) -> set[str]:
+        delay = min(timeout, max(0.0, self._next - time.monotonic()))
+        time.sleep(delay)
+        if time.monotonic() < self._next:
+            return set()
+        self._next = time.monotonic() + self.interval
+        now = _snapshot(self.root)
+        changed = {p for p, sig in now.items() if self._seen.get(p) != sig}
+        self._seen = now
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyBackend:
+    """Linux inotify through ctypes, watching every directory in the tree."""
+
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    _MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, root: str):
+        import ctypes
+        import ctypes.util
+        self.root = root
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs: dict[int, str] = {}
+        self._watch_tree(root)
+
+    def _watch_dir(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._MASK)
+        if wd >= 0:
+            self._dirs[wd] = path
+
+    def _watch_tree(self, top: str) -> set[str]:
+        # Watch top and everything below it; returns XML files already there
+        found = set()
+        for dirpath, _dirs, files in os.walk(top):
+            self._watch_dir(dirpath)
+            found.update(os.path.join(dirpath, f) for f in files if _is_xml(f))
+        return found
+
+    def wait(self, timeout: float) -> set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        pos = 0
+        while pos + self._EVENT.size <= len(data):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(data, pos)
+            pos += self._EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were lost; treat every XML file as changed
+                changed.update(_snapshot(self.root))
+                continue
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            base = self._dirs.get(wd)
+            if base is None or not name:
+                continue
+            path = os.path.join(base, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    changed.update(self._watch_tree(path))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO) and _is_xml(name):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_backend(root: str, poll: bool = False, interval: float = POLL_INTERVAL):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyBackend(root)
+        except (OSError, AttributeError):
+            pass
+    return PollBackend(root, interval)
+
+
+class Watcher:
+    def __init__(self, xml_dir: str, outdir: str, poll: bool = False, debounce: float = DEBOUNCE,
+                 interval: float = POLL_INTERVAL,
+                 on_result: Callable[[ConvertResult], None] | None = None):
+        self.xml_dir = os.path.abspath(xml_dir)
+        self.outdir = os.path.abspath(outdir)
+        self.debounce = debounce
+        self.on_result = on_result
+        os.makedirs(self.outdir, exist_ok=True)
+        self.manifest = BuildManifest(self.outdir)
+        self.backend = make_backend(self.xml_dir, poll, interval)
+        self.ruby_ok = has_ruby()
+        self.nokogiri_ok = self.ruby_ok and has_ruby_nokogiri()
+
+    def convert(self, paths) -> list[ConvertResult]:
+        results = []
+        for src in sorted(paths):
+            if not os.path.isfile(src):
+                continue
+            try:
+                # Mirror the source tree, so same-named files in different
+                # folders don't share an output
+                rel = os.path.relpath(os.path.dirname(src), self.xml_dir)
+                outdir = os.path.normpath(os.path.join(self.outdir, rel))
+                os.makedirs(outdir, exist_ok=True)
+                job = plan_job('pack', src, outdir, self.ruby_ok, self.nokogiri_ok)
+                if not self.manifest.needs_build(job):
+                    continue
+                stamp = self.manifest.stamp(job)
+                # run_job renames each output into place
+                run_job(job)
+                self.manifest.record(job, stamp)
+                res = ConvertResult(job, True)
+            except Exception as e:
+                job = ConvertJob('pack', src, '')
+                res = ConvertResult(job, False, str(e) or type(e).__name__, traceback.format_exc())
+            results.append(res)
+            if self.on_result:
+                self.on_result(res)
+        self.manifest.save()
+        close_all()
+        archive.close_all()
+        return results
+
+    def sync(self) -> list[ConvertResult]:
+        """Convert every XML file whose output is missing or stale."""
+        return self.convert(_snapshot(self.xml_dir))
+
+    def run(self, stop=None) -> None:
+        """Watch until `stop` (anything with is_set()) is set or Ctrl+C."""
+        pending: set[str] = set()
+        last_event = 0.0
+        try:
+            while stop is None or not stop.is_set():
+                timeout = self.debounce if pending else 0.5
+                changed = self.backend.wait(timeout)
+                now = time.monotonic()
+                if changed:
+                    pending |= changed
+                    last_event = now
+                elif pending and now - last_event >= self.debounce:
+                    batch, pending = pending, set()
+                    self.convert(batch)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.backend.close()
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description='Repack edited UI XML automatically.')
+    ap.add_argument('xml_dir')
+    ap.add_argument('out_dir')
+    ap.add_argument('--poll', action='store_true', help='poll instead of using inotify')
+    ap.add_argument('--interval', type=float, default=POLL_INTERVAL, help='polling interval in seconds')
+    ap.add_argument('--debounce', type=float, default=DEBOUNCE, help='quiet time before converting a burst of saves')
+    ap.add_argument('--no-initial', action='store_true', help="don't convert stale files on start")
+    args = ap.parse_args()
+
+    def report(res: ConvertResult):
+        stamp = time.strftime('%H:%M:%S')
+        if res.ok:
+            print(f"{stamp} {res.job.src} → {res.job.dst}", flush=True)
+        else:
+            print(f"{stamp} ERROR: {res.job.src}: {res.error}", flush=True)
+
+    watcher = Watcher(args.xml_dir, args.out_dir, args.poll, args.debounce, args.interval, report)
+    if not args.no_initial:
+        watcher.sync()
+    kind = 'inotify' if isinstance(watcher.backend, InotifyBackend) else 'polling'
+    print(f"Watching {watcher.xml_dir} ({kind}); output to {watcher.outdir}. Ctrl+C to stop.", flush=True)
+    watcher.run()
+
+
+if __name__ == '__main__':
+    main()